@@ -0,0 +1,63 @@
+import json
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive.client import Client, CHUNKSIZE, RESUMABLE_THRESHOLD
+from drive.files import FILE_FIELDS
+from drive.retry import RetryPolicy
+
+
+@pytest.fixture
+def make_client():
+    """
+    Factory of ``Client`` objects that don't need credentials: ``make_client(service, **attrs)`` returns a client that
+    uses the service object ``service``, with the default attributes of ``Client`` overridden by ``attrs``. Unless one
+    is given, its retry policy retries the requests ``download_retries_count`` times.
+    """
+
+    def make(service=None, **attrs):
+        client = Client.__new__(Client)
+        client.service = service
+        client.rate_limiter = None
+        client.download_retries_count = 5
+        client.chunksize = CHUNKSIZE
+        client.file_fields = ",".join(FILE_FIELDS)
+        client.resumable_threshold = RESUMABLE_THRESHOLD
+        client.upload_states = None
+        client.cache = None
+        client.progress_callback = None
+        client.instrumentation = None
+        for name, value in attrs.items():
+            setattr(client, name, value)
+        if "retry_policy" not in attrs:
+            client.retry_policy = RetryPolicy(max_retries=client.download_retries_count)
+        return client
+
+    return make
+
+
+@pytest.fixture
+def http_error():
+    """
+    Factory of ``HttpError``: ``http_error(status, reason, headers)`` returns an error with the given HTTP status, the
+    given reason in the ``errors`` list of its body if any, and the given response headers.
+    """
+
+    def make(status, reason=None, headers=None):
+        content = {"error": {"code": status, "message": "error"}}
+        if reason:
+            content["error"]["errors"] = [{"reason": reason, "message": "error"}]
+        return HttpError(httplib2.Response(dict(headers or {}, status=status)), json.dumps(content).encode("utf-8"))
+
+    return make
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """
+    Don't wait between the retries of the calls. Note this patches ``time.sleep`` for all modules.
+    """
+    monkeypatch.setattr(time, "sleep", lambda _: None)
@@ -0,0 +1,671 @@
+# -*- coding: UTF-8 -*-
+
+import asyncio
+import io
+import json
+import os.path
+import re
+import time
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union, cast
+from urllib.parse import quote
+
+import httplib2
+from googleapiclient.errors import HttpError  # type: ignore
+
+from drive import mimetypes
+from drive.auth import get_credentials
+from drive.retry import backoff_delay, is_retryable
+from drive.client import CHUNKSIZE, MAX_PAGE_SIZE, Fields, _make_fields_mask, _make_files_query, _resolve_parent_id
+from drive.exceptions import DriveException
+from drive.files import File, FILE_FIELDS, guess_original_mime_type
+from drive.sheets import sheet_lines_as_dicts
+
+__all__ = ["AsyncClient", "AsyncSheetClient"]
+
+# Refresh access tokens this many seconds before they expire
+TOKEN_EXPIRY_MARGIN = 60
+# Chunks of resumable uploads must be multiples of this size, except the last one
+UPLOAD_CHUNK_GRANULARITY = 256 * 1024
+
+# Content to upload: bytes, a binary reader or an asynchronous iterable of bytes
+UploadSource = Union[bytes, BinaryIO, AsyncIterable[bytes]]
+# (status, headers, content)
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+def _import_aiohttp() -> Any:
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise RuntimeError("The asynchronous clients need aiohttp. Install it with: pip install 'drive[aio]'") \
+            from e
+    return aiohttp
+
+
+def _http_error(status: int, headers: Dict[str, str], content: bytes, uri: str) -> HttpError:
+    """
+    Build the same exception as the synchronous clients raise for a non-2XX response.
+    """
+    resp = httplib2.Response({k.lower(): v for k, v in headers.items()})
+    resp.status = status
+    return HttpError(resp, content, uri=uri)
+
+
+class _AsyncBaseClient:
+    """
+    Base class for asynchronous clients: authorized requests with bounded concurrency and retries.
+    """
+
+    def __init__(self, credentials_path: Optional[str] = None, *,
+                 max_concurrency: int = 100,
+                 retries_count: int = 5) -> None:
+        """
+        :param credentials_path: path to the service account key JSON file. If ``None``, use the path given by the
+            environment variable ``GOOGLE_APPLICATION_CREDENTIALS``.
+        :param max_concurrency: maximum number of requests in flight at the same time
+        :param retries_count: how many times a request that fails with a transient error is retried
+        """
+        self._aiohttp = _import_aiohttp()
+        self._credentials = get_credentials(credentials_path)
+        self.max_concurrency = max_concurrency
+        self.retries_count = retries_count
+
+        # These are created in the event loop, on the first request
+        self._session: Any = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._token: Optional[str] = None
+        self._token_expiry = 0.0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the HTTP connections of the client.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # Private API
+
+    def _start(self) -> Any:
+        if self._session is None:
+            # The semaphore bounds the requests in flight. The connections aren't limited, since the bodies of the
+            # streamed downloads are read outside of the semaphore.
+            connector = self._aiohttp.TCPConnector(limit=0)
+            self._session = self._aiohttp.ClientSession(connector=connector)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def _authorization(self) -> str:
+        """
+        Return the value of the ``Authorization`` header. The access token is refreshed in a thread when it's expired,
+        as ``oauth2client`` is synchronous.
+        """
+        async with cast(asyncio.Lock, self._token_lock):
+            if self._token is None or time.monotonic() >= self._token_expiry:
+                loop = asyncio.get_running_loop()
+                info = await loop.run_in_executor(None, self._credentials.get_access_token)
+                self._token = cast(str, info.access_token)
+                self._token_expiry = time.monotonic() + max((info.expires_in or 0) - TOKEN_EXPIRY_MARGIN, 0)
+
+            return "Bearer %s" % self._token
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.retries_count:
+            return False
+        if isinstance(error, HttpError):
+            if error.resp.status == 401:
+                # expired or revoked token: get a new one
+                self._token = None
+                return True
+            return is_retryable(error)
+        return isinstance(error, (self._aiohttp.ClientError, asyncio.TimeoutError))
+
+    async def _backoff(self, attempt: int, error: Optional[Exception] = None) -> None:
+        await asyncio.sleep(backoff_delay(attempt, error))
+
+    async def _request(self, method: str, url: str, *,
+                       params: Optional[Dict[str, Any]] = None,
+                       json_body: Any = None,
+                       data: Optional[bytes] = None,
+                       headers: Optional[Dict[str, str]] = None,
+                       retry: bool = True) -> Response:
+        """
+        Send an authorized request and return its response. Raise ``HttpError`` if the status is 400 or more.
+        Transient errors are retried unless ``retry`` is false.
+        """
+        session = self._start()
+        if params:
+            params = {k: _serialize_param(v) for k, v in params.items() if v is not None}
+
+        attempt = 0
+        while True:
+            request_headers = {"Authorization": await self._authorization()}
+            if headers:
+                request_headers.update(headers)
+
+            try:
+                async with cast(asyncio.Semaphore, self._semaphore):
+                    async with session.request(method, url, params=params, json=json_body, data=data,
+                                               headers=request_headers, allow_redirects=False) as resp:
+                        content = await resp.read()
+                        if resp.status >= 400:
+                            raise _http_error(resp.status, dict(resp.headers), content, url)
+                        return resp.status, dict(resp.headers), content
+            except Exception as e:
+                if not retry or not self._should_retry(e, attempt):
+                    raise
+                attempt += 1
+                await self._backoff(attempt, e)
+
+    async def _request_json(self, method: str, url: str, **kwargs) -> Any:
+        _, _, content = await self._request(method, url, **kwargs)
+        if not content:
+            return None
+        return json.loads(content)
+
+    async def _stream(self, url: str, *,
+                      params: Optional[Dict[str, Any]] = None,
+                      chunksize: int = CHUNKSIZE,
+                      resumable: bool = True) -> AsyncIterator[bytes]:
+        """
+        Stream the content at ``url`` in chunks of at most ``chunksize`` bytes. If ``resumable`` is true and the
+        connection fails in the middle of the transfer, it is resumed with an HTTP Range request.
+        """
+        session = self._start()
+        if params:
+            params = {k: _serialize_param(v) for k, v in params.items() if v is not None}
+
+        received = 0
+        attempt = 0
+        while True:
+            headers = {"Authorization": await self._authorization()}
+            if received:
+                headers["Range"] = "bytes=%d-" % received
+
+            try:
+                # Only the request counts against the concurrency limit, not the reading of the body: it depends on the
+                # consumer, which may read several streams in turn
+                async with cast(asyncio.Semaphore, self._semaphore):
+                    resp = await session.get(url, params=params, headers=headers)
+                    if resp.status >= 400:
+                        async with resp:
+                            raise _http_error(resp.status, dict(resp.headers), await resp.read(), url)
+
+                async with resp:
+                    if received and resp.status != 206:
+                        raise DriveException("Unable to resume the download of %s" % url)
+
+                    async for chunk in resp.content.iter_chunked(chunksize):
+                        received += len(chunk)
+                        yield chunk
+                return
+            except Exception as e:
+                if (received and not resumable) or not self._should_retry(e, attempt):
+                    raise
+                attempt += 1
+                await self._backoff(attempt, e)
+
+
+class AsyncClient(_AsyncBaseClient):
+    """
+    Asynchronous Google Drive client, built on ``aiohttp``. It mirrors the main methods of ``drive.client.Client``.
+    At most ``max_concurrency`` requests are in flight at the same time; the others wait for their turn.
+
+        async with AsyncClient() as client:
+            files = await client.list_files(parents_in=folder_id)
+            await asyncio.gather(*(client.download_file(f.id, f.name) for f in files))
+
+    The ``File`` objects it returns have no client: their methods that make API calls can't be used.
+    """
+
+    api_url = "https://www.googleapis.com/drive/v3"
+    upload_url = "https://www.googleapis.com/upload/drive/v3"
+
+    def __init__(self, credentials_path: Optional[str] = None, *,
+                 max_concurrency: int = 100,
+                 retries_count: int = 5,
+                 chunksize: int = CHUNKSIZE,
+                 file_fields: Fields = FILE_FIELDS) -> None:
+        """
+        :param credentials_path: path to the service account key JSON file. If ``None``, use the path given by the
+            environment variable ``GOOGLE_APPLICATION_CREDENTIALS``.
+        :param max_concurrency: maximum number of requests in flight at the same time
+        :param retries_count: how many times a request that fails with a transient error is retried
+        :param chunksize: default number of bytes to send/receive at once in uploads and downloads
+        :param file_fields: metadata fields to request by default for files
+        """
+        super().__init__(credentials_path, max_concurrency=max_concurrency, retries_count=retries_count)
+        self.chunksize = chunksize
+        self.file_fields = _make_fields_mask(file_fields)
+
+    async def get_file_metadata(self, file_id: str, *,
+                                raise_if_not_found: bool = True,
+                                fields: Optional[Fields] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the metadata of a file as a dict.
+        """
+        try:
+            return await self._request_json("GET", "%s/files/%s" % (self.api_url, quote(file_id, safe="")),
+                                            params={"fields": self._fields(fields)})
+        except HttpError:
+            if not raise_if_not_found:
+                return None
+            raise
+
+    async def get_file(self, file_id: str, *,
+                       raise_if_not_found: bool = True,
+                       fields: Optional[Fields] = None) -> Optional[File]:
+        """
+        Get a file by its ID.
+        """
+        fm = await self.get_file_metadata(file_id, raise_if_not_found=raise_if_not_found, fields=fields)
+        if fm:
+            return File(fm)
+        return None
+
+    def iter_files(self,
+                   name_equals: Optional[str] = None,
+                   name_contains: Optional[str] = None,
+                   mimetype: Optional[str] = None,
+                   parents_in: Optional[str] = None,
+                   *,
+                   limit: Optional[int] = None,
+                   page_size: int = MAX_PAGE_SIZE,
+                   fields: Optional[Fields] = None) -> AsyncIterator[File]:
+        """
+        Iterate over files, fetching them one page at a time. See ``Client.iter_files``.
+        """
+        q = _make_files_query(name_equals=name_equals,
+                              name_contains=name_contains,
+                              mimetype=mimetype,
+                              parents_in=parents_in)
+        return self._iter_file_pages(q, limit=limit, page_size=page_size, fields=fields)
+
+    async def list_files(self,
+                         name_equals: Optional[str] = None,
+                         name_contains: Optional[str] = None,
+                         mimetype: Optional[str] = None,
+                         parents_in: Optional[str] = None,
+                         n: Optional[int] = 100,
+                         *,
+                         fields: Optional[Fields] = None) -> List[File]:
+        """
+        Return up to N files. If ``n`` is ``None``, return all matching files.
+        """
+        return [f async for f in self.iter_files(name_equals=name_equals,
+                                                 name_contains=name_contains,
+                                                 mimetype=mimetype,
+                                                 parents_in=parents_in,
+                                                 limit=n,
+                                                 fields=fields)]
+
+    async def create_folder(self, name: str, parent_id: Optional[str] = None, *,
+                            fields: Optional[Fields] = None) -> File:
+        """
+        Create a folder.
+        """
+        metadata: Dict[str, Any] = {
+            "name": name,
+            "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER,
+        }
+        if parent_id:
+            metadata["parents"] = [parent_id]
+
+        return File(await self._request_json("POST", "%s/files" % self.api_url,
+                                             params={"fields": self._fields(fields)},
+                                             json_body=metadata))
+
+    async def update_file(self, file_id: str,
+                          remove_parents_ids: Optional[Iterable[str]] = None,
+                          add_parents_ids: Optional[Iterable[str]] = None,
+                          name: Optional[str] = None,
+                          *,
+                          fields: Optional[Fields] = None) -> Optional[File]:
+        """
+        Update the metadata of a file. This is a no-op if there are no modifications.
+        """
+        if not (remove_parents_ids or add_parents_ids or name):
+            return None
+
+        params: Dict[str, Any] = {"fields": self._fields(fields)}
+        if remove_parents_ids:
+            params["removeParents"] = ",".join(remove_parents_ids)
+        if add_parents_ids:
+            params["addParents"] = ",".join(add_parents_ids)
+
+        body = {"name": name} if name else {}
+        return File(await self._request_json("PATCH", "%s/files/%s" % (self.api_url, quote(file_id, safe="")),
+                                             params=params, json_body=body))
+
+    async def rename_file(self, file_id: str, name: str) -> Optional[File]:
+        """
+        Rename a file.
+        """
+        return await self.update_file(file_id, name=name)
+
+    async def remove_file(self, file_id: str) -> None:
+        """
+        Remove a file by its ID.
+        """
+        await self._request("DELETE", "%s/files/%s" % (self.api_url, quote(file_id, safe="")))
+
+    def iter_download(self, file_id: str, mime_type: Optional[str] = None, *,
+                      chunksize: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Stream the content of a file. This returns an asynchronous iterator of chunks of bytes. If the connection fails
+        in the middle of a binary file, the download is resumed where it stopped. The request counts against the
+        ``max_concurrency`` limit until the response starts, not while its content is consumed.
+
+        :param file_id:
+        :param mime_type: if given, export the file in this MIME type
+        :param chunksize: maximum size of the chunks. Default to the client's ``chunksize``.
+        """
+        url = "%s/files/%s" % (self.api_url, quote(file_id, safe=""))
+        params = {"alt": "media"}
+        if mime_type:
+            url += "/export"
+            params = {"mimeType": mime_type}
+
+        return self._stream(url, params=params, chunksize=chunksize or self.chunksize, resumable=not mime_type)
+
+    async def download(self, file_id: str, writer: BinaryIO, mime_type: Optional[str] = None, *,
+                       chunksize: Optional[int] = None) -> None:
+        """
+        Download a file and write its content using the binary writer ``writer``, one chunk at a time.
+        """
+        async for chunk in self.iter_download(file_id, mime_type, chunksize=chunksize):
+            writer.write(chunk)
+
+    async def download_file(self, file_id: str, path: str, mime_type: Optional[str] = None, *,
+                            chunksize: Optional[int] = None) -> None:
+        """
+        Download a file and save it locally.
+        """
+        with open(path, "wb") as f:
+            await self.download(file_id, f, mime_type, chunksize=chunksize)
+
+    async def upload(self, parent_id: Union[str, File], name: str,
+                     source: UploadSource,
+                     mime_type: Optional[str] = None,
+                     original_mime_type: Optional[str] = None,
+                     *,
+                     chunksize: Optional[int] = None,
+                     fields: Optional[Fields] = None) -> File:
+        """
+        Upload a file with a resumable upload, sending its content in chunks of ``chunksize`` bytes. A chunk that fails
+        with a transient error is resumed from the last byte the server received.
+
+        :param parent_id:
+        :param name: remote filename
+        :param source: content to upload: bytes, a binary reader or an asynchronous iterable of bytes
+        :param mime_type: target MIME type
+        :param original_mime_type: Original MIME type. If ``None``, it is determined using libmagic for binary readers,
+            and defaults to ``application/octet-stream`` for other sources.
+        :param chunksize: size of the chunks, a multiple of 256 KiB. Default to the client's ``chunksize``.
+        :param fields: metadata fields to request for the uploaded file
+        :return:
+        """
+        chunksize = chunksize or self.chunksize
+        if chunksize % UPLOAD_CHUNK_GRANULARITY:
+            raise ValueError("chunksize must be a multiple of %d" % UPLOAD_CHUNK_GRANULARITY)
+
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+
+        if not original_mime_type:
+            if isinstance(source, io.IOBase):
+                original_mime_type = guess_original_mime_type(cast(BinaryIO, source))
+            else:
+                original_mime_type = "application/octet-stream"
+
+        metadata: Dict[str, Any] = {
+            "name": name,
+            "parents": [_resolve_parent_id(parent_id)],
+        }
+        if mime_type:
+            metadata["mimeType"] = mime_type
+
+        _, headers, _ = await self._request("POST", "%s/files" % self.upload_url,
+                                            params={"uploadType": "resumable", "fields": self._fields(fields)},
+                                            json_body=metadata,
+                                            headers={"X-Upload-Content-Type": original_mime_type})
+        session_uri = {k.lower(): v for k, v in headers.items()}["location"]
+
+        chunks = _iter_chunks(source, chunksize).__aiter__()
+        chunk = await _next_or_none(chunks)
+        offset = 0
+        while True:
+            next_chunk = await _next_or_none(chunks) if chunk is not None else None
+            total = offset + len(chunk or b"") if next_chunk is None else None
+            content = await self._upload_chunk(session_uri, chunk or b"", offset, total)
+            if total is not None:
+                return File(json.loads(content))
+
+            offset += len(cast(bytes, chunk))
+            chunk = next_chunk
+
+    async def upload_file(self, parent_id: Union[str, File], path: str,
+                          name: Optional[str] = None,
+                          mime_type: Optional[str] = None,
+                          original_mime_type: Optional[str] = None) -> File:
+        """
+        Upload a local file. See ``upload``.
+        """
+        if name is None:
+            name = os.path.basename(path)
+
+        with open(path, "rb") as f:
+            return await self.upload(parent_id, name, f, mime_type, original_mime_type)
+
+    # Private API
+
+    def _fields(self, fields: Optional[Fields] = None) -> str:
+        if fields is None:
+            return self.file_fields
+        return _make_fields_mask(fields)
+
+    async def _iter_file_pages(self, q: str, *,
+                               limit: Optional[int] = None,
+                               page_size: int = MAX_PAGE_SIZE,
+                               fields: Optional[Fields] = None) -> AsyncIterator[File]:
+        if limit is not None and limit <= 0:
+            return
+
+        params: Dict[str, Any] = {
+            "q": q,
+            "fields": "nextPageToken,files(%s)" % self._fields(fields),
+        }
+        while True:
+            params["pageSize"] = page_size if limit is None else min(page_size, limit)
+            resp = await self._request_json("GET", "%s/files" % self.api_url, params=params)
+            for attrs in resp.get("files", []):
+                yield File(attrs)
+                if limit is not None:
+                    limit -= 1
+                    if limit <= 0:
+                        return
+
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+    async def _upload_chunk(self, session_uri: str, chunk: bytes, offset: int, total: Optional[int]) -> bytes:
+        """
+        Send a chunk of a resumable upload that starts at ``offset``. ``total`` is the size of the file if this is the
+        last chunk. Return the content of the final response, or an empty string if more chunks are expected.
+        """
+        end = offset + len(chunk)
+        total_str = "*" if total is None else str(total)
+        start = offset
+        attempt = 0
+        while True:
+            if start < end:
+                content_range = "bytes %d-%d/%s" % (start, end - 1, total_str)
+            else:
+                content_range = "bytes */%s" % total_str
+
+            try:
+                status, headers, content = await self._request("PUT", session_uri,
+                                                               data=chunk[start - offset:],
+                                                               headers={"Content-Range": content_range},
+                                                               retry=False)
+                if status != 308:
+                    return content
+
+                persisted = max(offset, min(_persisted_offset(headers), end))
+                if persisted >= end and total is None:
+                    return b""
+                if persisted <= start:
+                    # The server didn't keep any of the bytes we sent
+                    if attempt >= self.retries_count:
+                        raise DriveException("Unable to resume the upload to %s" % session_uri)
+                    attempt += 1
+                    await self._backoff(attempt)
+                # The server didn't receive the whole chunk: send the rest
+                start = persisted
+                continue
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                attempt += 1
+                await self._backoff(attempt, e)
+
+            # Ask the server how many bytes it received before retrying. The query is retried with the same backoff and
+            # attempts as the chunk, since resending the chunk from an unknown offset would be rejected.
+            while True:
+                try:
+                    status, headers, content = await self._request("PUT", session_uri,
+                                                                   headers={"Content-Range": "bytes */%s" % total_str},
+                                                                   retry=False)
+                    break
+                except Exception as e:
+                    if not self._should_retry(e, attempt):
+                        raise
+                    attempt += 1
+                    await self._backoff(attempt, e)
+
+            if status != 308:
+                return content
+            start = max(offset, min(_persisted_offset(headers), end))
+
+
+class AsyncSheetClient(_AsyncBaseClient):
+    """
+    Asynchronous Google Sheets client, built on ``aiohttp``. It mirrors ``drive.sheets.SheetClient``.
+    """
+
+    api_url = "https://sheets.googleapis.com/v4"
+
+    async def get_sheet_range(self, sheet_id: str, sheet_tab: str, cell_range: str) -> List[list]:
+        """
+        Get a range of cells from a spreadsheet.
+
+        :param sheet_id:
+        :param sheet_tab:
+        :param cell_range: Range, like A1:B3 to get columns A-B of lines 1-3.
+        :return:
+        """
+        url = "%s/spreadsheets/%s/values/%s" % (self.api_url, quote(sheet_id, safe=""),
+                                                quote("%s!%s" % (sheet_tab, cell_range), safe=""))
+        resp = await self._request_json("GET", url)
+        return resp.get("values", [])
+
+    async def iter_sheet_lines(self, sheet_id: str, sheet_tab: str, column_start: str, column_end: str,
+                               *,
+                               offset: int = 0,
+                               batch_size: int = 400,
+                               sleep_for: float = 0.5) -> AsyncIterator[list]:
+        """
+        Iterate over lines of a spreadsheet: fetch them in batches and yield one at a time. See
+        ``SheetClient.iter_sheet_lines``.
+        """
+        offset += 1  # lines start at 1
+        while True:
+            cell_range = f"{column_start}{offset}:{column_end}{offset + batch_size - 1}"
+            lines = await self.get_sheet_range(sheet_id, sheet_tab, cell_range)
+            for line in lines:
+                yield line
+            if len(lines) < batch_size:
+                break
+            offset += batch_size
+            if sleep_for > 0:
+                await asyncio.sleep(sleep_for)
+
+    async def iter_sheet_lines_as_dicts(self, sheet_id: str, sheet_tab: str,
+                                        column_start: str, column_end: str,
+                                        *,
+                                        fieldnames: Optional[Iterable[Any]] = None,
+                                        restkey: Any = None,
+                                        restval: Any = None,
+                                        **kwargs) -> AsyncIterator[dict]:
+        """
+        Equivalent of `sheet_lines_as_dicts(client.iter_sheet_lines(...))`.
+        All trailing keyword arguments are passed to `iter_sheet_lines`.
+        """
+        lines = self.iter_sheet_lines(sheet_id, sheet_tab, column_start, column_end, **kwargs)
+        if fieldnames is None:
+            async for line in lines:
+                fieldnames = line
+                break
+            else:
+                return
+
+        async for line in lines:
+            for d in sheet_lines_as_dicts([line], fieldnames=fieldnames, restkey=restkey, restval=restval):
+                yield d
+
+
+def _serialize_param(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _persisted_offset(headers: Dict[str, str]) -> int:
+    """
+    Return the number of bytes the server received in a resumable upload, from its ``Range`` header.
+    """
+    for k, v in headers.items():
+        if k.lower() == "range":
+            m = re.match(r"bytes=0-(\d+)", v)
+            if m:
+                return int(m.group(1)) + 1
+    return 0
+
+
+async def _iter_chunks(source: Union[BinaryIO, AsyncIterable[bytes]], chunksize: int) -> AsyncIterator[bytes]:
+    """
+    Read a source in chunks of exactly ``chunksize`` bytes, except the last one.
+    """
+    if not hasattr(source, "__aiter__"):
+        reader = cast(BinaryIO, source)
+        while True:
+            chunk = reader.read(chunksize)
+            if not chunk:
+                return
+            yield chunk
+
+    buff = bytearray()
+    async for data in cast(AsyncIterable[bytes], source):
+        buff += data
+        while len(buff) >= chunksize:
+            yield bytes(buff[:chunksize])
+            del buff[:chunksize]
+    if buff:
+        yield bytes(buff)
+
+
+async def _next_or_none(iterator: AsyncIterator[bytes]) -> Optional[bytes]:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
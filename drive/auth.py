@@ -5,6 +5,7 @@ import httplib2
 from os import environ
 from typing import Optional
 
+from googleapiclient.http import build_http  # type: ignore
 from oauth2client.service_account import ServiceAccountCredentials  # type: ignore
 
 from drive.exceptions import DriveException
@@ -39,7 +40,9 @@ def get_credentials(path: Optional[str] = None) -> ServiceAccountCredentials:
 
 
 def authorize(credentials: ServiceAccountCredentials) -> httplib2.Http:
-    return credentials.authorize(httplib2.Http())
+    # build_http() doesn't follow "308 Resume Incomplete" responses as redirects, unlike a plain httplib2.Http().
+    # Resumable uploads don't work otherwise.
+    return credentials.authorize(build_http())
 
 
 def authorize_credentials(credentials_path: Optional[str] = None) -> httplib2.Http:
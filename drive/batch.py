@@ -0,0 +1,284 @@
+# -*- coding: UTF-8 -*-
+
+import time
+from typing import Optional, Callable, List, Dict, Any, Iterable, Tuple
+
+import httplib2
+from googleapiclient.errors import HttpError  # type: ignore
+from googleapiclient.http import HttpRequest  # type: ignore
+
+import drive
+from drive.files import File
+from drive.instrumentation import RequestEvent
+
+__all__ = ["Batch", "BatchResult", "MAX_BATCH_SIZE"]
+
+# Maximum number of calls the Drive API accepts in a single batch request.
+MAX_BATCH_SIZE = 100
+
+# Operations after which the cached metadata of a file is stale
+MUTATING_OPERATIONS = {"remove_file", "update_file", "move_file_to_folder"}
+
+
+class BatchResult:
+    """
+    Result of an operation queued in a ``Batch``. It's filled when the batch is executed.
+    """
+
+    def __init__(self, operation: str, file_id: str) -> None:
+        self.operation = operation
+        self.file_id = file_id
+        self.response: Any = None
+        self.error: Optional[Exception] = None
+        self.done = False
+
+    @property
+    def ok(self) -> bool:
+        """Test if the operation succeeded."""
+        return self.done and self.error is None
+
+    def get(self) -> Any:
+        """
+        Return the response of the operation, or raise its error if it failed.
+        """
+        if self.error is not None:
+            raise self.error
+        if not self.done:
+            raise RuntimeError("The batch has not been executed yet")
+        return self.response
+
+    def __repr__(self) -> str:
+        status = "pending" if not self.done else ("ok" if self.error is None else "error")
+        return "<BatchResult %s %s (%s)>" % (self.operation, self.file_id, status)
+
+
+class _Operation:
+    def __init__(self, result: BatchResult,
+                 make_request: Callable[[], HttpRequest],
+                 postproc: Callable[[Any], Any] = lambda resp: resp,
+                 *,
+                 then: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        :param result: result to fill
+        :param make_request: function that builds the request
+        :param postproc: function applied to the response to get the result
+        :param then: if set, function called with the response instead of filling the result. This is used to queue
+            a follow-up operation on the same result.
+        """
+        self.result = result
+        self.make_request = make_request
+        self.postproc = postproc
+        self.then = then
+
+    def callback(self, _request_id: str, response: Any, exception: Optional[Exception]) -> None:
+        self.result.error = exception
+        if exception is None and self.then is not None:
+            self.then(response)
+            return
+
+        self.result.done = True
+        if exception is None:
+            self.result.response = self.postproc(response)
+
+
+class Batch:
+    """
+    Queue of operations executed in batch HTTP requests of up to ``batch_size`` calls. Use ``Client.batch()`` rather
+    than creating it directly:
+
+        with client.batch() as batch:
+            for file in files:
+                batch.remove_file(file.id)
+
+        for result in batch.results:
+            if not result.ok:
+                print(result.file_id, result.error)
+
+    Each method returns a ``BatchResult`` that is filled when the batch is executed. Sub-requests that fail with a
+    transient error (5XX, rate limit) are retried up to ``retries_count`` times; other errors are stored in the results
+    and never raised.
+    """
+
+    def __init__(self, client: "drive.Client", *,
+                 batch_size: int = MAX_BATCH_SIZE,
+                 retries_count: Optional[int] = None) -> None:
+        if not 0 < batch_size <= MAX_BATCH_SIZE:
+            raise ValueError("batch_size must be between 1 and %d" % MAX_BATCH_SIZE)
+
+        self.client = client
+        self.batch_size = batch_size
+        self.retries_count = client.download_retries_count if retries_count is None else retries_count
+        # results of all the queued operations
+        self.results: List[BatchResult] = []
+        # number of results that have already been executed
+        self._executed = 0
+        self._operations: List[_Operation] = []
+        # moves need the parents of the files before being sent
+        self._moves: List[Tuple[BatchResult, str]] = []
+
+    def __len__(self) -> int:
+        """Return the number of operations waiting to be executed."""
+        return len(self.results) - self._executed
+
+    def get_file_metadata(self, file_id: str, *, fields: Optional[Iterable[str]] = None) -> BatchResult:
+        """
+        Queue a ``Client.get_file_metadata`` call. The response is a dict of metadata.
+        """
+        return self._add("get_file_metadata", file_id,
+                         lambda: self.client._files.get(fileId=file_id, fields=self.client._fields(fields)))
+
+    def remove_file(self, file_id: str) -> BatchResult:
+        """
+        Queue a ``Client.remove_file`` call.
+        """
+        return self._add("remove_file", file_id, lambda: self.client._files.delete(fileId=file_id))
+
+    def update_file(self, file_id: str,
+                    remove_parents_ids: Optional[Iterable[str]] = None,
+                    add_parents_ids: Optional[Iterable[str]] = None,
+                    name: Optional[str] = None,
+                    *,
+                    fields: Optional[Iterable[str]] = None) -> BatchResult:
+        """
+        Queue a ``Client.update_file`` call. The response is a ``File``. Media updates can't be batched.
+        """
+        remove_parents_ids = list(remove_parents_ids) if remove_parents_ids else None
+        add_parents_ids = list(add_parents_ids) if add_parents_ids else None
+
+        if not (remove_parents_ids or add_parents_ids or name):
+            # Same as Client.update_file: this is a no-op
+            result = BatchResult("update_file", file_id)
+            result.done = True
+            self.results.append(result)
+            return result
+
+        def make_request() -> HttpRequest:
+            return self.client._update_file_request(file_id,
+                                                    remove_parents_ids=remove_parents_ids,
+                                                    add_parents_ids=add_parents_ids,
+                                                    name=name,
+                                                    fields=fields)
+
+        return self._add("update_file", file_id, make_request, lambda resp: File(resp, client=self.client))
+
+    def rename_file(self, file_id: str, name: str) -> BatchResult:
+        """
+        Queue a ``Client.rename_file`` call. The response is a ``File``.
+        """
+        return self.update_file(file_id, name=name)
+
+    def move_file_to_folder(self, file_id: str, folder_id: str) -> BatchResult:
+        """
+        Queue a ``Client.move_file_to_folder`` call. The response is a ``File``. The current parents of all moved files
+        are retrieved in batch as well.
+        """
+        result = BatchResult("move_file_to_folder", file_id)
+        self.results.append(result)
+        self._moves.append((result, folder_id))
+        return result
+
+    def grant_file_permissions(self, file_id: str, role: str, type_: str) -> BatchResult:
+        """
+        Queue a ``Client.grant_file_permissions`` call. The response is a dict describing the permission.
+        """
+        return self._add("grant_file_permissions", file_id,
+                         lambda: self.client._permissions.create(fileId=file_id, body={"role": role, "type": type_}))
+
+    def execute(self) -> List[BatchResult]:
+        """
+        Execute all the operations queued since the last execution and return their results, in the order they were
+        queued. This is called automatically at the end of a ``Client.batch()`` block.
+        """
+        if self._moves:
+            moves = self._moves
+            self._moves = []
+            self._execute_operations([self._move_parents_operation(result, folder_id) for result, folder_id in moves])
+            for _, folder_id in moves:
+                self.client.path_cache.invalidate_listing(folder_id)
+
+        operations = self._operations
+        self._operations = []
+        self._execute_operations(operations)
+
+        results = self.results[self._executed:]
+        self._executed = len(self.results)
+
+        cache = self.client.cache
+        for result in results:
+            if result.operation in MUTATING_OPERATIONS:
+                if cache is not None:
+                    cache.invalidate(result.file_id)
+                self.client.path_cache.invalidate(result.file_id)
+
+        return results
+
+    # Private API
+
+    def _add(self, operation: str, file_id: str,
+             make_request: Callable[[], HttpRequest],
+             postproc: Callable[[Any], Any] = lambda resp: resp) -> BatchResult:
+        result = BatchResult(operation, file_id)
+        self.results.append(result)
+        self._operations.append(_Operation(result, make_request, postproc))
+        return result
+
+    def _move_parents_operation(self, result: BatchResult, folder_id: str) -> _Operation:
+        """
+        Return an operation that gets the parents of the file to move, then queues the update that moves it.
+        """
+        file_id = result.file_id
+
+        def queue_update(metadata: Dict[str, Any]) -> None:
+            def make_request() -> HttpRequest:
+                return self.client._update_file_request(file_id,
+                                                        remove_parents_ids=metadata.get("parents"),
+                                                        add_parents_ids=[folder_id])
+
+            self._operations.append(_Operation(result, make_request, lambda resp: File(resp, client=self.client)))
+
+        return _Operation(result, lambda: self.client._files.get(fileId=file_id, fields="parents"), then=queue_update)
+
+    def _execute_operations(self, operations: List[_Operation]) -> None:
+        policy = self.client.retry_policy
+        for _ in operations:
+            policy.start_call()
+
+        retries = 0
+        while operations:
+            for i in range(0, len(operations), self.batch_size):
+                self._execute_batch(operations[i:i + self.batch_size])
+
+            if retries >= self.retries_count:
+                return
+            # allow_retry takes each retry from the client's retry budget
+            operations = [op for op in operations
+                          if op.result.error is not None and policy.allow_retry(op.result.error)]
+            if not operations:
+                return
+
+            retries += 1
+            policy.wait(retries, operations[0].result.error)
+
+    def _execute_batch(self, operations: List[_Operation]) -> None:
+        batch = self.client.service.new_batch_http_request()
+        for i, op in enumerate(operations):
+            batch.add(op.make_request(), callback=op.callback, request_id=str(i))
+
+        # Each call counts in the quota: the batch request itself takes one token from the rate limiter
+        if self.client.rate_limiter is not None and len(operations) > 1:
+            self.client.rate_limiter.acquire(len(operations) - 1)
+
+        start = time.perf_counter()
+        error: Optional[Exception] = None
+        try:
+            batch.execute()
+        except (HttpError, httplib2.HttpLib2Error, IOError) as e:
+            # The batch request itself failed
+            error = e
+            for op in operations:
+                op.result.done = True
+                op.result.error = e
+
+        if self.client.instrumentation is not None:
+            self.client.instrumentation.on_request(RequestEvent("batch", time.perf_counter() - start, error=error))
+
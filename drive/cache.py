@@ -0,0 +1,233 @@
+# -*- coding: UTF-8 -*-
+
+import copy
+import json
+import os.path
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+__all__ = ["MetadataCache", "MemoryBackend", "SqliteBackend"]
+
+# Default maximum number of entries of a cache
+DEFAULT_MAX_SIZE = 10000
+# Default time-to-live of the entries of a cache, in seconds
+DEFAULT_TTL = 300
+
+# Tag of the entries that record that a file doesn't exist
+MISSING_TAG = ""
+
+
+class MemoryBackend:
+    """
+    In-memory cache storage with LRU eviction and a time-to-live.
+
+    Backends store JSON-serializable values under string keys. Each entry has a tag, the ID of the file it describes,
+    so that all the entries of a file can be deleted at once.
+    """
+
+    def __init__(self, *, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL) -> None:
+        """
+        :param max_size: maximum number of entries. The least recently used ones are evicted first.
+        :param ttl: number of seconds after which an entry expires
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expiration time, tag, value)
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Return ``(True, value)`` if there's a fresh entry for ``key``, ``(False, None)`` otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] < time.monotonic():
+                self._delete(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[2]
+
+    def set(self, key: str, value: Any, tag: str) -> None:
+        with self._lock:
+            self._delete(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tag, value)
+            self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._delete(next(iter(self._entries)))
+
+    def delete_tag(self, tag: str) -> None:
+        """
+        Delete all the entries with this tag.
+        """
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._tags[entry[1]]
+        keys.discard(key)
+        if not keys:
+            del self._tags[entry[1]]
+
+
+class SqliteBackend:
+    """
+    On-disk cache storage in a SQLite database, with LRU eviction and a time-to-live. It can be shared by successive
+    processes. See ``MemoryBackend``.
+    """
+
+    def __init__(self, path: str, *, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL) -> None:
+        """
+        :param path: path of the database. It's created if it doesn't exist.
+        :param max_size: maximum number of entries. The least recently used ones are evicted first.
+        :param ttl: number of seconds after which an entry expires
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.expanduser(path), check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries"
+                             " (key TEXT PRIMARY KEY, value TEXT NOT NULL, tag TEXT NOT NULL,"
+                             " expires REAL NOT NULL, used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_tag ON entries (tag)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ? AND expires >= ?", (key, now)).fetchone()
+            if row is None:
+                return False, None
+            self._db.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+            return True, json.loads(row[0])
+
+    def set(self, key: str, value: Any, tag: str) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO entries (key, value, tag, expires, used) VALUES (?, ?, ?, ?, ?)",
+                             (key, json.dumps(value), tag, now + self.ttl, now))
+            self._db.execute("DELETE FROM entries WHERE expires < ?", (now,))
+            self._db.execute("DELETE FROM entries WHERE key IN"
+                             " (SELECT key FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_size,))
+
+    def delete_tag(self, tag: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries WHERE tag = ?", (tag,))
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class MetadataCache:
+    """
+    Cache of file metadata for a ``Client``, enabled with ``Client(cache=MetadataCache())``. It stores the results of
+    lookups by ID (``get_file``, ``get_file_metadata``, ``file_exists``…) and by name (``get_file_by_name``,
+    ``file_exists``, ``get_shared_file``), including the lookups that found nothing.
+
+    The entries of a file are invalidated when the client updates or removes it, and lookups that found nothing are
+    invalidated when the client creates a file or a folder. Changes made by other clients are only seen once the
+    entries expire.
+
+        cache = MetadataCache(ttl=600)
+        client = Client(cache=cache)
+        ...
+        print(cache.hits, cache.misses)
+    """
+
+    def __init__(self, backend: Any = None, *,
+                 max_size: int = DEFAULT_MAX_SIZE,
+                 ttl: float = DEFAULT_TTL,
+                 path: Optional[str] = None) -> None:
+        """
+        :param backend: storage backend. By default, a ``MemoryBackend``, or a ``SqliteBackend`` if ``path`` is set.
+        :param max_size: maximum number of entries
+        :param ttl: number of seconds after which an entry expires
+        :param path: path of a SQLite database to store the cache on disk
+        """
+        if backend is None:
+            backend = SqliteBackend(path, max_size=max_size, ttl=ttl) if path \
+                else MemoryBackend(max_size=max_size, ttl=ttl)
+
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        """Proportion of lookups that were found in the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Tuple[Any, ...]) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Look up the metadata stored under a key, e.g. ``("id", file_id, fields)``. Return ``(True, metadata)`` if it's
+        found, where ``metadata`` is ``None`` if the lookup found no file, and ``(False, None)`` otherwise.
+        """
+        found, value = self.backend.get(_serialize_key(key))
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        # Callers may modify the metadata they get
+        return found, copy.deepcopy(value)
+
+    def set(self, key: Tuple[Any, ...], metadata: Optional[Dict[str, Any]], file_id: Optional[str]) -> None:
+        """
+        Store the metadata of a file under a key. ``metadata`` and ``file_id`` are ``None`` if the lookup found no file.
+        """
+        self.backend.set(_serialize_key(key), copy.deepcopy(metadata), file_id or MISSING_TAG)
+
+    def invalidate(self, file_id: str) -> None:
+        """
+        Delete the entries of a file. Lookups that found nothing are also deleted, as the file may now match them.
+        """
+        self.backend.delete_tag(file_id)
+        self.backend.delete_tag(MISSING_TAG)
+
+    def invalidate_missing(self) -> None:
+        """
+        Delete the entries of lookups that found nothing.
+        """
+        self.backend.delete_tag(MISSING_TAG)
+
+    def clear(self) -> None:
+        """
+        Delete all the entries and reset the counters.
+        """
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def _serialize_key(key: Tuple[Any, ...]) -> str:
+    return json.dumps(key)
@@ -0,0 +1,214 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import os.path
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterator
+
+import drive
+from drive.retry import is_retryable
+from drive.files import File, _parse_datetime
+
+__all__ = ["Change", "ChangeFeed", "CREATED", "MODIFIED", "TRASHED", "REMOVED"]
+
+# Kinds of changes
+CREATED = "created"
+MODIFIED = "modified"
+TRASHED = "trashed"
+REMOVED = "removed"
+
+# Maximum number of changes the API returns in a single page
+MAX_CHANGES_PAGE_SIZE = 1000
+
+
+class Change:
+    """
+    Change of a file, yielded by a ``ChangeFeed``.
+    """
+
+    def __init__(self, kind: str, file_id: str, file: Optional[File], time: Optional[datetime]) -> None:
+        """
+        :param kind: ``"created"``, ``"modified"``, ``"trashed"`` or ``"removed"``
+        :param file_id: ID of the file
+        :param file: the file, unless it was removed or is no longer accessible
+        :param time: time of the change
+        """
+        self.kind = kind
+        self.file_id = file_id
+        self.file = file
+        self.time = time
+
+    def __repr__(self) -> str:
+        return "<Change %s %s>" % (self.kind, self.file_id)
+
+
+class ChangeFeed:
+    """
+    Feed of the changes of the files the client has access to, built on the Drive changes API. Each call to ``poll``
+    only fetches the changes since the previous one, so keeping an index up to date costs requests proportional to the
+    number of changes rather than to the number of files. Use ``Client.changes()`` to create one:
+
+        feed = client.changes(state_path="changes.json")
+        for change in feed.watch():
+            index.update(change)
+
+    The position of the feed is a page token. With a ``state_path``, it's saved in a JSON file after each page of
+    changes, so the next process starts where the previous one stopped. Changes are delivered at least once: those of
+    a page that was interrupted are delivered again.
+
+    A change is ``created`` if the file was created after the previous poll, ``trashed`` if the file is in the trash,
+    ``removed`` if it was deleted or is no longer shared with the client, and ``modified`` otherwise.
+    """
+
+    def __init__(self, client: "drive.Client", *,
+                 page_token: Optional[str] = None,
+                 state_path: Optional[str] = None,
+                 fields: Optional[str] = None,
+                 page_size: int = MAX_CHANGES_PAGE_SIZE) -> None:
+        """
+        :param client:
+        :param page_token: start at this page token. By default, start at the token saved in ``state_path``, or at
+            the current state of the Drive if there is none: only future changes are then yielded.
+        :param state_path: path of the JSON file where the position of the feed is saved
+        :param fields: metadata fields to request for the changed files. Default to the client's ``file_fields``.
+        :param page_size: number of changes to fetch in each request
+        """
+        self.client = client
+        self.state_path = os.path.expanduser(state_path) if state_path else None
+        self.page_size = page_size
+        # noinspection PyProtectedMember
+        self._fields = client._fields(fields)
+        # needed to tell the kind of changes
+        for field in ("trashed", "createdTime"):
+            if field not in self._fields.split(","):
+                self._fields += "," + field
+
+        # Files created after this time are reported as created
+        self._checkpoint: Optional[datetime] = None
+        self.page_token: Optional[str] = page_token
+
+        if page_token is None and self.state_path:
+            state = self._load_state()
+            if state:
+                self.page_token = state["page_token"]
+                self._checkpoint = _parse_datetime(state["checkpoint"]) if state.get("checkpoint") else None
+
+        if self.page_token is None:
+            self._checkpoint = datetime.now(timezone.utc)
+            self.page_token = self.client._execute(self.client._changes.getStartPageToken())["startPageToken"]
+            self._save_state()
+
+    def poll(self) -> Iterator[Change]:
+        """
+        Yield the changes since the last poll, fetching them one page at a time. The position of the feed is updated
+        after each page.
+        """
+        checkpoint = self._checkpoint
+        latest = checkpoint
+        fields = "nextPageToken,newStartPageToken,changes(changeType,removed,fileId,time,file(%s))" \
+                 % self._fields
+
+        while True:
+            resp = self.client._execute(self.client._changes.list(pageToken=self.page_token,
+                                                                  pageSize=self.page_size,
+                                                                  fields=fields))
+
+            for attrs in resp.get("changes", []):
+                change = self._make_change(attrs, checkpoint)
+                if change is None:
+                    continue
+                if change.time and (latest is None or change.time > latest):
+                    latest = change.time
+                yield change
+
+            if "nextPageToken" in resp:
+                self.page_token = resp["nextPageToken"]
+                self._save_state()
+                continue
+
+            self.page_token = resp["newStartPageToken"]
+            self._checkpoint = latest
+            self._save_state()
+            return
+
+    def watch(self, *,
+              interval: float = 30,
+              max_interval: float = 600,
+              stop: Optional[threading.Event] = None) -> Iterator[Change]:
+        """
+        Poll for changes forever and yield them. After a poll that returns no changes, the delay before the next one is
+        doubled, up to ``max_interval`` seconds; it goes back to ``interval`` as soon as there are changes. Transient
+        errors are retried with the same backoff.
+
+        :param interval: minimum delay between two polls, in seconds
+        :param max_interval: maximum delay between two polls, in seconds
+        :param stop: if given, stop polling when this event is set
+        """
+        empty_polls = 0
+        while stop is None or not stop.is_set():
+            changed = False
+            try:
+                for change in self.poll():
+                    changed = True
+                    yield change
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+
+            empty_polls = 0 if changed else empty_polls + 1
+            delay = min(interval * 2 ** max(empty_polls - 1, 0), max_interval)
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+
+    # Private API
+
+    def _make_change(self, attrs: Dict[str, Any], checkpoint: Optional[datetime]) -> Optional[Change]:
+        if attrs.get("changeType", "file") != "file":
+            # changes of shared drives themselves
+            return None
+
+        change_time = _parse_datetime(attrs["time"]) if attrs.get("time") else None
+        file_attrs = attrs.get("file")
+        if attrs.get("removed") or not file_attrs:
+            return Change(REMOVED, attrs["fileId"], None, change_time)
+
+        file = File(file_attrs, client=self.client)
+        if file_attrs.get("trashed"):
+            kind = TRASHED
+        elif checkpoint and file_attrs.get("createdTime") and _parse_datetime(file_attrs["createdTime"]) > checkpoint:
+            kind = CREATED
+        else:
+            kind = MODIFIED
+
+        return Change(kind, attrs["fileId"], file, change_time)
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:  # type: ignore
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self) -> None:
+        if not self.state_path:
+            return
+
+        state = {
+            "page_token": self.page_token,
+            "checkpoint": self._checkpoint.isoformat() if self._checkpoint else None,
+        }
+        directory = os.path.dirname(self.state_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,41 +1,58 @@
 # -*- coding: UTF-8 -*-
 
 import io
+import logging
 import os.path
-import random
 import sys
-import time
-from typing import BinaryIO, Optional, List, Literal, Any, Tuple, Dict, Iterable, Union, cast
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from functools import cached_property
+from typing import BinaryIO, Optional, List, Literal, Any, Tuple, Dict, Iterable, Iterator, Union, Callable, TypeVar, \
+    Deque, cast
 
 import httplib2
 import openpyxl
-from apiclient import discovery  # type: ignore
 from googleapiclient.errors import HttpError  # type: ignore
 from googleapiclient.http import HttpRequest, MediaUpload, MediaIoBaseDownload, MediaIoBaseUpload  # type: ignore
 
 from drive import mimetypes
-from drive.auth import authorize_credentials
-from drive.exceptions import FileNotFoundException
-from drive.files import File, guess_original_mime_type
+from drive.auth import authorize, get_credentials
+from drive.cache import MetadataCache
+from drive.batch import Batch, MAX_BATCH_SIZE
+from drive.changes import ChangeFeed
+from drive.exceptions import DriveException, FileNotFoundException, UploadTreeError
+from drive.files import File, FILE_FIELDS, guess_original_mime_type
+from drive.instrumentation import Instrumentation, observe
+from drive.paths import PathCache
+from drive.pool import HttpPool
+from drive.progress import ProgressCallback, ProgressTracker
+from drive.ratelimit import TokenBucket
+from drive.retry import RetryPolicy
+from drive.services import build_service
+from drive.sheets import sheet_lines_as_dicts
+from drive.streams import iter_csv_rows, open_stream
+from drive.uploads import UploadStateStore, upload_state_key
 
-# Retry transport and file IO errors.
-RETRYABLE_ERRORS = (httplib2.HttpLib2Error, IOError)
 # Default number of bytes to send/receive in each request.
 CHUNKSIZE = 2 * 1024 * 1024
+# Files of at least this many bytes are uploaded with a resumable upload by default.
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+# Maximum number of files the API returns in a single page.
+MAX_PAGE_SIZE = 1000
+# Default number of folders listed by a single query when walking a tree. Each folder adds about 50 characters to the
+# query.
+WALK_FOLDERS_PER_QUERY = 50
 
 QueryClause = Tuple[str, str, Any]
+# Field mask: either a comma-separated string or an iterable of field names
+Fields = Union[str, Iterable[str]]
 
+T = TypeVar("T")
 
-def handle_progressless_iter(error: Exception, progressless_iters: int, *, retries_count: int = 5) -> None:
-    if progressless_iters > retries_count:
-        print('Failed to make progress for too many consecutive iterations.')
-        raise error
-
-    sleep_time = random.random() * (2 ** progressless_iters)
-    # TODO: use a logger
-    print('Caught exception (%s). Sleeping for %s seconds before retry #%d.'
-          % (str(error), sleep_time, progressless_iters))
-    time.sleep(sleep_time)
+logger = logging.getLogger(__name__)
 
 
 def print_with_carriage_return(s: str) -> None:
@@ -62,6 +79,27 @@ def _make_querystring(clauses: Iterable[QueryClause], join: str = "and") -> str:
     return (" %s " % join).join(parts)
 
 
+def _make_files_query(name_equals: Optional[str] = None,
+                      name_contains: Optional[str] = None,
+                      mimetype: Optional[str] = None,
+                      parents_in: Optional[str] = None) -> str:
+    """
+    Make the query string to list non-trashed files matching all the given criteria.
+    """
+    query_clauses: List[QueryClause] = [("trashed", "=", False)]
+
+    if name_equals:
+        query_clauses.append(("name", "=", name_equals))
+    if name_contains:
+        query_clauses.append(("name", "contains", name_contains))
+    if mimetype:
+        query_clauses.append(("mimeType", "=", mimetype))
+    if parents_in:
+        query_clauses.append(("parents", "in", parents_in))
+
+    return _make_querystring(query_clauses)
+
+
 def _make_query_clause(field: str, op: str, value: Any, negation: bool = False) -> str:
     serialized_value = _serialize_query_value(value)
     if op == "in":
@@ -73,6 +111,16 @@ def _make_query_clause(field: str, op: str, value: Any, negation: bool = False)
     return p
 
 
+def _make_fields_mask(fields: Fields) -> str:
+    """
+    Make a field mask (``fields`` parameter) from either a string or an iterable of field names. See:
+        https://developers.google.com/drive/api/guides/fields-parameter
+    """
+    if isinstance(fields, str):
+        return fields
+    return ",".join(fields)
+
+
 def _resolve_parent_id(parent: Union[File, str]) -> str:
     if isinstance(parent, File):
         return parent.id
@@ -89,23 +137,154 @@ def _serialize_query_value(value: Any) -> str:
     return "'%s'" % str(value).replace("\\", "\\\\").replace("'", "\\'")
 
 
+def _add_fields(fields: str, *names: str) -> str:
+    """
+    Add field names to a field mask if they are not in it.
+    """
+    for name in names:
+        if name not in fields.split(","):
+            fields += "," + name
+    return fields
+
+
+def _reader_size(reader: BinaryIO) -> Optional[int]:
+    """
+    Return the number of bytes left in a reader, or ``None`` if it can't be determined.
+    """
+    try:
+        position = reader.tell()
+        size = reader.seek(0, io.SEEK_END)
+        reader.seek(position)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return size - position
+
+
+def _method_id(req: Any) -> str:
+    """
+    Return the ID of the API method of a request, like ``"drive.files.list"``.
+    """
+    return getattr(req, "methodId", None) or "unknown"
+
+
+def _progress_delta(get_progress: Callable[[Any], Optional[int]], *, start: int = 0) -> Callable[[Any], int]:
+    """
+    Make a function that returns the number of bytes transferred by a chunk, from a function that returns the number
+    of bytes transferred since the start of the transfer after a chunk.
+    """
+    last = start
+
+    def delta(result: Any) -> int:
+        nonlocal last
+        progress = get_progress(result)
+        if progress is None:
+            return 0
+        count = max(progress - last, 0)
+        last = max(progress, last)
+        return count
+
+    return delta
+
+
+def _fetch_range(http: Union[httplib2.Http, HttpPool], uri: str, headers: Dict[str, str],
+                 start: int, end: int) -> bytes:
+    """
+    Fetch the bytes ``start`` to ``end`` (inclusive) of a media URI.
+    """
+    range_headers = dict(headers)
+    range_headers["range"] = "bytes=%d-%d" % (start, end)
+    resp, content = http.request(uri, "GET", headers=range_headers)
+    if resp.status >= 300:
+        raise HttpError(resp, content, uri=uri)
+    if resp.status != 206 or len(content) != end - start + 1:
+        raise DriveException("Unexpected response to a range request on %s (status %d, %d bytes)"
+                             % (uri, resp.status, len(content)))
+    return content
+
+
 class Client:
-    """Google Drive client"""
+    """
+    Google Drive client.
 
-    def __init__(self, credentials_path: Optional[str] = None, *, download_retries_count: int = 5) -> None:
-        http: httplib2.Http = authorize_credentials(credentials_path)
-        self.service: Any = discovery.build('drive', 'v3', http=http)
-        self.download_retries_count: int = download_retries_count
+    A client can be shared between threads: each request uses its own HTTP connection from a pool of at most
+    ``max_connections`` connections.
+    """
 
-    @property
+    def __init__(self, credentials_path: Optional[str] = None, *,
+                 download_retries_count: int = 5,
+                 chunksize: int = CHUNKSIZE,
+                 file_fields: Fields = FILE_FIELDS,
+                 max_connections: int = 10,
+                 resumable_threshold: int = RESUMABLE_THRESHOLD,
+                 upload_state_dir: Optional[str] = None,
+                 cache: Optional[MetadataCache] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 progress_callback: Optional[ProgressCallback] = None,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        :param credentials_path: path to the service account key JSON file. If ``None``, use the path given by the
+            environment variable ``GOOGLE_APPLICATION_CREDENTIALS``.
+        :param download_retries_count: how many times a request or a chunk is retried before giving up
+        :param chunksize: default number of bytes to send or fetch in each request when uploading or downloading a file
+        :param file_fields: metadata fields to request by default for files. Defaults to the fields used by ``File``;
+            add ``drive.files.EXTRA_FILE_FIELDS`` to also get the modification time and MD5 checksum of files.
+        :param max_connections: maximum number of concurrent HTTP connections. This bounds the number of requests
+            that can be made in parallel from multiple threads.
+        :param resumable_threshold: files of at least this many bytes are uploaded in chunks with a resumable upload
+        :param upload_state_dir: if set, the sessions of resumable uploads of local files are saved in this directory,
+            so that an upload interrupted by a crash is resumed by the next upload of the same file instead of starting
+            over. See ``drive.uploads.UploadStateStore``.
+        :param cache: if set, cache the metadata of the files looked up by ID or by name. See
+            ``drive.cache.MetadataCache``.
+        :param retry_policy: policy used to retry the requests that fail with a transient error. By default, they are
+            retried up to ``download_retries_count`` times with an exponential backoff. See ``drive.retry.RetryPolicy``.
+        :param rate_limiter: if set, rate limiter applied to all requests, e.g.
+            ``TokenBucket.from_quota(queries_per_100s)``. Use a ``drive.ratelimit.FileTokenBucket`` to share a quota
+            between processes.
+        :param progress_callback: if set, function called with a ``drive.progress.TransferProgress`` after each chunk
+            of the uploads and downloads, e.g. ``drive.progress.log_progress``. It can be overridden with the
+            ``progress`` argument of each transfer.
+        :param instrumentation: if set, receive an event for each call to the API, with its duration, outcome, number
+            of retries and number of bytes transferred. See ``drive.instrumentation``.
+        """
+        credentials = get_credentials(credentials_path)
+        self.rate_limiter: Optional[TokenBucket] = rate_limiter
+        self._http_pool = HttpPool(lambda: authorize(credentials), max_size=max_connections, credentials=credentials,
+                                   rate_limiter=rate_limiter)
+        self.service: Any = build_service('drive', 'v3', http=self._http_pool)
+        self.download_retries_count: int = download_retries_count
+        self.chunksize: int = chunksize
+        self.file_fields: str = _make_fields_mask(file_fields)
+        self.resumable_threshold: int = resumable_threshold
+        self.upload_states: Optional[UploadStateStore] = \
+            UploadStateStore(upload_state_dir) if upload_state_dir else None
+        self.cache: Optional[MetadataCache] = cache
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy(max_retries=download_retries_count)
+        self.progress_callback: Optional[ProgressCallback] = progress_callback
+        self.instrumentation: Optional[Instrumentation] = instrumentation
+
+    # Creating a resource object is expensive (a few milliseconds), so it's done only once
+    @cached_property
     def _files(self) -> Any:
         return self.service.files()
 
-    @property
+    @cached_property
+    def _changes(self) -> Any:
+        return self.service.changes()
+
+    @cached_property
     def _permissions(self) -> Any:
         return self.service.permissions()
 
-    def create_folder(self, name: str, parent_id: Optional[str] = None) -> File:
+    @cached_property
+    def path_cache(self) -> PathCache:
+        """
+        Cache of directory listings used by ``get_by_path`` and ``get_by_paths``.
+        """
+        return PathCache(self)
+
+    def create_folder(self, name: str, parent_id: Optional[str] = None, *, fields: Optional[Fields] = None) -> File:
         file_metadata: Dict[str, Any] = {
             "name": name,
             "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER,
@@ -113,7 +292,12 @@ class Client:
         if parent_id:
             file_metadata["parents"] = [parent_id]
 
-        return cast(File, self._execute_file_request(self._files.create(body=file_metadata)))
+        folder = cast(File, self._execute_file_request(self._files.create(body=file_metadata,
+                                                                          fields=self._fields(fields))))
+        if self.cache is not None:
+            self.cache.invalidate_missing()
+        self.path_cache.invalidate_listing(parent_id or "root")
+        return folder
 
     def get_or_create_folder(self, folder_name: str, parent_id: Optional[str] = None) -> File:
         """
@@ -136,28 +320,96 @@ class Client:
         """
         Remove a file by its ID.
         """
-        return self._files.delete(fileId=file_id).execute()
+        try:
+            return self._execute(self._files.delete(fileId=file_id))
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(file_id)
+            self.path_cache.invalidate(file_id)
+
+    def get_file_metadata(self, file_id: str, *,
+                          raise_if_not_found: bool = True,
+                          fields: Optional[Fields] = None,
+                          **kw) -> Optional[dict[str, Any]]:
+        """
+        Get the metadata of a file as a dict.
+
+        :param file_id:
+        :param raise_if_not_found: if ``True`` (default), raise an exception if the file doesn’t exist
+        :param fields: metadata fields to request. Default to the client's ``file_fields``.
+        :param kw: additional parameters for the API call
+        """
+        fields_mask = self._fields(fields)
+        cache_key = ("id", file_id, fields_mask)
+        if self.cache is not None and not kw:
+            found, metadata = self.cache.get(cache_key)
+            if found:
+                return metadata
 
-    def get_file_metadata(self, file_id: str, *, raise_if_not_found: bool = True, **kw) -> Optional[dict[str, Any]]:
         try:
-            return self._files.get(fileId=file_id, **kw).execute()
+            metadata = self._execute(self._files.get(fileId=file_id, fields=fields_mask, **kw))
         except HttpError:
             if not raise_if_not_found:
                 return None
             raise
 
-    def get_file(self, file_id: str, *, raise_if_not_found: bool = True) -> Optional[File]:
+        if self.cache is not None and not kw:
+            # file_id may be an alias like "root"
+            self.cache.set(cache_key, metadata, metadata.get("id", file_id))
+        return metadata
+
+    def get_file(self, file_id: str, *,
+                 raise_if_not_found: bool = True,
+                 fields: Optional[Fields] = None) -> Optional[File]:
         """
         Get a file by its ID.
 
         :param file_id:
         :param raise_if_not_found: if ``True`` (default), raise an exception if the file doesn’t exist
+        :param fields: metadata fields to request. Default to the client's ``file_fields``.
         """
-        fm = self.get_file_metadata(file_id, raise_if_not_found=raise_if_not_found)
+        fm = self.get_file_metadata(file_id, raise_if_not_found=raise_if_not_found, fields=fields)
         if fm:
             return File(fm, client=self)
         return None
 
+    def hydrate(self, files: Iterable[File], *, fields: Optional[Fields] = None) -> List[File]:
+        """
+        Fetch the metadata of all files that don't have a name yet, in batch requests, and update them in place. This
+        avoids making one request per file when getting their names, e.g. to sort or print them:
+
+            parents = client.hydrate(file.parents())
+            print(sorted(parents))
+
+        Files whose metadata can't be fetched, e.g. because they don't exist or the request failed, are left
+        unchanged: their metadata are fetched again the next time they're needed.
+
+        :param files: files to hydrate
+        :param fields: metadata fields to request. Default to the client's ``file_fields``.
+        :return: the files, as a list
+        """
+        files = list(files)
+        missing: Dict[str, List[File]] = {}
+        for file in files:
+            # noinspection PyProtectedMember
+            if file._name is None and not file._fetched_name:
+                missing.setdefault(file.id, []).append(file)
+
+        if not missing:
+            return files
+
+        with self.batch() as batch:
+            results = {file_id: batch.get_file_metadata(file_id, fields=fields) for file_id in missing}
+
+        for file_id, result in results.items():
+            if not result.ok:
+                continue
+            for file in missing[file_id]:
+                file._update(result.response)
+                file._fetched_name = True
+
+        return files
+
     def get_file_by_name(self, name: str, parent_id: Optional[str] = None) -> File:
         """
         Get a file by name.
@@ -168,11 +420,44 @@ class Client:
         :param parent_id: optional parent ID.
         :raise: ``drive.exceptions.FileNotFoundException`` if the file doesn’t exist
         """
-        ls = self.list_files(name_equals=name, n=1, parents_in=parent_id)
-        if not ls:
+        file = self._find_file_by_name(name, parent_id)
+        if file is None:
             raise FileNotFoundException(name)
 
-        return ls[0]
+        return file
+
+    def get_by_path(self, path: str, root: Union[str, File] = "root", *,
+                    raise_if_not_found: bool = True) -> Optional[File]:
+        """
+        Get a file by its path, e.g. ``"Reports/2026/Q3/summary.xlsx"``. Segments are separated by slashes; empty
+        segments are ignored, so ``""`` designates ``root`` itself.
+
+        The listings of the folders on the path are cached in ``path_cache``, so resolving paths that share a prefix
+        only lists the common folders once. Like with ``get_file_by_name``, if a folder has multiple children with the
+        same name, one of them is picked.
+
+        :param path: path of the file, relative to ``root``
+        :param root: folder the path starts from, or its ID
+        :param raise_if_not_found: if ``False``, return ``None`` instead of raising an exception if there is no file
+            at this path
+        :raise: ``drive.exceptions.FileNotFoundException`` if the file doesn’t exist
+        """
+        file = self.path_cache.resolve(path, _resolve_parent_id(root))
+        if file is None and raise_if_not_found:
+            raise FileNotFoundException(path)
+
+        return file
+
+    def get_by_paths(self, paths: Iterable[str], root: Union[str, File] = "root") -> Dict[str, Optional[File]]:
+        """
+        Get multiple files by their path and return a dict mapping each path to its file, or to ``None`` if it doesn't
+        exist. Paths are resolved one level at a time, with one query per distinct folder instead of one per segment of
+        each path. See ``get_by_path``.
+
+        :param paths: paths of the files, relative to ``root``
+        :param root: folder the paths start from, or its ID
+        """
+        return self.path_cache.resolve_many(paths, _resolve_parent_id(root))
 
     def file_exists(self,
                     name: Optional[str] = None,
@@ -193,16 +478,15 @@ class Client:
         if file_id:
             return self.get_file(file_id, raise_if_not_found=False)
 
-        files = self.list_files(name_equals=name, parents_in=parent_id, n=1)
-        if not files:
-            return None
-        return files[0]
+        return self._find_file_by_name(cast(str, name), parent_id)
 
-    def files_shared_with_me(self) -> List[File]:
+    def files_shared_with_me(self, *, fields: Optional[Fields] = None) -> List[File]:
         """
         Return a list of files (and 'directories') 'shared with me'.
+
+        :param fields: metadata fields to request. Default to the client's ``file_fields``.
         """
-        return cast(List[File], self._execute_file_request(self._files.list(q="sharedWithMe=true")))
+        return list(self._iter_file_pages(q="sharedWithMe=true", fields=fields))
 
     def get_shared_file(self, name: str,
                         *,
@@ -213,14 +497,28 @@ class Client:
         If ``is_directory`` is a boolean, it’s used to filter files that are (or not) directories. By default, the first
         matching file is returned without checking if it’s a directory or not.
         """
-        for shared in self.files_shared_with_me():
-            if shared.name == name:
-                if is_directory is False and shared.is_directory:
-                    continue
-                if is_directory and not shared.is_directory:
-                    continue
+        cache_key = ("shared", name, is_directory, self.file_fields)
+        found = False
+        metadata: Optional[Dict[str, Any]] = None
+        if self.cache is not None:
+            found, metadata = self.cache.get(cache_key)
+
+        if not found:
+            for shared in self._iter_file_pages(q="sharedWithMe=true"):
+                if shared.name == name:
+                    if is_directory is False and shared.is_directory:
+                        continue
+                    if is_directory and not shared.is_directory:
+                        continue
+
+                    metadata = shared.to_dict()
+                    break
+
+            if self.cache is not None:
+                self.cache.set(cache_key, metadata, metadata["id"] if metadata else None)
 
-                return shared
+        if metadata is not None:
+            return File(metadata, client=self)
 
         if raise_if_not_found:
             raise FileNotFoundException(name)
@@ -244,32 +542,123 @@ class Client:
                    name_contains: Optional[str] = None,
                    mimetype: Optional[str] = None,
                    parents_in: Optional[str] = None,
-                   n: int = 100) -> List[File]:
+                   n: Optional[int] = 100,
+                   *,
+                   fields: Optional[Fields] = None) -> List[File]:
         """
-        Return the names and IDs for up to N files.
+        Return the names and IDs for up to N files. If ``n`` is ``None``, return all matching files. See also
+        ``iter_files``.
         """
+        return list(self.iter_files(name_equals=name_equals,
+                                    name_contains=name_contains,
+                                    mimetype=mimetype,
+                                    parents_in=parents_in,
+                                    limit=n,
+                                    fields=fields))
+
+    def iter_files(self,
+                   name_equals: Optional[str] = None,
+                   name_contains: Optional[str] = None,
+                   mimetype: Optional[str] = None,
+                   parents_in: Optional[str] = None,
+                   *,
+                   limit: Optional[int] = None,
+                   page_size: int = MAX_PAGE_SIZE,
+                   fields: Optional[Fields] = None) -> Iterator[File]:
+        """
+        Iterate over files. This returns a generator that fetches the results one page at a time, as they are consumed.
+
+        :param name_equals:
+        :param name_contains:
+        :param mimetype:
+        :param parents_in: ID of a parent directory
+        :param limit: stop after this many files. If ``None`` (default), yield all matching files.
+        :param page_size: number of files to fetch in each request.
+        :param fields: metadata fields to request for each file. Default to the client's ``file_fields``.
+        :return:
+        """
+        q = _make_files_query(name_equals=name_equals,
+                              name_contains=name_contains,
+                              mimetype=mimetype,
+                              parents_in=parents_in)
+
+        return self._iter_file_pages(q=q, limit=limit, page_size=page_size, fields=fields)
+
+    def walk(self, top: Union[str, File], *,
+             max_depth: Optional[int] = None,
+             parallelism: int = 4,
+             folders_per_query: int = WALK_FOLDERS_PER_QUERY,
+             fields: Optional[Fields] = None) -> Iterator[Tuple[File, List[File], List[File]]]:
+        """
+        Walk a directory tree, in the spirit of ``os.walk``. This yields a ``(folder, folders, files)`` tuple for each
+        folder of the tree, starting with ``top``: ``folders`` are its sub-folders and ``files`` its other files.
+
+        Folders are listed by ``parallelism`` threads, each query listing the content of up to ``folders_per_query``
+        folders at once. A tuple is yielded as soon as its folder has been listed: folders always come after their
+        parent, but otherwise in no particular order. Like with ``os.walk``, removing items from ``folders`` prevents
+        the walk from descending into them. A folder reachable through multiple paths is yielded only once.
+
+        :param top: root folder, or its ID
+        :param max_depth: if set, don't list folders deeper than this, ``top`` having a depth of 0. ``max_depth=0``
+            yields only ``top``.
+        :param parallelism: number of threads listing folders
+        :param folders_per_query: maximum number of folders listed by each query
+        :param fields: metadata fields to request for each file. Default to the client's ``file_fields``. ``mimeType``
+            and ``parents`` are always requested.
+        :return:
+        """
+        if isinstance(top, str):
+            top = File({"id": top, "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER}, client=self)
 
-        query_clauses: List[QueryClause] = [("trashed", "=", False)]
-
-        if name_equals:
-            query_clauses.append(("name", "=", name_equals))
-        if name_contains:
-            query_clauses.append(("name", "contains", name_contains))
-        if mimetype:
-            query_clauses.append(("mimeType", "=", mimetype))
-        if parents_in:
-            query_clauses.append(("parents", "in", parents_in))
+        fields_mask = _add_fields(self._fields(fields), "mimeType", "parents")
 
-        q = _make_querystring(query_clauses)
+        # folders to list, with their depth
+        pending: Deque[Tuple[File, int]] = deque([(top, 0)])
+        seen = {top.id}
+        running: Dict[Future, List[Tuple[File, int]]] = {}
+        stop = threading.Event()
 
-        return cast(List[File], self._execute_file_request(self._files.list(q=q, pageSize=n)))
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            try:
+                while pending or running:
+                    while pending and len(running) < parallelism:
+                        group = [pending.popleft() for _ in range(min(folders_per_query, len(pending)))]
+                        future = pool.submit(self._list_folders, [folder.id for folder, _ in group], fields_mask, stop)
+                        running[future] = group
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        group = running.pop(future)
+                        children = future.result()
+                        for folder, depth in group:
+                            folders: List[File] = []
+                            files: List[File] = []
+                            for child in children.get(folder.id, ()):
+                                (folders if child.is_directory else files).append(child)
+
+                            yield folder, folders, files
+
+                            if max_depth is not None and depth >= max_depth:
+                                continue
+                            for subfolder in folders:
+                                if subfolder.id not in seen:
+                                    seen.add(subfolder.id)
+                                    pending.append((subfolder, depth + 1))
+            finally:
+                # Don't wait for the listings in progress if the walk is interrupted
+                stop.set()
+                for future in running:
+                    future.cancel()
 
     def update_file(self, file_id: str,
                     remove_parents_ids: Optional[Iterable[str]] = None,
                     add_parents_ids: Optional[Iterable[str]] = None,
                     name: Optional[str] = None,
                     media: Optional[MediaUpload] = None,
-                    force: bool = False) -> Optional[File]:
+                    force: bool = False,
+                    *,
+                    fields: Optional[Fields] = None,
+                    progress: Optional[ProgressCallback] = None) -> Optional[File]:
         """
         Update a file.
 
@@ -282,27 +671,31 @@ class Client:
         :param name: new name of the file
         :param media:
         :param force: force update even if there are no modifications
+        :param fields: metadata fields to request for the updated file. Default to the client's ``file_fields``.
+        :param progress: function called with the progress of the upload of ``media``. Default to the client's
+            ``progress_callback``.
         :return:
         """
-        modified = force or remove_parents_ids or add_parents_ids or name or media
-        if not modified:
+        add_parents_ids = list(add_parents_ids) if add_parents_ids else None
+        req = self._update_file_request(file_id,
+                                        remove_parents_ids=remove_parents_ids,
+                                        add_parents_ids=add_parents_ids,
+                                        name=name,
+                                        media=media,
+                                        force=force,
+                                        fields=fields)
+        if req is None:
             return None
 
-        kw: Dict[str, Any] = {}
-
-        if remove_parents_ids:
-            kw["removeParents"] = ",".join(remove_parents_ids)
-
-        if add_parents_ids:
-            kw["addParents"] = ",".join(add_parents_ids)
-
-        if name:
-            kw["body"] = {"name": name}
-
-        if media:
-            kw["media_body"] = media
-
-        return cast(File, self._execute_file_request(self._files.update(fileId=file_id, **kw)))
+        try:
+            tracker = self._progress_tracker("upload", file_id, progress, media.size() if media else None)
+            return cast(File, self._execute_file_request(req, progress=tracker))
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(file_id)
+            self.path_cache.invalidate(file_id)
+            for parent_id in add_parents_ids or ():
+                self.path_cache.invalidate_listing(parent_id)
 
     def move_file_to_folder(self, file_id: str, folder_id: str) -> Optional[File]:
         # Retrieve the existing parents to remove
@@ -315,10 +708,16 @@ class Client:
         """
         return self.update_file(file_id, name=name)
 
-    def download(self, file_id: str, writer: BinaryIO, mime_type: Optional[str] = None) -> None:
+    def download(self, file_id: str, writer: BinaryIO, mime_type: Optional[str] = None, *,
+                 chunksize: Optional[int] = None,
+                 progress: Optional[ProgressCallback] = None) -> None:
         """
         Download a file and write its content using the binary writer ``writer``. See also ``download_file``.
 
+        The file is fetched in chunks of ``chunksize`` bytes with HTTP Range requests and each chunk is written as soon
+        as it's received, so the memory usage doesn't depend on the size of the file. A chunk that fails because of a
+        transport or 5XX error is retried up to ``download_retries_count`` times without restarting the download.
+
         Example:
 
             with open("my_file.ext", "wb") as f:
@@ -326,31 +725,97 @@ class Client:
 
         :param file_id:
         :param writer: binary writer
-        :param mime_type:
+        :param mime_type: if given, export the file in this MIME type
+        :param chunksize: number of bytes to fetch in each request. Default to the client's ``chunksize``.
+        :param progress: function called with a ``drive.progress.TransferProgress`` after each chunk. Default to the
+            client's ``progress_callback``.
         :return:
         """
-        kw = dict(fileId=file_id)
-        fn = self._files.get_media
-
-        if mime_type:
-            kw["mimeType"] = mime_type
-            fn = self._files.export_media
-
-        downloader = MediaIoBaseDownload(writer, fn(**kw))
-        # bypass the downloader; there appear to be a bug for large files
-        # noinspection PyProtectedMember
-        writer.write(downloader._request.execute())
+        tracker = self._progress_tracker("download", file_id, progress)
+        req = self._media_request(file_id, mime_type)
+        downloader = MediaIoBaseDownload(writer, req, chunksize=chunksize or self.chunksize)
+        for status, done in self._iter_chunks(downloader.next_chunk, tracker, method=_method_id(req),
+                                              bytes_of=_progress_delta(lambda r: r[0].resumable_progress)):
+            if tracker is not None:
+                tracker.update(status.resumable_progress, status.total_size)
+            if done:
+                break
+
+        if tracker is not None:
+            tracker.finish()
+
+    def iter_download(self, file_id: str, mime_type: Optional[str] = None, *,
+                      chunksize: Optional[int] = None,
+                      progress: Optional[ProgressCallback] = None) -> Iterator[bytes]:
+        """
+        Download a file and yield its content in chunks of ``chunksize`` bytes as they are received. Like with
+        ``download``, a chunk that fails because of a transient error is retried without restarting the download. See
+        also ``drive.streams.open_stream`` to read the chunks as a file.
 
-    def download_file(self, file_id: str, path: str, mime_type: Optional[str] = None) -> None:
+        :param file_id:
+        :param mime_type: if given, export the file in this MIME type
+        :param chunksize: number of bytes to fetch in each request. Default to the client's ``chunksize``.
+        :param progress: see ``download``
+        :return:
+        """
+        tracker = self._progress_tracker("download", file_id, progress)
+        buffer = io.BytesIO()
+        req = self._media_request(file_id, mime_type)
+        downloader = MediaIoBaseDownload(buffer, req, chunksize=chunksize or self.chunksize)
+        for status, done in self._iter_chunks(downloader.next_chunk, tracker, method=_method_id(req),
+                                              bytes_of=_progress_delta(lambda r: r[0].resumable_progress)):
+            if tracker is not None:
+                tracker.update(status.resumable_progress, status.total_size)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+            if done:
+                break
+
+        if tracker is not None:
+            tracker.finish()
+
+    def download_file(self, file_id: str, path: str, mime_type: Optional[str] = None, *,
+                      chunksize: Optional[int] = None,
+                      parallelism: int = 1,
+                      progress: Optional[ProgressCallback] = None) -> None:
         """
         Download a file and save it locally.
+
+        If ``parallelism`` is greater than 1, the file is split in byte ranges of ``chunksize`` bytes that are fetched
+        concurrently by ``parallelism`` threads, each one with its own HTTP connection, and written directly at their
+        position in the local file. The number of concurrent connections is bounded by the client's
+        ``max_connections``. This only applies to binary files whose size is known: Google Docs, exports
+        (``mime_type``) and platforms without ``os.pwrite`` fall back to a sequential download.
+
         :param file_id: file ID
         :param path: local path where to save the file.
         :param mime_type: optional mime type
+        :param chunksize: number of bytes to fetch in each request. Default to the client's ``chunksize``.
+        :param parallelism: number of concurrent connections to use.
+        :param progress: see ``download``
         :return:
         """
+        chunksize = chunksize or self.chunksize
+        size: Optional[int] = None
+        if parallelism > 1 and not mime_type and hasattr(os, "pwrite"):
+            metadata = self.get_file_metadata(file_id, fields="size")
+            if metadata and "size" in metadata:
+                size = int(metadata["size"])
+
         with open(path, "wb") as f:
-            self.download(file_id, f, mime_type=mime_type)
+            if size is None or size <= chunksize:
+                self.download(file_id, f, mime_type=mime_type, chunksize=chunksize, progress=progress)
+                return
+
+            os.ftruncate(f.fileno(), size)
+            tracker = self._progress_tracker("download", file_id, progress, size)
+            self._download_ranges(file_id, f.fileno(), size, chunksize=chunksize, parallelism=parallelism,
+                                  tracker=tracker)
+            if tracker is not None:
+                tracker.finish()
 
     def download_excel_workbook(self, file_id: str, read_only: bool = False) -> openpyxl.Workbook:
         """
@@ -365,13 +830,66 @@ class Client:
         buff.seek(0)
         return openpyxl.load_workbook(buff, read_only=read_only)
 
+    def export_rows(self, file_id: str, tab: Optional[str] = None, *,
+                    mime_type: Optional[str] = None,
+                    as_dicts: bool = False,
+                    fieldnames: Optional[Iterable[Any]] = None,
+                    restkey: Any = None,
+                    restval: Any = None) -> Iterator[Union[Tuple[Any, ...], Dict[Any, Any]]]:
+        """
+        Export a tab of a Google Spreadsheet and yield its rows one at a time, as tuples or as dicts, without building
+        a workbook in memory.
+
+        The first tab is exported as CSV, which is downloaded and parsed as the rows are consumed; all values are
+        strings. Drive can only export the first tab as CSV, so other tabs are exported as XLSX to a temporary file
+        then read with openpyxl in read-only mode, which yields typed values. Pass ``mime_type=mimetypes.XLSX`` to use
+        XLSX for the first tab as well.
+
+        Example:
+
+            for row in client.export_rows(spreadsheet_id, as_dicts=True):
+                print(row["name"])
+
+        :param file_id: Google Spreadsheet ID
+        :param tab: name of the tab. Default to the first one.
+        :param mime_type: export format, either ``mimetypes.CSV`` or ``mimetypes.XLSX``. Default to CSV for the first
+            tab and XLSX for the other ones.
+        :param as_dicts: if true, yield dicts like ``sheet_lines_as_dicts`` instead of tuples
+        :param fieldnames: see ``sheet_lines_as_dicts``. If omitted, the first row is used as a header.
+        :param restkey: see ``sheet_lines_as_dicts``
+        :param restval: see ``sheet_lines_as_dicts``
+        :raise: ``ValueError`` if a tab other than the first one is exported as CSV, ``KeyError`` if there is no such
+            tab.
+        :return:
+        """
+        if mime_type is None:
+            mime_type = mimetypes.CSV if tab is None else mimetypes.XLSX
+
+        if mime_type == mimetypes.CSV:
+            if tab is not None:
+                raise ValueError("Google Drive can only export the first tab of a spreadsheet as CSV")
+            rows = self._iter_csv_rows(file_id)
+        elif mime_type == mimetypes.XLSX:
+            rows = self._iter_xlsx_rows(file_id, tab)
+        else:
+            raise ValueError("Unsupported export format: %s" % mime_type)
+
+        if as_dicts:
+            return iter(sheet_lines_as_dicts(rows, fieldnames, restkey=restkey, restval=restval))
+        return rows
+
     def upload(self, parent_id: Union[str, File], name: str,
                reader: BinaryIO,
                mime_type: Optional[str] = None,
                original_mime_type: Optional[str] = None,
                update_existing: bool = False,
-               resumable: bool = False) -> File:
+               resumable: Optional[bool] = None,
+               *,
+               progress: Optional[ProgressCallback] = None) -> File:
         """
+        Upload a file. Large files are sent in chunks of ``chunksize`` bytes with a resumable upload: a chunk that fails
+        is retried without sending the previous ones again.
+
         :param parent_id:
         :param name: remote filename
         :param reader: binary file reader
@@ -379,22 +897,20 @@ class Client:
         :param original_mime_type: Original MIME type. If ``None``, it is determined using libmagic, which must be
             installed.
         :param update_existing:
-        :param resumable:
+        :param resumable: whether to use a resumable upload. By default, it's used for files of at least
+            ``resumable_threshold`` bytes.
+        :param progress: function called with a ``drive.progress.TransferProgress`` after each chunk. Default to the
+            client's ``progress_callback``.
         :return:
         """
         parent_id_str = _resolve_parent_id(parent_id)
 
-        if not original_mime_type:
-            original_mime_type = guess_original_mime_type(reader)
-
-        media = MediaIoBaseUpload(reader, mimetype=original_mime_type,
-                                  chunksize=CHUNKSIZE,
-                                  resumable=resumable)
+        media = self._make_media(reader, original_mime_type, resumable)
 
         if update_existing:
             f = self.file_exists(name=name, parent_id=parent_id_str)
             if f:
-                return cast(File, self.update_file(f.id, media=media))
+                return cast(File, self.update_file(f.id, media=media, progress=progress))
 
         metadata = {
             'name': name,
@@ -404,15 +920,28 @@ class Client:
         if mime_type:
             metadata['mimeType'] = mime_type
 
-        return cast(File,
-                    self._execute_file_request(self._files.create(body=metadata,
-                                                                  media_body=media)))
+        state_key: Optional[str] = None
+        if media.resumable() and self.upload_states is not None:
+            state_key = upload_state_key(reader, parent_id_str, name, mime_type)
+
+        tracker = self._progress_tracker("upload", name, progress, media.size())
+        file = cast(File, self._execute_file_request(self._files.create(body=metadata,
+                                                                        media_body=media,
+                                                                        fields=self.file_fields),
+                                                     state_key=state_key,
+                                                     progress=tracker))
+        if self.cache is not None:
+            self.cache.invalidate_missing()
+        self.path_cache.invalidate_listing(parent_id_str)
+        return file
 
     def upload_file(self, parent_id: Union[str, File], path: str,
                     name: Optional[str] = None,
                     mime_type: Optional[str] = None,
                     original_mime_type: Optional[str] = None,
-                    update_existing: bool = False) -> File:
+                    update_existing: bool = False,
+                    *,
+                    progress: Optional[ProgressCallback] = None) -> File:
         """
         :param parent_id:
         :param path: local path
@@ -421,6 +950,7 @@ class Client:
         :param original_mime_type: Original MIME type. If ``None``, it is determined using libmagic, which must be
             installed.
         :param update_existing:
+        :param progress: see ``upload``
         :return:
         """
         if name is None:
@@ -429,7 +959,107 @@ class Client:
         with open(path, "rb") as f:
             return self.upload(parent_id, name, f, mime_type,
                                original_mime_type,
-                               update_existing=update_existing)
+                               update_existing=update_existing,
+                               progress=progress)
+
+    def upload_tree(self, local_dir: str, parent: Union[str, File], *,
+                    parallelism: int = 8,
+                    retries_count: Optional[int] = None,
+                    update_existing: bool = False) -> Dict[str, File]:
+        """
+        Upload the content of a local directory under a remote folder, recreating its hierarchy of folders. Remote
+        folders that already exist with the same name are reused.
+
+        The folders of each level of the tree are created concurrently, then their files are uploaded by a pool of
+        ``parallelism`` threads while the next level is created. A file or folder that fails with a transient error is
+        tried again up to ``retries_count`` times. Symbolic links to directories are not followed.
+
+        :param local_dir: local directory
+        :param parent: remote folder, or its ID
+        :param parallelism: number of threads creating folders, and number of threads uploading files
+        :param retries_count: how many times a failed upload is retried. Default to the client's
+            ``download_retries_count``.
+        :param update_existing: if true, update the remote files that have the same name as local files instead of
+            creating new ones
+        :return: a dict mapping the local path of each folder and file to its ``File``
+        :raise UploadTreeError: if some folders or files couldn't be uploaded. Its ``manifest`` attribute holds the
+            ones that were.
+        """
+        if retries_count is None:
+            retries_count = self.download_retries_count
+
+        fields = _add_fields(self.file_fields, "name", "mimeType", "parents")
+        manifest: Dict[str, File] = {}
+        errors: Dict[str, Exception] = {}
+
+        def retry(fn: Callable[[], T]) -> Callable[[], T]:
+            return lambda: self._call_with_retries(fn, retries_count=cast(int, retries_count))
+
+        def create_folder(name: str, folder_id: str) -> Callable[[], File]:
+            return retry(lambda: self.create_folder(name, folder_id, fields=fields))
+
+        def upload_file(path: str, folder_id: str, existing: Optional[File]) -> Callable[[], File]:
+            return retry(lambda: self._upload_tree_file(path, folder_id, existing))
+
+        # (local path, remote folder ID, whether it existed before) of the folders of the current level
+        level: List[Tuple[str, str, bool]] = [(local_dir, _resolve_parent_id(parent), True)]
+        uploads: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=parallelism) as folders_pool, \
+                ThreadPoolExecutor(max_workers=parallelism) as files_pool:
+            try:
+                while level:
+                    existing = self._list_existing_children([folder_id for _, folder_id, existed in level if existed],
+                                                            fields, folders_pool)
+
+                    creations: Dict[Future, str] = {}
+                    next_level: List[Tuple[str, str, bool]] = []
+                    for local_path, folder_id, _ in level:
+                        children = existing.get(folder_id, {})
+                        with os.scandir(local_path) as it:
+                            entries = sorted(it, key=lambda e: e.name)
+
+                        for entry in entries:
+                            remote = children.get((entry.name, entry.is_dir(follow_symlinks=False)))
+                            if entry.is_dir(follow_symlinks=False):
+                                if remote is not None:
+                                    manifest[entry.path] = remote
+                                    next_level.append((entry.path, remote.id, True))
+                                else:
+                                    future = folders_pool.submit(create_folder(entry.name, folder_id))
+                                    creations[future] = entry.path
+                            elif entry.is_file():
+                                future = files_pool.submit(upload_file(entry.path, folder_id,
+                                                                       remote if update_existing else None))
+                                uploads[future] = entry.path
+
+                    for future in as_completed(creations):
+                        path = creations[future]
+                        try:
+                            folder = future.result()
+                        except Exception as e:
+                            errors[path] = e
+                            continue
+                        manifest[path] = folder
+                        next_level.append((path, folder.id, False))
+
+                    level = next_level
+
+                for future in as_completed(uploads):
+                    path = uploads[future]
+                    try:
+                        manifest[path] = future.result()
+                    except Exception as e:
+                        errors[path] = e
+            except BaseException:
+                for future in uploads:
+                    future.cancel()
+                raise
+
+        if errors:
+            raise UploadTreeError(manifest, errors)
+
+        return manifest
 
     def upload_excel_workbook(self,
                               parent: Union[str, File],
@@ -457,50 +1087,368 @@ class Client:
                            mimetypes.XLSX, update_existing=update_existing)
 
     def grant_file_permissions(self, file_id: str, role: str, type_: str) -> dict[str, Any]:
-        return self._permissions.create(fileId=file_id, body={"role": role, "type": type_}).execute()
+        return self._execute(self._permissions.create(fileId=file_id, body={"role": role, "type": type_}))
+
+    @contextmanager
+    def batch(self, *, batch_size: int = MAX_BATCH_SIZE, retries_count: Optional[int] = None) -> Iterator[Batch]:
+        """
+        Context manager to queue operations and send them in batch HTTP requests of up to ``batch_size`` calls when
+        the block exits. Nothing is sent if the block raises an exception.
+
+            with client.batch() as batch:
+                for file in folder.list():
+                    batch.remove_file(file.id)
+
+            failed = [result for result in batch.results if not result.ok]
+
+        See ``drive.batch.Batch`` for the supported operations.
+
+        :param batch_size: maximum number of calls in each batch request.
+        :param retries_count: how many times the failed sub-requests are retried. Default to the client's
+            ``download_retries_count``.
+        """
+        batch = Batch(self, batch_size=batch_size, retries_count=retries_count)
+        yield batch
+        batch.execute()
+
+    def changes(self, *,
+                page_token: Optional[str] = None,
+                state_path: Optional[str] = None,
+                fields: Optional[Fields] = None) -> ChangeFeed:
+        """
+        Return a feed of the changes of the files the client has access to. Its ``poll()`` method yields the changes
+        since the previous poll, and ``watch()`` polls forever with a backoff:
+
+            feed = client.changes(state_path="changes.json")
+            for change in feed.poll():
+                print(change.kind, change.file_id)
+
+        See ``drive.changes.ChangeFeed``.
+
+        :param page_token: start at this page token. By default, start at the token saved in ``state_path``, or at the
+            current state of the Drive.
+        :param state_path: path of a JSON file where the position of the feed is saved, so that a new feed resumes
+            where the previous one stopped
+        :param fields: metadata fields to request for the changed files. Default to the client's ``file_fields``.
+        """
+        return ChangeFeed(self, page_token=page_token, state_path=state_path,
+                          fields=None if fields is None else _make_fields_mask(fields))
 
     def get_web_view_link(self, file_id: str) -> str:
         return self._get_file_field(file_id, "webViewLink")
 
     def _get_file_field(self, file_id: str, field: str) -> Any:
-        resp = self._files.get(fileId=file_id, fields=field).execute()
+        resp = cast(Dict[str, Any], self.get_file_metadata(file_id, fields=field))
         return resp[field]
 
     # Private API
 
-    def _execute_file_request(self, req: HttpRequest) -> Union[List[File], File, None]:
+    def _iter_csv_rows(self, file_id: str) -> Iterator[Tuple[str, ...]]:
+        with open_stream(self.iter_download(file_id, mimetypes.CSV), decompress=False) as stream:
+            yield from iter_csv_rows(stream)
+
+    def _iter_xlsx_rows(self, file_id: str, tab: Optional[str]) -> Iterator[Tuple[Any, ...]]:
+        # openpyxl needs a seekable file: use a temporary file rather than keeping the whole export in memory
+        with tempfile.TemporaryFile() as f:
+            self.download(file_id, f, mimetypes.XLSX)
+            f.seek(0)
+            workbook = openpyxl.load_workbook(f, read_only=True, data_only=True)
+            try:
+                worksheet = workbook[tab] if tab is not None else workbook.worksheets[0]
+                yield from worksheet.iter_rows(values_only=True)
+            finally:
+                workbook.close()
+
+    def _media_request(self, file_id: str, mime_type: Optional[str] = None) -> HttpRequest:
+        if mime_type:
+            return self._files.export_media(fileId=file_id, mimeType=mime_type)
+        return self._files.get_media(fileId=file_id)
+
+    def _download_ranges(self, file_id: str, fd: int, size: int, *, chunksize: int, parallelism: int,
+                         tracker: Optional[ProgressTracker] = None) -> None:
+        """
+        Download a file in ranges of ``chunksize`` bytes using ``parallelism`` threads and write each range at its
+        offset in the file descriptor ``fd``, which must point to a file of at least ``size`` bytes. Each range is
+        fetched with its own connection from the pool.
+        """
+        req = self._media_request(file_id)
+        method = _method_id(req)
+        uri: str = req.uri
+        # Same as MediaIoBaseDownload: don't send the headers that are set by default on API requests
+        headers = {k: v for k, v in req.headers.items()
+                   if k.lower() not in ("accept", "accept-encoding", "user-agent")}
+
+        def download_range(start: int) -> None:
+            end = min(start + chunksize, size) - 1
+            content = next(self._iter_chunks(lambda: _fetch_range(self._http_pool, uri, headers, start, end), tracker,
+                                             method=method, bytes_of=len))
+            view = memoryview(content)
+            while view:
+                view = view[os.pwrite(fd, view, start + len(content) - len(view)):]
+            if tracker is not None:
+                tracker.add(len(content))
+
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            futures = [pool.submit(download_range, start) for start in range(0, size, chunksize)]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def _update_file_request(self, file_id: str, *,
+                             remove_parents_ids: Optional[Iterable[str]] = None,
+                             add_parents_ids: Optional[Iterable[str]] = None,
+                             name: Optional[str] = None,
+                             media: Optional[MediaUpload] = None,
+                             force: bool = False,
+                             fields: Optional[Fields] = None) -> Optional[HttpRequest]:
+        """
+        Build the request for ``update_file``. Return ``None`` if there is nothing to update.
+        """
+        modified = force or remove_parents_ids or add_parents_ids or name or media
+        if not modified:
+            return None
+
+        kw: Dict[str, Any] = {"fields": self._fields(fields)}
+
+        if remove_parents_ids:
+            kw["removeParents"] = ",".join(remove_parents_ids)
+
+        if add_parents_ids:
+            kw["addParents"] = ",".join(add_parents_ids)
+
+        if name:
+            kw["body"] = {"name": name}
+
+        if media:
+            kw["media_body"] = media
+
+        return self._files.update(fileId=file_id, **kw)
+
+    def _fields(self, fields: Optional[Fields] = None) -> str:
+        """
+        Return the field mask to use for a call: ``fields`` if it's given, the client's ``file_fields`` otherwise.
+        """
+        if fields is None:
+            return self.file_fields
+        return _make_fields_mask(fields)
+
+    def _iter_file_pages(self, *,
+                         limit: Optional[int] = None,
+                         page_size: int = MAX_PAGE_SIZE,
+                         fields: Optional[Fields] = None,
+                         **kw) -> Iterator[File]:
+        """
+        Call ``files.list`` with the keyword arguments ``kw`` and follow the pages until all files have been yielded or
+        ``limit`` is reached.
+        """
+        if limit is not None and limit <= 0:
+            return
+
+        kw["fields"] = "nextPageToken,files(%s)" % self._fields(fields)
+
+        page_token: Optional[str] = None
+        while True:
+            if limit is not None:
+                page_size = min(page_size, limit)
+
+            resp = self._execute(self._files.list(pageSize=page_size, pageToken=page_token, **kw))
+            for attrs in resp.get("files", []):
+                yield File(attrs, client=self)
+                if limit is not None:
+                    limit -= 1
+                    if limit <= 0:
+                        return
+
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return
+
+    def _list_folders(self, folder_ids: List[str], fields: str, stop: threading.Event) -> Dict[str, List[File]]:
+        """
+        List the content of multiple folders with a single query. Return a dict mapping each folder ID to its children.
+        Stop early if ``stop`` is set.
+        """
+        clauses: List[QueryClause] = [("parents", "in", folder_id) for folder_id in folder_ids]
+        q = "(%s) and trashed = false" % _make_querystring(clauses, join="or")
+
+        wanted = set(folder_ids)
+        children: Dict[str, List[File]] = {}
+        for file in self._iter_file_pages(q=q, fields=fields):
+            if stop.is_set():
+                break
+            for parent_id in file.parents_ids or ():
+                if parent_id in wanted:
+                    children.setdefault(parent_id, []).append(file)
+
+        return children
+
+    def _iter_chunks(self, next_chunk: Callable[[], T], tracker: Optional[ProgressTracker] = None, *,
+                     method: str = "media",
+                     bytes_of: Optional[Callable[[T], int]] = None) -> Iterator[T]:
+        """
+        Call ``next_chunk`` repeatedly and yield its results. A call that fails with a transient error is retried
+        according to the client's ``retry_policy``, and reported to ``tracker`` if it's set. Chunks are retried even
+        if the transfer itself is retried by an outer call, e.g. in ``upload_tree``, so that a failed chunk doesn't
+        restart the transfer. It's up to the caller to stop the iteration once the transfer is done.
+
+        Each call is reported to the client's ``instrumentation`` as a call to ``method``, with the number of bytes
+        given by ``bytes_of``.
+        """
+        on_retry = tracker.retry if tracker is not None else None
+        while True:
+            yield observe(self.instrumentation, method, self.retry_policy, next_chunk,
+                          on_retry=on_retry, retry_nested=True, bytes_of=bytes_of)
+
+    def _progress_tracker(self, direction: str, name: Optional[str], progress: Optional[ProgressCallback],
+                          total_bytes: Optional[int] = None) -> Optional[ProgressTracker]:
+        """
+        Return a tracker for a transfer that reports to ``progress``, or the client's ``progress_callback`` if it's not
+        set. Return ``None`` if there is no callback, so that transfers don't track their progress for nothing.
+        """
+        callback = progress if progress is not None else self.progress_callback
+        if callback is None:
+            return None
+        return ProgressTracker(callback, direction, name, total_bytes=total_bytes)
+
+    def _find_file_by_name(self, name: str, parent_id: Optional[str] = None) -> Optional[File]:
+        """
+        Return the first file with this name, optionally under a parent, or ``None`` if there is none.
+        """
+        cache_key = ("name", parent_id, name, self.file_fields)
+        if self.cache is not None:
+            found, metadata = self.cache.get(cache_key)
+            if found:
+                return File(metadata, client=self) if metadata else None
+
+        files = self.list_files(name_equals=name, parents_in=parent_id, n=1)
+        file = files[0] if files else None
+        if self.cache is not None:
+            self.cache.set(cache_key, file.to_dict() if file else None, file.id if file else None)
+        return file
+
+    def _make_media(self, reader: BinaryIO,
+                    original_mime_type: Optional[str] = None,
+                    resumable: Optional[bool] = None) -> MediaIoBaseUpload:
+        """
+        Make the media body to upload the content of ``reader``. See ``upload`` for the arguments.
+        """
+        if not original_mime_type:
+            original_mime_type = guess_original_mime_type(reader)
+
+        if resumable is None:
+            size = _reader_size(reader)
+            resumable = size is None or size >= self.resumable_threshold
+
+        return MediaIoBaseUpload(reader, mimetype=original_mime_type,
+                                 chunksize=self.chunksize,
+                                 resumable=resumable)
+
+    def _upload_tree_file(self, path: str, folder_id: str, existing: Optional[File]) -> File:
+        """
+        Upload a local file for ``upload_tree``, updating ``existing`` if it's set.
+        """
+        if existing is None:
+            return self.upload_file(folder_id, path)
+
+        with open(path, "rb") as reader:
+            return cast(File, self.update_file(existing.id, media=self._make_media(reader)))
+
+    def _list_existing_children(self, folder_ids: List[str], fields: str,
+                                pool: ThreadPoolExecutor) -> Dict[str, Dict[Tuple[str, bool], File]]:
+        """
+        List the content of folders for ``upload_tree``, using ``pool`` to send multiple queries at once. Return a dict
+        mapping each folder ID to a dict of its children, indexed by their name and whether they are directories.
+        """
+        stop = threading.Event()
+        groups = [folder_ids[i:i + WALK_FOLDERS_PER_QUERY] for i in range(0, len(folder_ids), WALK_FOLDERS_PER_QUERY)]
+        listings = [pool.submit(self._list_folders, group, fields, stop) for group in groups]
+
+        existing: Dict[str, Dict[Tuple[str, bool], File]] = {}
+        for listing in listings:
+            for folder_id, children in listing.result().items():
+                index = existing.setdefault(folder_id, {})
+                for child in children:
+                    index.setdefault((cast(str, child.name), bool(child.is_directory)), child)
+
+        return existing
+
+    def _call_with_retries(self, fn: Callable[[], T], *, retries_count: int) -> T:
+        """
+        Call ``fn`` and return its result. Retry it up to ``retries_count`` times if it fails with a transient error.
+        """
+        return self.retry_policy.call(fn, max_retries=retries_count)
+
+    def _execute(self, req: HttpRequest) -> Any:
+        """
+        Execute a request, retrying it according to the client's ``retry_policy``.
+        """
+        return observe(self.instrumentation, _method_id(req), self.retry_policy, req.execute)
+
+    def _execute_file_request(self, req: HttpRequest, *,
+                              state_key: Optional[str] = None,
+                              progress: Optional[ProgressTracker] = None) -> Union[List[File], File, None]:
+        """
+        Execute a request that returns files. Resumable uploads are sent one chunk at a time, retrying the failed
+        chunks. If ``state_key`` is set, the session of the upload is saved under this key in ``upload_states`` after
+        each chunk, and a session saved by a previous process is resumed. If ``progress`` is set, the progress of the
+        upload is reported to it.
+        """
         if not req.resumable:
-            resp = req.execute()
+            resp = self._execute(req)
+            if progress is not None:
+                progress.update(progress.total_bytes or 0)
+                progress.finish()
             if "files" in resp:
                 return [File(f, client=self) for f in resp["files"]]
             if "file" in resp:
                 return File(resp["file"], client=self)
             return File(resp, client=self)
 
-        progressless_iters = 0
+        states = self.upload_states if state_key else None
+        resumed = False
+        if states is not None:
+            state = states.load(cast(str, state_key))
+            if state:
+                # Ask the server where the upload stopped before sending the next chunk
+                req.resumable_uri = state["uri"]
+                req.resumable_progress = state["offset"]
+                req._in_error_state = True
+                resumed = True
+
+        # The last chunk has no status: it completes the upload
+        uploaded = _progress_delta(lambda r: r[0].resumable_progress if r[0] is not None else req.resumable.size(),
+                                   start=req.resumable_progress or 0)
         response = None
-        progress = None
-        while response is None:
-            error = None
-            try:
-                progress, response = req.next_chunk()
-                if progress:
-                    print_with_carriage_return('Upload %d%%' % (100 * progress.progress()))
-            except HttpError as err:
-                error = err
-                if err.resp.status < 500:
-                    raise
-            except RETRYABLE_ERRORS as err:
-                error = err
-
-            if error:
-                progressless_iters += 1
-                handle_progressless_iter(error, progressless_iters, retries_count=self.download_retries_count)
-            else:
-                progressless_iters = 0
-
-        if progress:
-            print_with_carriage_return('Upload %d%%' %
-                                       (100 * progress.progress()))
-
-        return None
+        try:
+            for status, response in self._iter_chunks(req.next_chunk, progress, method=_method_id(req),
+                                                      bytes_of=uploaded):
+                if states is not None and response is None:
+                    states.save(cast(str, state_key), {"uri": req.resumable_uri, "offset": req.resumable_progress})
+                if response is not None:
+                    break
+                if status:
+                    logger.debug("Upload %d%%", 100 * status.progress())
+                    if progress is not None:
+                        progress.update(status.resumable_progress, status.total_size)
+        except HttpError as e:
+            if not (resumed and e.resp.status in (404, 410)):
+                raise
+            # The saved session expired: start a new one
+            cast(UploadStateStore, states).remove(cast(str, state_key))
+            req.resumable_uri = None
+            req.resumable_progress = 0
+            req._in_error_state = False
+            return self._execute_file_request(req, state_key=state_key, progress=progress)
+
+        if progress is not None:
+            progress.update(progress.total_bytes or progress.bytes_transferred)
+            progress.finish()
+
+        if states is not None:
+            states.remove(cast(str, state_key))
+
+        return File(cast(dict, response), client=self)
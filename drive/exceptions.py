@@ -7,3 +7,18 @@ class DriveException(Exception):
 
 class FileNotFoundException(DriveException):
     pass
+
+
+class UploadTreeError(DriveException):
+    """
+    Raised by ``Client.upload_tree`` when some folders or files couldn't be uploaded.
+    """
+
+    def __init__(self, manifest, errors):
+        """
+        :param manifest: dict mapping the local path of each uploaded folder and file to its ``File``
+        :param errors: dict mapping the local path of each folder and file that failed to its error
+        """
+        super().__init__("Failed to upload %d file(s) and folder(s)" % len(errors))
+        self.manifest = manifest
+        self.errors = errors
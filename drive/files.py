@@ -2,14 +2,22 @@
 
 import io
 import json
-from typing import Optional, Union, cast, Dict, List, Any, BinaryIO, Iterable, Iterator
+from datetime import datetime
+from typing import Optional, Union, cast, Dict, List, Any, BinaryIO, Iterable, Iterator, Tuple
 
 from openpyxl.workbook import Workbook
 
 import drive
 from drive import mimetypes
+from drive.progress import ProgressCallback
+from drive.streams import iter_json_array, iter_json_lines, open_stream
 
-__all__ = ["File", "guess_original_mime_type"]
+__all__ = ["File", "guess_original_mime_type", "FILE_FIELDS", "EXTRA_FILE_FIELDS"]
+
+# Metadata fields used by File objects. These are requested by default by the client.
+FILE_FIELDS = ("id", "name", "kind", "mimeType", "parents", "size")
+# Additional metadata fields File objects can hold if they are requested.
+EXTRA_FILE_FIELDS = ("modifiedTime", "md5Checksum")
 
 HUMAN_TYPES = {
     mimetypes.GOOGLE_DRIVE_FOLDER: "folder",
@@ -38,23 +46,20 @@ class File:
                 # noinspection PyUnresolvedReferences,PyProtectedMember
                 client = file._client
 
-            attrs = {
-                attr: getattr(file, attr)
-                for attr in ("id", "kind", "mimetype", "size", "parents")
-            }
-            attrs["name"] = file._name
+            attrs = file.to_dict()
 
         self.id: str = attrs["id"]
         self._name: Optional[str] = attrs.get("name")
         self._fetched_name = False
-        self.kind: Optional[str] = attrs.get("kind")
-        self.mimetype: Optional[str] = attrs.get("mimeType")
-        self.parents_ids: Optional[Iterable[str]] = attrs.get("parents")
-
+        self.kind: Optional[str] = None
+        self.mimetype: Optional[str] = None
+        self.parents_ids: Optional[Iterable[str]] = None
         self.size: Optional[int] = None
-        size = attrs.get("size")
-        if size is not None:
-            self.size = int(size)
+        self.modified_time: Optional[datetime] = None
+        self.md5_checksum: Optional[str] = None
+        # Files whose metadata are fetched at the same time as this one's when it's needed. See parents().
+        self._siblings: Optional[List["File"]] = None
+        self._update(attrs)
 
         self._client: Optional["drive.Client"] = client
 
@@ -65,10 +70,11 @@ class File:
 
     @property
     def name(self) -> Union[str, None]:
+        if self._name is None and not self._fetched_name and self._siblings:
+            self.client.hydrate(self._siblings)
+
         if self._name is None and not self._fetched_name:
-            me = self.client.get_file_metadata(self.id, raise_if_not_found=False)
-            if me:
-                self._name = cast(str, me["name"])
+            self._update(self.client.get_file_metadata(self.id, raise_if_not_found=False))
 
             self._fetched_name = True
 
@@ -147,10 +153,29 @@ class File:
         List a directory's content. This returns an empty list for simple files.
         :return:
         """
+        return list(self.iter_children())
+
+    def iter_children(self) -> Iterator["File"]:
+        """
+        Iterate over a directory's content. The files are fetched one page at a time, as they are consumed. This
+        yields nothing for simple files.
+        :return:
+        """
+        if not self.is_directory:
+            return iter(())
+
+        return self.client.iter_files(parents_in=self.id)
+
+    def walk(self, **kwargs) -> Iterator[Tuple["File", List["File"], List["File"]]]:
+        """
+        Walk the directory tree under this directory. This yields nothing for simple files. See ``Client.walk`` for the
+        keyword arguments.
+        :return:
+        """
         if not self.is_directory:
-            return []
+            return iter(())
 
-        return self.client.list_files(parents_in=self.id)
+        return self.client.walk(self, **kwargs)
 
     def create_folder(self, name: str) -> Optional["File"]:
         """
@@ -189,10 +214,21 @@ class File:
 
         return self.client.get_file_by_name(name, self.id)
 
+    def __truediv__(self, path: str) -> "File":
+        """
+        Get a file by its path under this directory: ``folder / "2026/Q3/summary.xlsx"``. See ``Client.get_by_path``.
+
+        :raise: ``drive.exceptions.FileNotFoundException`` if the file doesn’t exist
+        """
+        return cast(File, self.client.get_by_path(path, self.id))
+
     def parents(self) -> List["File"]:
         """
         Return all parents of a file.
         Note that a file can have multiple parents on Google Drive.
+
+        The parents are returned without their names. The first time one of them needs its name, e.g. to sort or print
+        the parents, the names of all of them are fetched at once with ``Client.hydrate``.
         :return:
         """
         if self.parents_ids is None:
@@ -207,9 +243,12 @@ class File:
         for pid in cast(Iterable[str], self.parents_ids):
             parents.append(File({
                 "id": pid,
-                "mimetype": mimetypes.GOOGLE_DRIVE_FOLDER,
+                "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER,
             }, client=self.client))
 
+        for parent in parents:
+            parent._siblings = parents
+
         return parents
 
     def parent(self) -> Optional["File"]:
@@ -222,24 +261,30 @@ class File:
             return None
         return ps[0]
 
-    def download(self, writer: BinaryIO, mime_type: Optional[str] = None) -> None:
+    def download(self, writer: BinaryIO, mime_type: Optional[str] = None, *,
+                 progress: Optional[ProgressCallback] = None) -> None:
         """
 
         :param writer:
         :param mime_type:
+        :param progress: function called with the progress of the download. See ``Client.download``.
         :return:
         """
-        self.client.download(self.id, writer, mime_type=mime_type)
+        self.client.download(self.id, writer, mime_type=mime_type, progress=progress)
         return None
 
-    def download_file(self, path: str, mime_type: Optional[str] = None) -> None:
+    def download_file(self, path: str, mime_type: Optional[str] = None, *, parallelism: int = 1,
+                      progress: Optional[ProgressCallback] = None) -> None:
         """
 
         :param path:
         :param mime_type:
+        :param parallelism: number of concurrent connections to use. See ``Client.download_file``.
+        :param progress: function called with the progress of the download. See ``Client.download``.
         :return:
         """
-        return self.client.download_file(self.id, path, mime_type=mime_type)
+        return self.client.download_file(self.id, path, mime_type=mime_type, parallelism=parallelism,
+                                         progress=progress)
 
     def download_workbook(self, read_only: bool = False) -> Workbook:
         """
@@ -249,6 +294,18 @@ class File:
         """
         return self.client.download_excel_workbook(self.id, read_only=read_only)
 
+    def iter_rows(self, tab: Optional[str] = None, *, as_dicts: bool = False, **kwargs) -> Iterator[Any]:
+        """
+        Export a tab of a Google Spreadsheet and yield its rows one at a time, as tuples or as dicts. The rows are
+        streamed without building a workbook in memory. See ``Client.export_rows``.
+
+        :param tab: name of the tab. Default to the first one.
+        :param as_dicts: if true, yield dicts instead of tuples, using the first row as a header
+        :param kwargs: additional arguments for ``Client.export_rows``
+        :return:
+        """
+        return self.client.export_rows(self.id, tab, as_dicts=as_dicts, **kwargs)
+
     def get_bytes(self, mime_type: Optional[str] = None) -> io.BytesIO:
         """
         Return a ``io.BytesIO`` object holding the content of the file. This can be used as a binary reader.
@@ -260,39 +317,80 @@ class File:
         fh.seek(0)
         return fh
 
-    def json(self) -> Any:
+    def open(self, mime_type: Optional[str] = None, *, decompress: Optional[bool] = False) -> BinaryIO:
+        """
+        Open the file as a binary stream. Its content is downloaded in chunks as the stream is read, so the memory
+        usage doesn't depend on the size of the file.
+
+        :param mime_type: if given, export the file in this MIME type
+        :param decompress: if true, decompress the content with gzip as it's read. If ``None``, decompress it only if
+            it's gzip-compressed.
+        :return:
         """
-        Download the file as JSON.
+        return open_stream(self.client.iter_download(self.id, mime_type), decompress=decompress)
+
+    def json(self, *, decompress: Optional[bool] = None, use_orjson: bool = False) -> Any:
+        """
+        Download the file as JSON. See ``iter_json_array`` to parse a large array without loading it in memory.
+
+        :param decompress: see ``open``. By default, the file is decompressed if it's gzip-compressed.
+        :param use_orjson: parse the file with ``orjson``, which must be installed
         :return:
         """
-        return json.load(self.get_bytes())
+        with self.open(decompress=decompress) as stream:
+            if use_orjson:
+                return _import_orjson().loads(stream.read())
+            return json.load(stream)
 
-    def jsons(self) -> Iterator[Any]:
+    def jsons(self, *, decompress: Optional[bool] = None, use_orjson: bool = False) -> Iterator[Any]:
         """
-        Download the file as a newline-delimited list of JSON objects. This returns a generator.
+        Download the file as a newline-delimited list of JSON objects. This returns a generator. The file is downloaded
+        and parsed as it's consumed, so the memory usage doesn't depend on the size of the file.
+
+        :param decompress: see ``open``. By default, the file is decompressed if it's gzip-compressed.
+        :param use_orjson: parse the objects with ``orjson``, which must be installed
+        :return:
+        """
+        loads = _import_orjson().loads if use_orjson else json.loads
+        with self.open(decompress=decompress) as stream:
+            yield from iter_json_lines(stream, loads=loads)
+
+    def iter_json_array(self, *, decompress: Optional[bool] = None) -> Iterator[Any]:
+        """
+        Download a file that contains a JSON array and yield its items one at a time. The file is downloaded and parsed
+        as it's consumed, so the memory usage doesn't depend on the size of the array.
+
+        :param decompress: see ``open``. By default, the file is decompressed if it's gzip-compressed.
         :return:
         """
-        line = b'1'  # just for typing
-        b = self.get_bytes()
-        while line:
-            line = b.readline()
-            if line:  # skip empty lines
-                yield json.loads(line.decode("utf-8"))
+        with self.open(decompress=decompress) as stream:
+            yield from iter_json_array(stream)
 
     def get_web_view_link(self) -> str:
         return self.client.get_web_view_link(self.id)
 
     def to_dict(self) -> dict[str, Any]:
         """
-        Return the file’s metadata as a dict. Mandatory keys: ``"id"``, ``"name"``. Optional ones: ``"parents"``.
+        Return the file’s metadata as a dict. Mandatory keys: ``"id"``, ``"name"``. Optional ones: ``"kind"``,
+        ``"mimeType"``, ``"parents"``, ``"size"``, ``"modifiedTime"``, ``"md5Checksum"``.
         """
         d: dict[str, Any] = {
             # Add other fields as needed
             "id": self.id,
             "name": self._name,
         }
+        if self.kind:
+            d["kind"] = self.kind
+        if self.mimetype:
+            d["mimeType"] = self.mimetype
         if self.parents_ids:
             d["parents"] = self.parents_ids
+        if self.size is not None:
+            d["size"] = self.size
+        if self.modified_time:
+            d["modifiedTime"] = self.modified_time.isoformat()
+        if self.md5_checksum:
+            d["md5Checksum"] = self.md5_checksum
 
         return d
 
@@ -330,9 +428,28 @@ class File:
         if name:
             self._name = name
 
-        parents = attrs.get("parents")
-        if parents:
-            self.parents_ids = parents
+        for attr, key in (("kind", "kind"), ("mimetype", "mimeType"), ("parents_ids", "parents"),
+                          ("md5_checksum", "md5Checksum")):
+            value = attrs.get(key)
+            if value:
+                setattr(self, attr, value)
+
+        size = attrs.get("size")
+        if size is not None:
+            self.size = int(size)
+
+        modified_time = attrs.get("modifiedTime")
+        if modified_time:
+            self.modified_time = _parse_datetime(modified_time)
+
+
+def _parse_datetime(s: str) -> datetime:
+    """
+    Parse a RFC 3339 date-time as returned by the API, e.g. ``"2025-03-27T10:11:12.345Z"``.
+    """
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    return datetime.fromisoformat(s)
 
 
 def guess_original_mime_type(reader: BinaryIO) -> str:
@@ -351,3 +468,11 @@ def guess_original_mime_type(reader: BinaryIO) -> str:
     buff = reader.read(1024)
     reader.seek(pos)
     return magic.from_buffer(buff, mime=True)
+
+
+def _import_orjson() -> Any:
+    try:
+        import orjson
+    except ImportError as e:
+        raise RuntimeError("use_orjson=True needs orjson. Install it with: pip install 'drive[orjson]'") from e
+    return orjson
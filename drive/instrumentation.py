@@ -0,0 +1,298 @@
+# -*- coding: UTF-8 -*-
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Sequence, TypeVar
+
+from googleapiclient.errors import HttpError  # type: ignore
+
+from drive.retry import RetryPolicy
+
+__all__ = [
+    "RequestEvent", "Instrumentation", "MemoryCollector", "MethodStats",
+    "PrometheusInstrumentation", "OpenTelemetryInstrumentation", "observe",
+]
+
+T = TypeVar("T")
+
+# Upper bounds of the buckets of the request duration histograms, in seconds
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class RequestEvent:
+    """
+    A call to the API, including its retries.
+    """
+
+    def __init__(self, method: str, duration: float, *,
+                 error: Optional[Exception] = None,
+                 retries: int = 0,
+                 bytes_transferred: int = 0) -> None:
+        """
+        :param method: ID of the API method, like ``"drive.files.list"``
+        :param duration: number of seconds spent in the call, including the retries
+        :param error: error raised by the call, if it failed
+        :param retries: number of retries of the call
+        :param bytes_transferred: number of bytes of media uploaded or downloaded by the call
+        """
+        self.method = method
+        self.duration = duration
+        self.retries = retries
+        self.bytes_transferred = bytes_transferred
+        # HTTP status of the error, if the call failed with an HTTP error
+        self.status: Optional[int] = error.resp.status if isinstance(error, HttpError) else None
+        # Class name of the error, if the call failed
+        self.error: Optional[str] = type(error).__name__ if error is not None else None
+
+    @property
+    def outcome(self) -> str:
+        """
+        ``"ok"`` if the call succeeded, the HTTP status of the error if it failed with an HTTP error, and the class
+        name of the error otherwise.
+        """
+        if self.status is not None:
+            return str(self.status)
+        return self.error or "ok"
+
+    def __repr__(self) -> str:
+        return "<RequestEvent %s %s %.3fs>" % (self.method, self.outcome, self.duration)
+
+
+class Instrumentation:
+    """
+    Receive an event for each call to the API made by a client. Subclass it and override ``on_request`` to send the
+    events to a monitoring system. ``on_request`` is called from the threads that make the calls, so it must be
+    thread-safe, and it should be fast.
+    """
+
+    def on_request(self, event: RequestEvent) -> None:
+        """
+        Called after each call to the API.
+        """
+        pass
+
+
+class MethodStats:
+    """
+    Statistics of the calls to an API method, collected by ``MemoryCollector``.
+    """
+
+    def __init__(self, max_samples: int) -> None:
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_transferred = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # number of calls by outcome, see ``RequestEvent.outcome``
+        self.outcomes: Dict[str, int] = {}
+        # durations of the last calls, used to compute percentiles
+        self.durations: Deque[float] = deque(maxlen=max_samples)
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        Return the ``q``-th percentile (between 0 and 100) of the durations of the last calls, in seconds.
+        """
+        if not self.durations:
+            return 0.0
+        durations = sorted(self.durations)
+        return durations[min(len(durations) - 1, max(math.ceil(q / 100 * len(durations)) - 1, 0))]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes_transferred,
+            "mean": self.mean_time,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max_time,
+            "outcomes": dict(self.outcomes),
+        }
+
+
+class MemoryCollector(Instrumentation):
+    """
+    Instrumentation that keeps statistics per API method in memory.
+
+        metrics = MemoryCollector()
+        client = Client(instrumentation=metrics)
+        ...
+        print(metrics.summary()["drive.files.list"]["p99"])
+    """
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        """
+        :param max_samples: number of durations kept per method to compute the percentiles
+        """
+        self.max_samples = max_samples
+        self._stats: Dict[str, MethodStats] = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, event: RequestEvent) -> None:
+        with self._lock:
+            stats = self._stats.get(event.method)
+            if stats is None:
+                stats = self._stats[event.method] = MethodStats(self.max_samples)
+
+            stats.count += 1
+            if event.error is not None:
+                stats.errors += 1
+            stats.retries += event.retries
+            stats.bytes_transferred += event.bytes_transferred
+            stats.total_time += event.duration
+            stats.max_time = max(stats.max_time, event.duration)
+            stats.outcomes[event.outcome] = stats.outcomes.get(event.outcome, 0) + 1
+            stats.durations.append(event.duration)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return a snapshot of the statistics of each method: number of calls, errors and retries, bytes transferred,
+        mean, 50th/90th/99th percentile and maximum durations, and number of calls by outcome.
+        """
+        with self._lock:
+            return {method: stats.as_dict() for method, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        """
+        Forget all the statistics.
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """
+    Instrumentation that exports the calls as Prometheus metrics. This needs ``prometheus_client``.
+
+    * ``<prefix>_request_duration_seconds``: histogram of the durations of the calls, by method and outcome
+    * ``<prefix>_request_retries_total``: number of retries, by method
+    * ``<prefix>_transferred_bytes_total``: number of bytes of media uploaded or downloaded, by method
+    """
+
+    def __init__(self, *, prefix: str = "drive", registry: Any = None,
+                 buckets: Sequence[float] = DURATION_BUCKETS) -> None:
+        """
+        :param prefix: prefix of the metrics names
+        :param registry: registry of the metrics. Default to the default registry of ``prometheus_client``.
+        :param buckets: upper bounds of the buckets of the duration histogram, in seconds
+        """
+        prometheus_client = _import_prometheus_client()
+        kwargs = {} if registry is None else {"registry": registry}
+
+        self.durations = prometheus_client.Histogram("%s_request_duration_seconds" % prefix,
+                                                     "Duration of the calls to the API, including retries",
+                                                     ["method", "outcome"], buckets=buckets, **kwargs)
+        self.retries = prometheus_client.Counter("%s_request_retries_total" % prefix,
+                                                 "Number of retried calls to the API",
+                                                 ["method"], **kwargs)
+        self.bytes = prometheus_client.Counter("%s_transferred_bytes_total" % prefix,
+                                               "Number of bytes of media uploaded or downloaded",
+                                               ["method"], **kwargs)
+
+    def on_request(self, event: RequestEvent) -> None:
+        self.durations.labels(method=event.method, outcome=event.outcome).observe(event.duration)
+        if event.retries:
+            self.retries.labels(method=event.method).inc(event.retries)
+        if event.bytes_transferred:
+            self.bytes.labels(method=event.method).inc(event.bytes_transferred)
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    """
+    Instrumentation that records the calls with OpenTelemetry metrics. This needs ``opentelemetry-api``.
+
+    * ``drive.request.duration``: histogram of the durations of the calls, by method and outcome
+    * ``drive.request.retries``: number of retries, by method
+    * ``drive.transferred_bytes``: number of bytes of media uploaded or downloaded, by method
+    """
+
+    def __init__(self, meter: Any = None) -> None:
+        """
+        :param meter: OpenTelemetry meter. Default to the ``drive`` meter of the global meter provider.
+        """
+        if meter is None:
+            meter = _import_opentelemetry_metrics().get_meter("drive")
+
+        self.durations = meter.create_histogram("drive.request.duration", unit="s",
+                                                description="Duration of the calls to the API, including retries")
+        self.retries = meter.create_counter("drive.request.retries",
+                                            description="Number of retried calls to the API")
+        self.bytes = meter.create_counter("drive.transferred_bytes", unit="By",
+                                          description="Number of bytes of media uploaded or downloaded")
+
+    def on_request(self, event: RequestEvent) -> None:
+        attributes = {"method": event.method}
+        self.durations.record(event.duration, attributes=dict(attributes, outcome=event.outcome))
+        if event.retries:
+            self.retries.add(event.retries, attributes=attributes)
+        if event.bytes_transferred:
+            self.bytes.add(event.bytes_transferred, attributes=attributes)
+
+
+def observe(instrumentation: Optional[Instrumentation], method: str, policy: RetryPolicy, fn: Callable[[], T], *,
+            max_retries: Optional[int] = None,
+            on_retry: Optional[Callable[[int, Exception], None]] = None,
+            retry_nested: bool = False,
+            bytes_of: Optional[Callable[[T], int]] = None) -> T:
+    """
+    Call ``fn`` with the retry policy ``policy`` and report the call to ``instrumentation``. Without instrumentation,
+    this is the same as ``policy.call``.
+
+    :param instrumentation:
+    :param method: ID of the API method
+    :param policy: retry policy
+    :param fn: function to call
+    :param max_retries: see ``RetryPolicy.call``
+    :param on_retry: see ``RetryPolicy.call``
+    :param retry_nested: see ``RetryPolicy.call``
+    :param bytes_of: function that returns the number of bytes of media transferred from the result of ``fn``
+    :return: the result of ``fn``
+    """
+    if instrumentation is None:
+        return policy.call(fn, max_retries=max_retries, on_retry=on_retry, retry_nested=retry_nested)
+
+    retries = 0
+
+    def count_retry(attempt: int, error: Exception) -> None:
+        nonlocal retries
+        retries += 1
+        if on_retry is not None:
+            on_retry(attempt, error)
+
+    start = time.perf_counter()
+    try:
+        result = policy.call(fn, max_retries=max_retries, on_retry=count_retry, retry_nested=retry_nested)
+    except Exception as e:
+        instrumentation.on_request(RequestEvent(method, time.perf_counter() - start, error=e, retries=retries))
+        raise
+
+    instrumentation.on_request(RequestEvent(method, time.perf_counter() - start, retries=retries,
+                                            bytes_transferred=bytes_of(result) if bytes_of else 0))
+    return result
+
+
+def _import_prometheus_client() -> Any:
+    try:
+        import prometheus_client  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("PrometheusInstrumentation needs prometheus_client. "
+                           "Install it with: pip install 'drive[prometheus]'") from e
+    return prometheus_client
+
+
+def _import_opentelemetry_metrics() -> Any:
+    try:
+        from opentelemetry import metrics  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("OpenTelemetryInstrumentation needs opentelemetry-api. "
+                           "Install it with: pip install 'drive[opentelemetry]'") from e
+    return metrics
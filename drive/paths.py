@@ -0,0 +1,155 @@
+# -*- coding: UTF-8 -*-
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import drive
+from drive import mimetypes
+from drive.cache import DEFAULT_TTL
+from drive.files import File
+
+__all__ = ["PathCache", "split_path"]
+
+
+class PathCache:
+    """
+    Cache of directory listings used to resolve paths like ``"Reports/2026/Q3/summary.xlsx"``. Each folder is listed
+    with a single query the first time a path goes through it, and its listing is reused by all the paths that share
+    this prefix until it expires. Use it through ``Client.get_by_path`` and ``Client.get_by_paths``.
+
+    Listings are keyed by folder ID. The client drops the listings it makes stale when it creates, updates, moves or
+    removes a file; changes made by other clients are only seen once the listings expire.
+    """
+
+    def __init__(self, client: "drive.Client", *, ttl: float = DEFAULT_TTL, parallelism: int = 4) -> None:
+        """
+        :param client:
+        :param ttl: number of seconds after which a listing expires
+        :param parallelism: maximum number of folders listed at once
+        """
+        self.client = client
+        self.ttl = ttl
+        self.parallelism = parallelism
+        # folder ID -> (expiration time, children by name)
+        self._listings: Dict[str, Tuple[float, Dict[str, File]]] = {}
+        # file ID -> IDs of the folders whose listing contains it
+        self._containing: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, path: str, root: str = "root") -> Optional[File]:
+        """
+        Return the file at ``path`` under the folder ``root``, or ``None`` if there is none.
+        """
+        return self.resolve_many([path], root)[path]
+
+    def resolve_many(self, paths: Iterable[str], root: str = "root") -> Dict[str, Optional[File]]:
+        """
+        Resolve multiple paths under the folder ``root`` and return a dict mapping each path to its file, or to
+        ``None`` if it doesn't exist. Paths are resolved one level at a time, with one query per distinct folder that
+        is not in the cache.
+        """
+        results: Dict[str, Optional[File]] = {}
+        # path -> (ID of the current folder, remaining segments)
+        pending: Dict[str, Tuple[str, List[str]]] = {}
+        for path in paths:
+            segments = split_path(path)
+            if segments:
+                pending[path] = (root, segments)
+            else:
+                results[path] = File({"id": root, "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER}, client=self.client)
+
+        while pending:
+            listings = self._get_listings({folder_id for folder_id, _ in pending.values()})
+
+            next_pending: Dict[str, Tuple[str, List[str]]] = {}
+            for path, (folder_id, segments) in pending.items():
+                child = listings[folder_id].get(segments[0])
+                if child is not None and len(segments) == 1:
+                    results[path] = File(child, client=self.client)
+                elif child is not None and child.is_directory:
+                    next_pending[path] = (child.id, segments[1:])
+                else:
+                    results[path] = None
+
+            pending = next_pending
+
+        return results
+
+    def invalidate(self, file_id: Optional[str] = None) -> None:
+        """
+        Drop the listing of a folder and the listings that contain a file, or all the listings if ``file_id`` is
+        ``None``.
+        """
+        with self._lock:
+            if file_id is None:
+                self._listings.clear()
+                self._containing.clear()
+                return
+
+            for folder_id in self._containing.pop(file_id, set()) | {file_id}:
+                self._drop(folder_id)
+
+    def invalidate_listing(self, folder_id: str) -> None:
+        """
+        Drop the listing of a folder, e.g. because a file was created in it.
+        """
+        with self._lock:
+            self._drop(folder_id)
+
+    # Private API
+
+    def _get_listings(self, folder_ids: Set[str]) -> Dict[str, Dict[str, File]]:
+        """
+        Return the children of folders by name, listing those that are not in the cache concurrently.
+        """
+        now = time.monotonic()
+        listings: Dict[str, Dict[str, File]] = {}
+        with self._lock:
+            for folder_id in folder_ids:
+                entry = self._listings.get(folder_id)
+                if entry is not None and entry[0] >= now:
+                    listings[folder_id] = entry[1]
+
+        missing = [folder_id for folder_id in folder_ids if folder_id not in listings]
+        if len(missing) == 1:
+            listings[missing[0]] = self._list(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(self.parallelism, len(missing))) as pool:
+                for folder_id, children in zip(missing, pool.map(self._list, missing)):
+                    listings[folder_id] = children
+
+        return listings
+
+    def _list(self, folder_id: str) -> Dict[str, File]:
+        children: Dict[str, File] = {}
+        for child in self.client.iter_files(parents_in=folder_id):
+            # Names are not unique: keep the first file, like get_file_by_name does
+            children.setdefault(child.name or "", child)
+
+        with self._lock:
+            self._drop(folder_id)
+            self._listings[folder_id] = (time.monotonic() + self.ttl, children)
+            for child in children.values():
+                self._containing.setdefault(child.id, set()).add(folder_id)
+
+        return children
+
+    def _drop(self, folder_id: str) -> None:
+        entry = self._listings.pop(folder_id, None)
+        if entry is None:
+            return
+        for child in entry[1].values():
+            containing = self._containing.get(child.id)
+            if containing is not None:
+                containing.discard(folder_id)
+                if not containing:
+                    del self._containing[child.id]
+
+
+def split_path(path: str) -> List[str]:
+    """
+    Split a path into the names of its segments, ignoring empty ones: ``"/a//b/"`` gives ``["a", "b"]``.
+    """
+    return [segment for segment in path.split("/") if segment]
@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import httplib2
+
+from drive.ratelimit import TokenBucket
+
+__all__ = ["HttpPool"]
+
+
+class HttpPool:
+    """
+    Thread-safe pool of ``httplib2.Http`` objects.
+
+    ``httplib2.Http`` objects are not thread-safe. A pool can be used in their place, e.g. when building a service
+    object: each request borrows an ``Http`` object for its duration, so concurrent requests from multiple threads use
+    different objects. Idle objects are reused, most recently used first, to benefit from their keep-alive connections.
+    At most ``max_size`` objects are created; requests wait for one to be available when they are all in use.
+
+    If the pool has a ``rate_limiter``, each request takes a token from it before borrowing an ``Http`` object.
+    """
+
+    def __init__(self, factory: Callable[[], httplib2.Http], *,
+                 max_size: int = 10,
+                 credentials: Any = None,
+                 rate_limiter: Optional[TokenBucket] = None) -> None:
+        """
+        :param factory: function that creates a new ``Http`` object, e.g. ``lambda: authorize(credentials)``
+        :param max_size: maximum number of ``Http`` objects
+        :param credentials: credentials used by the ``Http`` objects, if any. ``googleapiclient`` uses them to
+            authorize the calls of batch requests.
+        :param rate_limiter: if set, rate limiter applied to all requests
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.max_size = max_size
+        self.credentials = credentials
+        self.rate_limiter = rate_limiter
+        self._factory = factory
+        self._idle: List[httplib2.Http] = []
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(max_size)
+        self._created = 0
+
+    @property
+    def size(self) -> int:
+        """Number of ``Http`` objects in the pool, idle or in use."""
+        return self._created
+
+    @contextmanager
+    def connection(self) -> Iterator[httplib2.Http]:
+        """
+        Context manager that borrows an ``Http`` object from the pool and gives it back at the end of the block.
+        """
+        self._available.acquire()
+        try:
+            http: Optional[httplib2.Http] = None
+            with self._lock:
+                if self._idle:
+                    http = self._idle.pop()
+                else:
+                    self._created += 1
+
+            if http is None:
+                try:
+                    http = self._factory()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            try:
+                yield http
+            finally:
+                with self._lock:
+                    self._idle.append(http)
+        finally:
+            self._available.release()
+
+    def request(self, *args, **kwargs) -> Tuple[httplib2.Response, bytes]:
+        """
+        Same as ``httplib2.Http.request``, using an ``Http`` object from the pool.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        with self.connection() as http:
+            return http.request(*args, **kwargs)
+
+    def close(self) -> None:
+        """
+        Close the connections of the idle ``Http`` objects and remove them from the pool. This is called by the
+        ``close`` method of the service objects, and at the end of their ``with`` blocks. Objects in use at that time
+        are kept, and the pool can still be used afterwards: it creates new ``Http`` objects as needed.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+
+        for http in idle:
+            http.close()
@@ -0,0 +1,162 @@
+# -*- coding: UTF-8 -*-
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+__all__ = ["TransferProgress", "ProgressCallback", "ProgressTracker", "log_progress"]
+
+logger = logging.getLogger(__name__)
+
+
+class TransferProgress:
+    """
+    State of an upload or a download, passed to progress callbacks.
+    """
+
+    def __init__(self, direction: str, name: Optional[str] = None, *,
+                 bytes_transferred: int = 0,
+                 total_bytes: Optional[int] = None,
+                 elapsed: float = 0.0,
+                 retries: int = 0,
+                 done: bool = False) -> None:
+        """
+        :param direction: ``"upload"`` or ``"download"``
+        :param name: ID or name of the transferred file
+        :param bytes_transferred: number of bytes transferred so far
+        :param total_bytes: size of the file, if it's known
+        :param elapsed: number of seconds since the start of the transfer
+        :param retries: number of retried requests so far
+        :param done: whether the transfer is complete
+        """
+        self.direction = direction
+        self.name = name
+        self.bytes_transferred = bytes_transferred
+        self.total_bytes = total_bytes
+        self.elapsed = elapsed
+        self.retries = retries
+        self.done = done
+
+    @property
+    def rate(self) -> float:
+        """Average transfer rate since the start of the transfer, in bytes per second."""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_transferred / self.elapsed
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Fraction of the file that has been transferred, between 0 and 1, or ``None`` if the size is unknown."""
+        if self.done:
+            return 1.0
+        if not self.total_bytes:
+            return None
+        return min(self.bytes_transferred / self.total_bytes, 1.0)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated number of seconds until the end of the transfer, or ``None`` if it can't be estimated."""
+        if self.done:
+            return 0.0
+        rate = self.rate
+        if self.total_bytes is None or rate <= 0:
+            return None
+        return max(self.total_bytes - self.bytes_transferred, 0) / rate
+
+    def __repr__(self) -> str:
+        return "<TransferProgress %s %s: %d/%s bytes>" % (
+            self.direction, self.name, self.bytes_transferred,
+            "?" if self.total_bytes is None else self.total_bytes)
+
+
+ProgressCallback = Callable[[TransferProgress], None]
+
+
+def log_progress(progress: TransferProgress) -> None:
+    """
+    Progress callback that logs the progress of transfers with the ``drive.progress`` logger, at the ``INFO`` level.
+
+        client = Client(progress_callback=log_progress)
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+
+    fraction = progress.fraction
+    eta = progress.eta
+    logger.info("%s %s: %s, %d bytes (%.1f kB/s%s)",
+                progress.direction.capitalize(), progress.name or "",
+                "done" if progress.done else ("?%" if fraction is None else "%d%%" % (100 * fraction)),
+                progress.bytes_transferred, progress.rate / 1000,
+                "" if eta is None or progress.done else ", ETA %ds" % eta)
+
+
+class ProgressTracker:
+    """
+    Track the progress of a transfer and report it to a callback. It's thread-safe, so that the ranges of a parallel
+    download can report their progress from multiple threads.
+    """
+
+    def __init__(self, callback: ProgressCallback, direction: str, name: Optional[str] = None, *,
+                 total_bytes: Optional[int] = None) -> None:
+        """
+        :param callback: function called with a ``TransferProgress`` after each chunk
+        :param direction: ``"upload"`` or ``"download"``
+        :param name: ID or name of the transferred file
+        :param total_bytes: size of the file, if it's known
+        """
+        self.callback = callback
+        self.direction = direction
+        self.name = name
+        self.total_bytes = total_bytes
+        self.bytes_transferred = 0
+        self.retries = 0
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def update(self, bytes_transferred: int, total_bytes: Optional[int] = None) -> None:
+        """
+        Report the number of bytes transferred since the start of the transfer.
+        """
+        with self._lock:
+            self.bytes_transferred = bytes_transferred
+            if total_bytes is not None:
+                self.total_bytes = total_bytes
+        self._report()
+
+    def add(self, bytes_count: int) -> None:
+        """
+        Report ``bytes_count`` more bytes transferred.
+        """
+        with self._lock:
+            self.bytes_transferred += bytes_count
+        self._report()
+
+    def retry(self, attempt: int, error: Exception) -> None:
+        """
+        Report a retried request. This has the signature of the ``on_retry`` argument of ``RetryPolicy.call``.
+        """
+        with self._lock:
+            self.retries += 1
+        self._report()
+
+    def finish(self) -> None:
+        """
+        Report the end of the transfer.
+        """
+        with self._lock:
+            if self.total_bytes is None:
+                self.total_bytes = self.bytes_transferred
+        self._report(done=True)
+
+    # Private API
+
+    def _report(self, done: bool = False) -> None:
+        with self._lock:
+            progress = TransferProgress(self.direction, self.name,
+                                        bytes_transferred=self.bytes_transferred,
+                                        total_bytes=self.total_bytes,
+                                        elapsed=time.monotonic() - self._started_at,
+                                        retries=self.retries,
+                                        done=done)
+        self.callback(progress)
@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os.path
+import threading
+import time
+from typing import Any, Optional
+
+__all__ = ["TokenBucket", "FileTokenBucket"]
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter. The bucket holds up to ``capacity`` tokens and is refilled at ``rate`` tokens per
+    second; each request takes a token, waiting for one if the bucket is empty. This allows bursts of up to
+    ``capacity`` requests while keeping the average rate under ``rate`` requests per second.
+
+    It's thread-safe: threads that share a bucket share its rate. Use ``FileTokenBucket`` to share it between processes.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1) -> None:
+        """
+        :param rate: number of tokens added per second
+        :param capacity: maximum number of tokens in the bucket. The bucket starts full.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_quota(cls, queries_per_100s: float, *, burst: Optional[float] = None, **kwargs) -> "TokenBucket":
+        """
+        Create a bucket from a quota in queries per 100 seconds, the unit of the Google APIs quotas.
+
+        :param queries_per_100s: number of queries allowed per 100 seconds
+        :param burst: capacity of the bucket. Default to one second of quota.
+        :param kwargs: additional arguments for the constructor
+        """
+        rate = queries_per_100s / 100
+        return cls(rate, capacity=burst if burst is not None else max(rate, 1), **kwargs)
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, waiting until they are available. Return the number of seconds waited.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    # Private API
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Take tokens from the bucket and return the number of seconds to wait before they are available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = self._refill(self._tokens, now - self._updated_at)
+            self._updated_at = now
+            # Reserve the tokens now, so that concurrent callers wait in turn
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def _refill(self, level: float, elapsed: float) -> float:
+        return min(self.capacity, level + max(elapsed, 0) * self.rate)
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket shared by all the processes of a machine that use the same state file, e.g. the workers of a job
+    that share a quota. The level of the bucket is stored in the file, which is locked while it's updated. This needs
+    ``fcntl``, i.e. a POSIX system.
+
+        limiter = FileTokenBucket.from_quota(1000, path="/tmp/drive-quota.json")
+        client = Client(rate_limiter=limiter)
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, *, path: str) -> None:
+        """
+        :param rate: number of tokens added per second
+        :param capacity: maximum number of tokens in the bucket
+        :param path: path of the state file. It's created if it doesn't exist.
+        """
+        super().__init__(rate, capacity)
+        self._fcntl = _import_fcntl()
+        self.path = os.path.expanduser(path)
+
+    def _reserve(self, tokens: float) -> float:
+        with open(self.path, "a+", encoding="utf-8") as f:
+            self._fcntl.flock(f, self._fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                # Wall-clock time, as the monotonic clocks of processes are not comparable
+                now = time.time()
+                try:
+                    state = json.loads(f.read())
+                    level = self._refill(float(state["tokens"]), now - float(state["updated_at"]))
+                except (ValueError, KeyError, TypeError):
+                    level = float(self.capacity)
+
+                level -= tokens
+                f.seek(0)
+                f.truncate()
+                json.dump({"tokens": level, "updated_at": now}, f)
+                f.flush()
+            finally:
+                self._fcntl.flock(f, self._fcntl.LOCK_UN)
+
+        return -level / self.rate if level < 0 else 0.0
+
+
+def _import_fcntl() -> Any:
+    try:
+        import fcntl
+    except ImportError as e:
+        raise RuntimeError("FileTokenBucket needs the fcntl module, which is not available on this platform") from e
+    return fcntl
@@ -0,0 +1,280 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Set, TypeVar
+
+import httplib2
+from googleapiclient.errors import HttpError  # type: ignore
+
+__all__ = ["RetryPolicy", "RetryMetrics", "is_retryable", "retry_after", "backoff_delay"]
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# HTTP status codes that are worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Reasons of 403 errors that are worth retrying
+RETRYABLE_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Default maximum number of retries of a call
+DEFAULT_MAX_RETRIES = 5
+# Default base and maximum delays between two attempts, in seconds
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 64.0
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Test if an error is transient, i.e. if the call that raised it is worth retrying: transport errors, 5XX errors and
+    rate limit errors.
+    """
+    if not isinstance(error, HttpError):
+        return isinstance(error, (httplib2.HttpLib2Error, IOError))
+
+    status = error.resp.status
+    if status in RETRYABLE_STATUSES:
+        return True
+
+    if status == 403:
+        return bool(_error_reasons(error) & RETRYABLE_403_REASONS)
+
+    return False
+
+
+def _error_reasons(error: HttpError) -> Set[str]:
+    """
+    Return the reasons given in the body of an HTTP error, in both its ``errors`` and ``details`` lists.
+    ``HttpError.error_details`` only has one of them.
+    """
+    try:
+        body = json.loads(error.content)
+    except (TypeError, ValueError):
+        return set()
+
+    payload = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(payload, dict):
+        return set()
+
+    reasons: Set[str] = set()
+    for key in ("errors", "details"):
+        items = payload.get(key)
+        if isinstance(items, list):
+            reasons.update(item["reason"] for item in items if isinstance(item, dict) and "reason" in item)
+    return reasons
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Return the number of seconds to wait before retrying, as given by the ``Retry-After`` header of an HTTP error, or
+    ``None`` if there is none.
+    """
+    if not isinstance(error, HttpError):
+        return None
+
+    value = error.resp.get("retry-after")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None, *,
+                  base_delay: float = DEFAULT_BASE_DELAY,
+                  max_delay: float = DEFAULT_MAX_DELAY) -> float:
+    """
+    Return the number of seconds to wait before the ``attempt``-th retry (starting at 1): exponential backoff with full
+    jitter, i.e. a random delay between 0 and ``min(max_delay, base_delay * 2 ** (attempt - 1))``. If ``error`` has a
+    ``Retry-After`` header, wait at least that long.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+    if error is not None:
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+    return delay
+
+
+class RetryMetrics:
+    """
+    Counters of a ``RetryPolicy``. They are updated from all the threads that use the policy.
+    """
+
+    def __init__(self) -> None:
+        # number of calls
+        self.calls = 0
+        # number of retries
+        self.retries = 0
+        # number of calls that failed after all their retries, or with an error that is not retryable
+        self.failures = 0
+        # number of retries that were denied because the retry budget was exhausted
+        self.budget_exhausted = 0
+        # total number of seconds spent waiting before retries
+        self.wait_time = 0.0
+        # number of retried errors by HTTP status, or by exception class name for transport errors
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return a snapshot of the counters."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "budget_exhausted": self.budget_exhausted,
+                "wait_time": self.wait_time,
+                "errors": dict(self.errors),
+            }
+
+    def __repr__(self) -> str:
+        return "<RetryMetrics calls=%d retries=%d failures=%d>" % (self.calls, self.retries, self.failures)
+
+
+class RetryPolicy:
+    """
+    Retry policy of a client: transient errors are retried with an exponential backoff with full jitter, honoring the
+    ``Retry-After`` header of the responses.
+
+    Retries are limited by a retry budget shared by all the calls of the policy: it holds up to ``budget`` retries,
+    each call adds ``budget_ratio`` retry to it, and each retry takes one. When many calls fail at once, e.g. during an
+    outage or a burst over the quota, only a fraction of them are retried instead of all of them multiplying the load.
+
+    Calls are retried at a single level: a call made by a function that is itself being called with ``call`` in the
+    same thread is not retried on its own, the outermost call is. Calls made with ``retry_nested=True`` are the
+    exception: they are retried even when nested, e.g. the chunks of a resumable upload, which are much cheaper to
+    retry than the whole upload.
+    """
+
+    def __init__(self, *,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 budget: float = 100,
+                 budget_ratio: float = 0.2,
+                 should_retry: Callable[[Exception], bool] = is_retryable) -> None:
+        """
+        :param max_retries: maximum number of retries of a call
+        :param base_delay: maximum delay before the first retry, in seconds. It's doubled for each following retry.
+        :param max_delay: maximum delay between two attempts, in seconds, unless the server asks for more with a
+            ``Retry-After`` header
+        :param budget: maximum number of retries in the retry budget. The budget starts full.
+        :param budget_ratio: number of retries added to the budget by each call
+        :param should_retry: function that tests if an error is worth retrying
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.budget_ratio = budget_ratio
+        self.should_retry = should_retry
+        self.metrics = RetryMetrics()
+        self._tokens = float(budget)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def call(self, fn: Callable[[], T], *,
+             max_retries: Optional[int] = None,
+             on_retry: Optional[Callable[[int, Exception], None]] = None,
+             retry_nested: bool = False) -> T:
+        """
+        Call ``fn`` and return its result, retrying it if it fails with a transient error.
+
+        :param fn: function to call
+        :param max_retries: maximum number of retries. Default to the policy's ``max_retries``.
+        :param on_retry: function called with the attempt number and the error before each retry
+        :param retry_nested: retry ``fn`` even if this call is made within another call of the policy
+        """
+        nested = getattr(self._local, "calling", False)
+        if nested and not retry_nested:
+            # the outer call retries
+            return fn()
+
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        self.start_call()
+        self._local.calling = True
+        try:
+            attempt = 0
+            while True:
+                try:
+                    return fn()
+                except Exception as e:
+                    if attempt >= max_retries or not self.allow_retry(e):
+                        with self.metrics._lock:
+                            self.metrics.failures += 1
+                        raise
+                    attempt += 1
+                    if on_retry is not None:
+                        on_retry(attempt, e)
+                    self.wait(attempt, e)
+        finally:
+            self._local.calling = nested
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        Return the number of seconds to wait before the ``attempt``-th retry of a call that failed with ``error``.
+        """
+        return backoff_delay(attempt, error, base_delay=self.base_delay, max_delay=self.max_delay)
+
+    def wait(self, attempt: int, error: Optional[Exception] = None) -> None:
+        """
+        Wait before the ``attempt``-th retry of a call that failed with ``error``.
+        """
+        delay = self.delay(attempt, error)
+        with self.metrics._lock:
+            self.metrics.wait_time += delay
+        logger.warning("Retry #%d in %.2f seconds after error: %s", attempt, delay, error)
+        time.sleep(delay)
+
+    def start_call(self) -> None:
+        """
+        Record a call that is not made with ``call``: it's counted in the metrics and adds to the retry budget, like
+        the calls made with ``call``. Use it with ``allow_retry``.
+        """
+        with self._lock:
+            self._tokens = min(self.budget, self._tokens + self.budget_ratio)
+        with self.metrics._lock:
+            self.metrics.calls += 1
+
+    def allow_retry(self, error: Exception) -> bool:
+        """
+        Test if a call that failed with ``error`` can be retried according to the budget, and if so take a retry from
+        the budget. Use this to retry calls that are not made with ``call``.
+        """
+        return self.should_retry(error) and self._take_retry(error)
+
+    # Private API
+
+    def _take_retry(self, error: Exception) -> bool:
+        with self._lock:
+            allowed = self._tokens >= 1
+            if allowed:
+                self._tokens -= 1
+
+        with self.metrics._lock:
+            if not allowed:
+                self.metrics.budget_exhausted += 1
+                return False
+            self.metrics.retries += 1
+            key = str(error.resp.status) if isinstance(error, HttpError) else type(error).__name__
+            self.metrics.errors[key] = self.metrics.errors.get(key, 0) + 1
+        return True
@@ -1,72 +1,120 @@
+import re
 import time
-from typing import Iterable, Optional, Callable, TypeVar, Dict, List, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Dict, List, Any, Sequence, Tuple
 
-from googleapiclient import discovery  # type: ignore
-from googleapiclient.errors import HttpError  # type: ignore
-
-from .auth import authorize_credentials
+from .auth import authorize, get_credentials
+from .instrumentation import Instrumentation, observe
+from .pool import HttpPool
+from .ratelimit import TokenBucket
+from .retry import RetryPolicy
+from .services import build_service
 
 __all__ = ['SheetClient', 'sheet_lines_as_dicts']
 
-T = TypeVar('T')
-
-
-def _auto_retry(fn: Callable[[], T], *,
-                max_retries: int = 2,
-                sleep_for: int = 4) -> T:
-    while True:
-        try:
-            return fn()
-        except HttpError as e:
-            if e.status_code in {500, 503} and max_retries > 0:
-                max_retries -= 1
-                time.sleep(sleep_for)
-                continue
-
-            raise
+# Read requests per minute allowed per user by the Sheets API
+# https://developers.google.com/sheets/api/limits
+SHEETS_READ_QUOTA_PER_MINUTE = 60
+# Number of ranges fetched by each request of iter_sheet_lines
+RANGES_PER_REQUEST = 5
+# Number of rows sent in each range by write_rows and in each request by append_rows
+ROWS_PER_WRITE = 1000
 
 
 class SheetClient:
     """Google Sheets client."""
 
-    def __init__(self, credentials_path: Optional[str] = None) -> None:
-        http = authorize_credentials(credentials_path)
-        service = discovery.build('sheets', 'v4', http=http)
+    def __init__(self, credentials_path: Optional[str] = None, *,
+                 max_connections: int = 10,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 instrumentation: Optional[Instrumentation] = None) -> None:
+        """
+        :param credentials_path: path to the service account key JSON file. If ``None``, use the path given by the
+            environment variable ``GOOGLE_APPLICATION_CREDENTIALS``.
+        :param max_connections: maximum number of concurrent HTTP connections. The client can be shared between
+            threads.
+        :param rate_limiter: rate limiter applied to all requests. By default, requests are limited to the Sheets
+            per-user read quota (``SHEETS_READ_QUOTA_PER_MINUTE``), with bursts of up to 10 requests.
+        :param retry_policy: policy used to retry the requests that fail with a transient error. See
+            ``drive.retry.RetryPolicy``.
+        :param instrumentation: if set, receive an event for each call to the API. See ``drive.instrumentation``.
+        """
+        if rate_limiter is None:
+            rate_limiter = TokenBucket(SHEETS_READ_QUOTA_PER_MINUTE / 60, capacity=10)
+        self.rate_limiter = rate_limiter
+
+        credentials = get_credentials(credentials_path)
+        self._http_pool = HttpPool(lambda: authorize(credentials), max_size=max_connections, credentials=credentials,
+                                   rate_limiter=rate_limiter)
+        service = build_service('sheets', 'v4', http=self._http_pool)
         self.service = service.spreadsheets()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.instrumentation = instrumentation
 
     def get_sheet_range(self, sheet_id: str, sheet_tab: str, cell_range: str,
-                        *, max_retries: int = 2):
+                        *, max_retries: Optional[int] = None):
         """
         Get a range of cells from a spreadsheet.
 
         :param sheet_id:
         :param sheet_tab:
         :param cell_range: Range, like A1:B3 to get columns A-B of lines 1-3.
-        :param max_retries: Max retries on 5XX errors
+        :param max_retries: Max retries on transient errors. Default to the client's ``retry_policy``.
         :return:
         """
         req = self.service.values().get(spreadsheetId=sheet_id, range=f"{sheet_tab}!{cell_range}")
-        # Note this often raises errors 500 or 503
-        resp = _auto_retry(req.execute, max_retries=max_retries)
+        resp = self._execute(req, max_retries=max_retries)
         return resp["values"]
 
+    def get_sheet_ranges(self, sheet_id: str, ranges: List[str], *,
+                         major_dimension: str = "ROWS",
+                         value_render_option: str = "FORMATTED_VALUE",
+                         max_retries: Optional[int] = None) -> List[List[list]]:
+        """
+        Get multiple ranges of cells from a spreadsheet with a single request.
+
+        :param sheet_id:
+        :param ranges: ranges in A1 notation, including the tab name, like ``"Sheet1!A1:B3"``.
+        :param major_dimension: ``"ROWS"`` to get lists of lines, or ``"COLUMNS"`` to get lists of columns.
+        :param value_render_option: ``"FORMATTED_VALUE"`` to get the values as displayed, ``"UNFORMATTED_VALUE"``
+            to get typed values (e.g. numbers instead of formatted strings), or ``"FORMULA"``.
+        :param max_retries: Max retries on transient errors. Default to the client's ``retry_policy``.
+        :return: the lines (or columns) of each range, in the same order as ``ranges``. Ranges with no values give an
+            empty list.
+        """
+        req = self.service.values().batchGet(spreadsheetId=sheet_id, ranges=ranges,
+                                             majorDimension=major_dimension,
+                                             valueRenderOption=value_render_option)
+        resp = self._execute(req, max_retries=max_retries)
+        return [value_range.get("values", []) for value_range in resp.get("valueRanges", [])]
+
     def iter_sheet_lines(self, sheet_id: str, sheet_tab: str, column_start: str, column_end: str,
                          *,
                          offset: int = 0,
                          batch_size: int = 400,
-                         sleep_for: float = 0.5,
+                         ranges_per_request: int = RANGES_PER_REQUEST,
+                         prefetch: bool = True,
+                         sleep_for: Optional[float] = None,
                          sleep: Optional[float] = None) \
             -> Iterable[list]:
         """
         Iterate over lines of a spreadsheet: fetch them in batches and yield one at a time.
 
+        Each request fetches ``ranges_per_request`` batches of ``batch_size`` lines with ``values.batchGet``. With
+        ``prefetch``, the next request is sent in a background thread while the lines of the current one are consumed.
+        Requests are paced by the client's ``rate_limiter``.
+
         :param sheet_id: spreadsheet ID
         :param sheet_tab: tab name
         :param column_start: first column (example: "A")
         :param column_end: last column (example: "Z")
         :param offset: start reading at this offset
-        :param batch_size: how many lines to fetch at a time.
-        :param sleep_for: sleep this amount of time between batch calls.
+        :param batch_size: how many lines to fetch in each range.
+        :param ranges_per_request: how many ranges to fetch in each request.
+        :param prefetch: fetch the next lines while the current ones are consumed.
+        :param sleep_for: deprecated: if set, also sleep this amount of time between requests.
         :param sleep: deprecated alias for sleep_for.
         :return:
         """
@@ -74,18 +122,226 @@ class SheetClient:
         if sleep is not None:
             sleep_for = sleep
 
-        offset += 1  # lines start at 1
-        while True:
-            cell_range = f"{column_start}{offset}:{column_end}{offset + batch_size}"
-            lines = self.get_sheet_range(sheet_id, sheet_tab, cell_range)
-            yield from lines
-            if len(lines) < batch_size:
-                break
-            offset += batch_size
-            if sleep_for > 0:
-                # Don't hammer the API
-                # https://developers.google.com/sheets/api/reference/limits
+        rows_per_request = batch_size * ranges_per_request
+
+        def fetch(start: int) -> List[List[list]]:
+            if sleep_for and start > offset + 1:
                 time.sleep(sleep_for)
+            ranges = [f"{sheet_tab}!{column_start}{first}:{column_end}{first + batch_size - 1}"
+                      for first in range(start, start + rows_per_request, batch_size)]
+            return self.get_sheet_ranges(sheet_id, ranges)
+
+        start = offset + 1  # lines start at 1
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            future: Optional[Future] = pool.submit(fetch, start)
+            while future is not None:
+                batches = future.result()
+                # the last lines have been reached if a range is not full
+                complete = len(batches) == ranges_per_request and all(len(lines) >= batch_size for lines in batches)
+                start += rows_per_request
+                future = pool.submit(fetch, start) if complete and prefetch else None
+
+                for lines in batches:
+                    yield from lines
+                    if len(lines) < batch_size:
+                        break
+
+                if complete and not prefetch:
+                    future = pool.submit(fetch, start)
+
+    def update_sheet_range(self, sheet_id: str, sheet_tab: str, cell_range: str, values: Iterable[Iterable[Any]],
+                           *,
+                           value_input_option: str = "RAW",
+                           max_retries: Optional[int] = None) -> dict:
+        """
+        Overwrite a range of cells of a spreadsheet with a single ``values.update`` request.
+
+        :param sheet_id:
+        :param sheet_tab:
+        :param cell_range: Range, like A1:B3 to write columns A-B of lines 1-3.
+        :param values: lines of values
+        :param value_input_option: ``"RAW"`` to store the values as-is, or ``"USER_ENTERED"`` to parse them as if they
+            were typed in the UI (formulas, dates, etc).
+        :param max_retries: Max retries on transient errors. Default to the client's ``retry_policy``.
+        :return: the API response
+        """
+        req = self.service.values().update(spreadsheetId=sheet_id,
+                                           range=f"{sheet_tab}!{cell_range}",
+                                           valueInputOption=value_input_option,
+                                           body={"values": [list(line) for line in values]})
+        return self._execute(req, max_retries=max_retries)
+
+    def write_rows(self, sheet_id: str, sheet_tab: str, rows: Iterable[Iterable[Any]],
+                   *,
+                   start_cell: str = "A1",
+                   batch_size: int = ROWS_PER_WRITE,
+                   ranges_per_request: int = RANGES_PER_REQUEST,
+                   value_input_option: str = "RAW",
+                   max_retries: Optional[int] = None) -> int:
+        """
+        Write lines to a spreadsheet, starting at ``start_cell``. Existing cells are overwritten; cells outside of the
+        written lines are left untouched.
+
+        Lines are sent in ranges of ``batch_size`` lines, ``ranges_per_request`` ranges per ``values.batchUpdate``
+        request. ``rows`` can be a generator: at most ``batch_size * ranges_per_request`` lines are held in memory.
+        Requests are paced by the client's ``rate_limiter``.
+
+        :param sheet_id: spreadsheet ID
+        :param sheet_tab: tab name
+        :param rows: lines of values
+        :param start_cell: top-left cell of the written lines (example: "B2")
+        :param batch_size: how many lines to send in each range.
+        :param ranges_per_request: how many ranges to send in each request.
+        :param value_input_option: see ``update_sheet_range``
+        :param max_retries: Max retries on transient errors. Default to the client's ``retry_policy``.
+        :return: the number of lines written
+        """
+        column, next_line = _split_cell(start_cell)
+
+        def send(data: List[dict]) -> None:
+            req = self.service.values().batchUpdate(spreadsheetId=sheet_id, body={
+                "valueInputOption": value_input_option,
+                "data": data,
+            })
+            self._execute(req, max_retries=max_retries)
+
+        data: List[dict] = []
+        written = 0
+        for lines in _iter_batches(rows, batch_size):
+            data.append({"range": f"{sheet_tab}!{column}{next_line}", "values": lines})
+            next_line += len(lines)
+            written += len(lines)
+            if len(data) >= ranges_per_request:
+                send(data)
+                data = []
+
+        if data:
+            send(data)
+
+        return written
+
+    def append_rows(self, sheet_id: str, sheet_tab: str, rows: Iterable[Iterable[Any]],
+                    *,
+                    cell_range: Optional[str] = None,
+                    batch_size: int = ROWS_PER_WRITE,
+                    value_input_option: str = "RAW",
+                    insert_data_option: str = "INSERT_ROWS",
+                    max_retries: Optional[int] = None) -> int:
+        """
+        Append lines after the table of a tab, with one ``values.append`` request per ``batch_size`` lines. ``rows``
+        can be a generator: at most ``batch_size`` lines are held in memory.
+
+        Note an append is not idempotent: if a request fails after the lines were written, e.g. on a timeout, retrying
+        it appends them again. Set ``max_retries=0`` to disable retries.
+
+        :param sheet_id: spreadsheet ID
+        :param sheet_tab: tab name
+        :param rows: lines of values
+        :param cell_range: range used to find the table, like A:C. Default to the whole tab.
+        :param batch_size: how many lines to send in each request.
+        :param value_input_option: see ``update_sheet_range``
+        :param insert_data_option: ``"INSERT_ROWS"`` to insert new lines for the appended values, or ``"OVERWRITE"``
+            to write them in the lines after the table.
+        :param max_retries: Max retries on transient errors. Default to the client's ``retry_policy``.
+        :return: the number of lines appended
+        """
+        target = f"{sheet_tab}!{cell_range}" if cell_range else sheet_tab
+        appended = 0
+        for lines in _iter_batches(rows, batch_size):
+            req = self.service.values().append(spreadsheetId=sheet_id,
+                                               range=target,
+                                               valueInputOption=value_input_option,
+                                               insertDataOption=insert_data_option,
+                                               body={"values": lines})
+            self._execute(req, max_retries=max_retries)
+            appended += len(lines)
+
+        return appended
+
+    def iter_sheet_columns(self, sheet_id: str, sheet_tab: str, column_start: str, column_end: str,
+                           *,
+                           first_line: int = 1,
+                           columns_per_request: int = RANGES_PER_REQUEST,
+                           value_render_option: str = "UNFORMATTED_VALUE") -> Iterator[list]:
+        """
+        Iterate over columns of a spreadsheet: fetch them with ``values.batchGet`` requests of ``columns_per_request``
+        columns and yield one at a time, from ``first_line`` to the last non-empty cell of the column.
+
+        By default, values are not formatted: numbers are returned as numbers instead of strings, and dates as serial
+        numbers.
+
+        :param sheet_id: spreadsheet ID
+        :param sheet_tab: tab name
+        :param column_start: first column (example: "A")
+        :param column_end: last column (example: "Z")
+        :param first_line: first line of each column
+        :param columns_per_request: how many columns to fetch in each request.
+        :param value_render_option: see ``get_sheet_ranges``
+        :return:
+        """
+        columns = [_column_letters(i)
+                   for i in range(_column_index(column_start), _column_index(column_end) + 1)]
+
+        for i in range(0, len(columns), columns_per_request):
+            ranges = [f"{sheet_tab}!{column}{first_line}:{column}" for column in columns[i:i + columns_per_request]]
+            for values in self.get_sheet_ranges(sheet_id, ranges,
+                                                major_dimension="COLUMNS",
+                                                value_render_option=value_render_option):
+                yield values[0] if values else []
+
+    def read_sheet_table(self, sheet_id: str, sheet_tab: str, column_start: str, column_end: str,
+                         *,
+                         first_line: int = 1,
+                         fieldnames: Optional[Iterable[Any]] = None,
+                         restval: Any = None,
+                         output: str = "lists",
+                         **kwargs) -> Any:
+        """
+        Read a table from a spreadsheet in a column-oriented way: this is much faster than building one dict per line
+        with ``iter_sheet_lines_as_dicts`` for wide tables.
+
+        ``output`` selects the type of the result:
+
+        * ``"lists"``: a dict mapping each header to the list of values of its column
+        * ``"numpy"``: a dict mapping each header to a NumPy array. Numeric columns give ``float`` arrays with NaN for
+          empty cells, other columns give ``object`` arrays. This needs ``numpy``.
+        * ``"pandas"``: a ``pandas.DataFrame``. This needs ``pandas``.
+
+        :param sheet_id: spreadsheet ID
+        :param sheet_tab: tab name
+        :param column_start: first column (example: "A")
+        :param column_end: last column (example: "Z")
+        :param first_line: first line of the table
+        :param fieldnames: one name per column. If omitted, the first line of the table is used as a header.
+        :param restval: value of empty cells
+        :param output: ``"lists"``, ``"numpy"`` or ``"pandas"``.
+        :param kwargs: additional arguments for ``iter_sheet_columns``
+        :return:
+        """
+        if output not in ("lists", "numpy", "pandas"):
+            raise ValueError("Unsupported output: %r" % output)
+
+        columns = list(self.iter_sheet_columns(sheet_id, sheet_tab, column_start, column_end,
+                                               first_line=first_line, **kwargs))
+        if fieldnames is None:
+            headers = [column[0] if column else "" for column in columns]
+            columns = [column[1:] for column in columns]
+        else:
+            headers = list(fieldnames)
+
+        # Columns stop at their last non-empty cell
+        length = max(map(len, columns), default=0)
+        table = {
+            header: [restval if value == "" else value for value in column] + [restval] * (length - len(column))
+            for header, column in zip(headers, columns)
+        }
+
+        if output == "numpy":
+            numpy = _import_numpy()
+            return {header: _column_array(numpy, values) for header, values in table.items()}
+        if output == "pandas":
+            return _import_pandas().DataFrame(table)
+        return table
 
     def iter_sheet_lines_as_dicts(self, sheet_id: str, sheet_tab: str,
                                   column_start: str, column_end: str,
@@ -111,8 +367,18 @@ class SheetClient:
             restval=restval,
         )
 
+    # Private API
 
-def sheet_lines_as_dicts(lines: Iterable[List[Any]],
+    def _execute(self, req: Any, *, max_retries: Optional[int] = None) -> Any:
+        """
+        Execute a request, retrying it according to the client's ``retry_policy``.
+        """
+        # Note this often raises errors 500 or 503
+        return observe(self.instrumentation, getattr(req, "methodId", None) or "unknown", self.retry_policy,
+                       req.execute, max_retries=max_retries)
+
+
+def sheet_lines_as_dicts(lines: Iterable[Sequence[Any]],
                          fieldnames: Optional[Iterable[Any]] = None,
                          *,
                          restkey: Any = None,
@@ -129,32 +395,101 @@ def sheet_lines_as_dicts(lines: Iterable[List[Any]],
     :param restval:
     :return:
     """
-    # cell index -> header key
-    cell_index_mapping: Dict[int, Any] = {}
-    empty_line = {}
+    # header key of each cell index
+    keys: List[Any] = []
+    empty_line: Dict[Any, Any] = {}
 
     first = True
     if fieldnames is not None:
         first = False
-        for i, field_name in enumerate(fieldnames):
-            cell_index_mapping[i] = field_name
-        empty_line = {field: restval for field in cell_index_mapping.values()}
+        keys = list(fieldnames)
+        empty_line = dict.fromkeys(keys, restval)
 
     for line in lines:
         if first:
-            for i, value in enumerate(line):
-                cell_index_mapping[i] = value
-            empty_line = {field: restval for field in cell_index_mapping.values()}
+            keys = list(line)
+            empty_line = dict.fromkeys(keys, restval)
             first = False
             continue
 
         m = dict(empty_line)
-
-        for i, value in enumerate(line):
-            if i in cell_index_mapping:
-                m[cell_index_mapping[i]] = value
-            else:
-                m.setdefault(restkey, [])
-                m[restkey].append(value)
+        m.update(zip(keys, line))
+        if len(line) > len(keys):
+            m[restkey] = list(line[len(keys):])
 
         yield m
+
+
+def _column_index(column: str) -> int:
+    """
+    Return the index of a column, starting at 1: ``"A"`` -> 1, ``"Z"`` -> 26, ``"AA"`` -> 27.
+    """
+    if not column.isalpha() or not column.isascii():
+        raise ValueError("Invalid column: %r" % column)
+
+    index = 0
+    for letter in column.upper():
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index
+
+
+def _column_letters(index: int) -> str:
+    """
+    Return the letters of a column from its index, starting at 1. This is the inverse of ``_column_index``.
+    """
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _column_array(numpy: Any, values: List[Any]) -> Any:
+    """
+    Convert the values of a column to a NumPy array: a ``float`` array if they are all numbers or empty (``None``),
+    an ``object`` array otherwise.
+    """
+    if all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in values):
+        return numpy.array([numpy.nan if value is None else value for value in values], dtype=float)
+    return numpy.array(values, dtype=object)
+
+
+def _import_numpy() -> Any:
+    try:
+        import numpy  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("output='numpy' needs numpy. Install it with: pip install 'drive[numpy]'") from e
+    return numpy
+
+
+def _import_pandas() -> Any:
+    try:
+        import pandas  # type: ignore
+    except ImportError as e:
+        raise RuntimeError("output='pandas' needs pandas. Install it with: pip install 'drive[pandas]'") from e
+    return pandas
+
+
+def _iter_batches(rows: Iterable[Iterable[Any]], size: int) -> Iterator[List[list]]:
+    """
+    Yield lists of at most ``size`` lines, converting each line to a list.
+    """
+    if size < 1:
+        raise ValueError("batch size must be positive")
+
+    it = iter(rows)
+    while True:
+        batch = [list(line) for line in islice(it, size)]
+        if not batch:
+            return
+        yield batch
+
+
+def _split_cell(cell: str) -> Tuple[str, int]:
+    """
+    Split a cell in A1 notation in its column and line number, e.g. ``"B12"`` -> ``("B", 12)``.
+    """
+    m = re.fullmatch(r"([A-Za-z]+)([1-9][0-9]*)", cell)
+    if m is None:
+        raise ValueError("Invalid cell: %r" % cell)
+    return m.group(1).upper(), int(m.group(2))
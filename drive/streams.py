@@ -0,0 +1,162 @@
+# -*- coding: UTF-8 -*-
+
+import codecs
+import csv
+import gzip
+import io
+import json
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+__all__ = ["ChunksReader", "open_stream", "iter_json_lines", "iter_json_array", "iter_csv_rows"]
+
+# Magic number of gzip files
+GZIP_MAGIC = b"\x1f\x8b"
+# Number of bytes read at a time when parsing a stream
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+# Characters that can follow the first digit of a number
+_NUMBER_CHARS = set("0123456789+-.eE")
+
+
+class ChunksReader(io.RawIOBase):
+    """
+    Read-only binary stream over an iterable of ``bytes`` chunks, e.g. ``Client.iter_download``. Chunks are consumed
+    as the stream is read, so only the current chunk is kept in memory.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._chunk = b""
+        self._offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while self._offset >= len(self._chunk):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._chunk = chunk
+            self._offset = 0
+
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+
+def open_stream(chunks: Iterable[bytes], *, decompress: Optional[bool] = None) -> BinaryIO:
+    """
+    Return a buffered binary stream over an iterable of ``bytes`` chunks.
+
+    :param chunks:
+    :param decompress: if true, decompress the content with gzip as it's read. If ``None`` (default), decompress it
+        only if it starts with the gzip magic number.
+    """
+    stream = io.BufferedReader(ChunksReader(chunks), buffer_size=READ_SIZE)
+    if decompress is None:
+        decompress = stream.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] == GZIP_MAGIC
+    if decompress:
+        return gzip.GzipFile(fileobj=stream, mode="rb")  # type: ignore
+    return stream  # type: ignore
+
+
+def iter_json_lines(stream: BinaryIO, *, loads: Callable[[bytes], Any] = json.loads) -> Iterator[Any]:
+    """
+    Parse a stream of newline-delimited JSON objects and yield them one at a time. Empty lines are skipped.
+
+    :param stream: binary stream
+    :param loads: function that parses a JSON document, e.g. ``orjson.loads``
+    """
+    for line in stream:
+        if line.strip():
+            yield loads(line)
+
+
+def iter_json_array(stream: BinaryIO, *, encoding: str = "utf-8") -> Iterator[Any]:
+    """
+    Parse a stream that contains a JSON array and yield its items one at a time, without loading the whole array in
+    memory. Only the item being parsed is buffered.
+
+    :param stream: binary stream
+    :param encoding: encoding of the stream
+    :raise: ``ValueError`` if the stream doesn't contain a valid JSON array
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        data = stream.read(READ_SIZE)
+        eof = not data
+        buffer = buffer[position:] + text_decoder.decode(data, final=eof)
+        position = 0
+        return True
+
+    def next_char() -> str:
+        # Skip whitespace and return the next character, or "" at the end of the stream
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer) or not fill():
+                return buffer[position:position + 1]
+
+    if next_char() != "[":
+        raise ValueError("The stream doesn't contain a JSON array")
+    position += 1
+
+    if next_char() == "]":
+        position += 1
+    else:
+        while True:
+            next_char()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The item may be incomplete
+                    if not fill():
+                        raise
+                    continue
+                # A number at the end of the buffer may continue in the next chunk
+                if _NUMBER_CHARS.issuperset(buffer[end:]) and fill():
+                    continue
+                break
+
+            position = end
+            yield item
+
+            separator = next_char()
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError("Expected ',' or ']' at the end of an item of the JSON array")
+
+    if next_char() != "":
+        raise ValueError("Extra data after the JSON array")
+
+
+def iter_csv_rows(stream: BinaryIO, *, encoding: str = "utf-8", **kwargs) -> Iterator[Tuple[str, ...]]:
+    """
+    Parse a CSV stream and yield its rows as tuples of strings, one at a time.
+
+    :param stream: binary stream
+    :param encoding: encoding of the stream
+    :param kwargs: additional arguments for ``csv.reader``
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")  # type: ignore
+    try:
+        for row in csv.reader(text, **kwargs):
+            yield tuple(row)
+    finally:
+        # Don't close the underlying stream
+        text.detach()
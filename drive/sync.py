@@ -0,0 +1,420 @@
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import os
+import os.path
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, List, Dict, Tuple, Union, Iterator, cast
+
+import drive
+from drive.files import File, FILE_FIELDS, EXTRA_FILE_FIELDS
+
+__all__ = ["Sync", "SyncAction", "SyncPlan", "UPLOAD", "DOWNLOAD", "BOTH"]
+
+# Sync directions
+UPLOAD = "upload"
+DOWNLOAD = "download"
+BOTH = "both"
+
+# Kinds of actions
+ACTION_UPLOAD = "upload"
+ACTION_DOWNLOAD = "download"
+ACTION_CONFLICT = "conflict"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Suffix of the temporary files of the downloads in progress
+PART_SUFFIX = ".part"
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    local_root TEXT NOT NULL,
+    remote_root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    remote_id TEXT NOT NULL,
+    remote_md5 TEXT NOT NULL,
+    PRIMARY KEY (local_root, remote_root, path)
+)
+"""
+
+
+class _StateRecord:
+    """
+    State of a file the last time it was synced.
+    """
+
+    def __init__(self, size: int, mtime_ns: int, md5: str, remote_id: str, remote_md5: str) -> None:
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.md5 = md5
+        self.remote_id = remote_id
+        self.remote_md5 = remote_md5
+
+
+class SyncAction:
+    """
+    Transfer of a file planned by a ``Sync``: ``upload``, ``download``, or ``conflict`` if the file changed on both
+    sides since the last sync. Conflicts are never executed.
+    """
+
+    def __init__(self, action: str, path: str, local_path: str, *,
+                 remote: Optional[File] = None,
+                 reason: str = "",
+                 md5: Optional[str] = None) -> None:
+        """
+        :param action: kind of action
+        :param path: path of the file relative to the synced directories, with ``/`` as separator
+        :param local_path: local path of the file
+        :param remote: remote file, if it exists
+        :param reason: human-readable reason of the action
+        :param md5: MD5 checksum of the content to transfer, if it's known
+        """
+        self.action = action
+        self.path = path
+        self.local_path = local_path
+        self.remote = remote
+        self.reason = reason
+        self.md5 = md5
+        # set when the plan is executed
+        self.done = False
+        self.error: Optional[Exception] = None
+
+    def __repr__(self) -> str:
+        return "<SyncAction %s %s (%s)>" % (self.action, self.path, self.reason)
+
+
+class SyncPlan:
+    """
+    List of the actions needed to sync two directories, returned by ``Sync.plan``.
+    """
+
+    def __init__(self, direction: str, actions: List[SyncAction], unchanged: List[Tuple[str, File]]) -> None:
+        self.direction = direction
+        self.actions = actions
+        # files that are identical on both sides, with their remote file
+        self.unchanged = unchanged
+
+    def __iter__(self) -> Iterator[SyncAction]:
+        return iter(self.actions)
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    @property
+    def transfers(self) -> List[SyncAction]:
+        """Actions that transfer a file, i.e. all actions but conflicts."""
+        return [a for a in self.actions if a.action != ACTION_CONFLICT]
+
+    @property
+    def conflicts(self) -> List[SyncAction]:
+        """Files that changed on both sides since the last sync."""
+        return [a for a in self.actions if a.action == ACTION_CONFLICT]
+
+
+class Sync:
+    """
+    Incremental sync of a local directory with a remote folder. Files are compared by size and MD5 checksum, and only
+    the files that differ are transferred:
+
+        sync = Sync(client, "reports", folder_id, state_path="~/.cache/reports-sync.db")
+        plan = sync.plan("upload")
+        for action in plan:
+            print(action.action, action.path, action.reason)
+        sync.execute(plan)
+
+    The remote tree is listed with ``Client.walk``, which requests the checksums of all files with the listing. With a
+    ``state_path``, the size, modification time and checksum of each synced file are saved in a SQLite database: the
+    checksum of a local file is then computed only if the file changed since the last sync, and ``"both"`` syncs can
+    tell which side of a file changed.
+
+    Directions:
+
+    * ``"upload"``: upload the local files that are missing or different on Drive
+    * ``"download"``: download the remote files that are missing or different locally
+    * ``"both"``: transfer each file that changed on one side only to the other side. A file that changed on both
+      sides is a conflict and is left untouched. Without a state, the most recently modified side wins.
+
+    Deletions are not propagated. Google Docs, which have no checksum, are ignored.
+    """
+
+    def __init__(self, client: "drive.Client", local_dir: str, remote_folder: Union[str, File], *,
+                 state_path: Optional[str] = None,
+                 parallelism: int = 4) -> None:
+        """
+        :param client:
+        :param local_dir: local directory
+        :param remote_folder: remote folder, or its ID
+        :param state_path: path of the SQLite state database. It's created if it doesn't exist. A database can be
+            shared by multiple syncs.
+        :param parallelism: number of files transferred at the same time
+        """
+        self.client = client
+        self.local_dir = local_dir
+        self.remote_folder_id = remote_folder.id if isinstance(remote_folder, File) else remote_folder
+        self.parallelism = parallelism
+
+        self._db: Optional[sqlite3.Connection] = None
+        if state_path:
+            self._db = sqlite3.connect(os.path.expanduser(state_path))
+            self._db.execute(STATE_SCHEMA)
+            self._db.commit()
+
+        # relative path of a remote folder -> its ID. This is filled by plan().
+        self._remote_folders: Dict[str, str] = {}
+
+    def close(self) -> None:
+        """
+        Close the state database.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def run(self, direction: str = UPLOAD, *, dry_run: bool = False) -> SyncPlan:
+        """
+        Plan the sync and execute it, unless ``dry_run`` is true. Return the plan.
+        """
+        plan = self.plan(direction)
+        if not dry_run:
+            self.execute(plan)
+        return plan
+
+    def plan(self, direction: str = UPLOAD) -> SyncPlan:
+        """
+        Compare the local directory with the remote folder and return the actions needed to sync them. Nothing is
+        transferred or saved.
+
+        :param direction: ``"upload"``, ``"download"`` or ``"both"``
+        """
+        if direction not in (UPLOAD, DOWNLOAD, BOTH):
+            raise ValueError("Unknown sync direction: %r" % direction)
+
+        local_files = self._list_local_files()
+        remote_files = self._list_remote_files()
+        states = self._load_states()
+
+        actions: List[SyncAction] = []
+        unchanged: List[Tuple[str, File]] = []
+        for path in sorted(set(local_files) | set(remote_files)):
+            local_path = os.path.join(self.local_dir, *path.split("/"))
+            stat = local_files.get(path)
+            remote = remote_files.get(path)
+            state = states.get(path)
+
+            if remote is None:
+                if direction != DOWNLOAD:
+                    actions.append(SyncAction(ACTION_UPLOAD, path, local_path, reason="missing on Drive"))
+                continue
+
+            if stat is None:
+                if direction != UPLOAD:
+                    actions.append(SyncAction(ACTION_DOWNLOAD, path, local_path, remote=remote,
+                                              reason="missing locally", md5=remote.md5_checksum))
+                continue
+
+            local_md5 = self._local_md5(local_path, stat, state)
+            if stat.st_size == remote.size and local_md5 == remote.md5_checksum:
+                unchanged.append((path, remote))
+                continue
+
+            if direction == UPLOAD:
+                action = ACTION_UPLOAD
+            elif direction == DOWNLOAD:
+                action = ACTION_DOWNLOAD
+            elif state is not None:
+                local_changed = local_md5 != state.md5
+                remote_changed = remote.md5_checksum != state.remote_md5
+                if local_changed and remote_changed:
+                    action = ACTION_CONFLICT
+                else:
+                    action = ACTION_DOWNLOAD if remote_changed else ACTION_UPLOAD
+            elif remote.modified_time and remote.modified_time.timestamp() > stat.st_mtime:
+                action = ACTION_DOWNLOAD
+            else:
+                action = ACTION_UPLOAD
+
+            reason = "changed on both sides" if action == ACTION_CONFLICT else "different content"
+            md5 = remote.md5_checksum if action == ACTION_DOWNLOAD else local_md5
+            actions.append(SyncAction(action, path, local_path, remote=remote, reason=reason, md5=md5))
+
+        return SyncPlan(direction, actions, unchanged)
+
+    def execute(self, plan: SyncPlan) -> List[SyncAction]:
+        """
+        Execute the transfers of a plan, ``parallelism`` files at a time, and save the state of the synced files. A
+        transfer that fails doesn't stop the others: its error is stored in the ``error`` attribute of its action.
+
+        :return: the actions that failed
+        """
+        transfers = plan.transfers
+
+        for action in transfers:
+            if action.action == ACTION_UPLOAD and action.remote is None:
+                try:
+                    self._ensure_remote_folder(_parent_path(action.path))
+                except Exception as e:
+                    action.error = e
+
+        with ThreadPoolExecutor(max_workers=self.parallelism) as pool:
+            futures = {pool.submit(self._transfer, action): action for action in transfers if action.error is None}
+            for future in as_completed(futures):
+                action = futures[future]
+                try:
+                    remote = future.result()
+                except Exception as e:
+                    action.error = e
+                    continue
+                action.done = True
+                self._save_state(action.path, action.local_path, remote, action.md5)
+
+        for path, remote in plan.unchanged:
+            self._save_state(path, os.path.join(self.local_dir, *path.split("/")), remote, remote.md5_checksum)
+
+        if self._db is not None:
+            self._db.commit()
+
+        return [action for action in transfers if action.error is not None]
+
+    # Private API
+
+    def _list_local_files(self) -> Dict[str, os.stat_result]:
+        """
+        Return the stat of each local file, indexed by its relative path.
+        """
+        files: Dict[str, os.stat_result] = {}
+        for dirpath, _, filenames in os.walk(self.local_dir):
+            rel_dir = os.path.relpath(dirpath, self.local_dir)
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(PART_SUFFIX) or not os.path.isfile(path):
+                    continue
+                rel_path = filename if rel_dir == "." else "%s/%s" % (rel_dir.replace(os.sep, "/"), filename)
+                files[rel_path] = os.stat(path)
+        return files
+
+    def _list_remote_files(self) -> Dict[str, File]:
+        """
+        Return the remote files that have a checksum, indexed by their relative path. This also fills
+        ``_remote_folders``.
+        """
+        self._remote_folders = {"": self.remote_folder_id}
+        paths: Dict[str, str] = {self.remote_folder_id: ""}
+        files: Dict[str, File] = {}
+
+        for folder, folders, folder_files in self.client.walk(self.remote_folder_id,
+                                                              fields=FILE_FIELDS + EXTRA_FILE_FIELDS):
+            folder_path = paths[folder.id]
+            for subfolder in folders:
+                if subfolder.id not in paths:
+                    subfolder_path = _join_path(folder_path, cast(str, subfolder.name))
+                    paths[subfolder.id] = subfolder_path
+                    self._remote_folders.setdefault(subfolder_path, subfolder.id)
+
+            for file in folder_files:
+                if file.md5_checksum is not None:
+                    files.setdefault(_join_path(folder_path, cast(str, file.name)), file)
+
+        return files
+
+    def _load_states(self) -> Dict[str, _StateRecord]:
+        if self._db is None:
+            return {}
+
+        rows = self._db.execute("SELECT path, size, mtime_ns, md5, remote_id, remote_md5 FROM files"
+                                " WHERE local_root = ? AND remote_root = ?", self._roots())
+        return {row[0]: _StateRecord(*row[1:]) for row in rows}
+
+    def _save_state(self, path: str, local_path: str, remote: File, md5: Optional[str]) -> None:
+        if self._db is None:
+            return
+
+        stat = os.stat(local_path)
+        if md5 is None:
+            md5 = _md5(local_path)
+        self._db.execute("INSERT OR REPLACE INTO files"
+                         " (local_root, remote_root, path, size, mtime_ns, md5, remote_id, remote_md5)"
+                         " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         self._roots() + (path, stat.st_size, stat.st_mtime_ns, md5, remote.id,
+                                          remote.md5_checksum or md5))
+
+    def _roots(self) -> Tuple[str, str]:
+        return os.path.realpath(self.local_dir), self.remote_folder_id
+
+    def _local_md5(self, local_path: str, stat: os.stat_result, state: Optional[_StateRecord]) -> str:
+        """
+        Return the MD5 checksum of a local file. Use the one in the state if the file didn't change since it was saved.
+        """
+        if state is not None and state.size == stat.st_size and state.mtime_ns == stat.st_mtime_ns:
+            return state.md5
+        return _md5(local_path)
+
+    def _ensure_remote_folder(self, path: str) -> str:
+        """
+        Return the ID of the remote folder at a relative path, creating it and its parents if needed.
+        """
+        if path in self._remote_folders:
+            return self._remote_folders[path]
+
+        parent_id = self._ensure_remote_folder(_parent_path(path))
+        folder = self.client.create_folder(path.rsplit("/", 1)[-1], parent_id)
+        self._remote_folders[path] = folder.id
+        return folder.id
+
+    def _transfer(self, action: SyncAction) -> File:
+        """
+        Execute an upload or a download and return the remote file.
+        """
+        if action.action == ACTION_DOWNLOAD:
+            remote = cast(File, action.remote)
+            os.makedirs(os.path.dirname(action.local_path), exist_ok=True)
+            # Download to a temporary file, so an interrupted download doesn't leave a truncated file
+            tmp_path = action.local_path + PART_SUFFIX
+            try:
+                self.client.download_file(remote.id, tmp_path)
+                if remote.modified_time:
+                    mtime_ns = int(remote.modified_time.timestamp() * 1e9)
+                    os.utime(tmp_path, ns=(time.time_ns(), mtime_ns))
+                os.replace(tmp_path, action.local_path)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            return remote
+
+        if action.remote is None:
+            folder_id = self._remote_folders[_parent_path(action.path)]
+            return self.client.upload_file(folder_id, action.local_path)
+
+        with open(action.local_path, "rb") as reader:
+            # noinspection PyProtectedMember
+            media = self.client._make_media(reader)
+            return cast(File, self.client.update_file(action.remote.id, media=media))
+
+
+def _md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _join_path(parent: str, name: str) -> str:
+    return "%s/%s" % (parent, name) if parent else name
+
+
+def _parent_path(path: str) -> str:
+    return path.rsplit("/", 1)[0] if "/" in path else ""
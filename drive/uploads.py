@@ -0,0 +1,75 @@
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import json
+import os
+import os.path
+import tempfile
+from typing import Any, BinaryIO, Dict, Optional
+
+__all__ = ["UploadStateStore", "upload_state_key"]
+
+
+class UploadStateStore:
+    """
+    Directory of JSON files that record the resumable uploads in progress: their session URI and the number of bytes
+    the server confirmed. If a process crashes in the middle of an upload, the next one that uploads the same file
+    resumes the session instead of starting over. Use it with ``Client(upload_state_dir=…)``.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the state saved for an upload, or ``None`` if there is none.
+        """
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key: str, state: Dict[str, Any]) -> None:
+        """
+        Save the state of an upload. The file is replaced atomically, so a crash never leaves a partial state.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def remove(self, key: str) -> None:
+        """
+        Remove the state of an upload, if any.
+        """
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, "%s.json" % key)
+
+
+def upload_state_key(reader: BinaryIO, parent_id: str, name: str, mime_type: Optional[str]) -> Optional[str]:
+    """
+    Return the key identifying the upload of a local file, or ``None`` if ``reader`` is not a local file. The key
+    changes if the file is modified, so a stale session is never resumed with a different content.
+    """
+    path = getattr(reader, "name", None)
+    if not isinstance(path, str):
+        return None
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    identity = [os.path.realpath(path), stat.st_size, stat.st_mtime_ns, parent_id, name, mime_type]
+    return hashlib.sha1(json.dumps(identity).encode("utf-8")).hexdigest()
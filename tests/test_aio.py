@@ -0,0 +1,425 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import io
+import re
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+from googleapiclient.errors import HttpError  # noqa: E402
+
+from drive import aio  # noqa: E402
+from drive.exceptions import DriveException  # noqa: E402
+from drive.files import File  # noqa: E402
+
+
+class FakeToken:
+    access_token = "token"
+    expires_in = 3600
+
+
+class FakeCredentials:
+    def __init__(self):
+        self.calls = 0
+
+    def get_access_token(self):
+        self.calls += 1
+        return FakeToken()
+
+
+class FakeDrive:
+    """Minimal Drive API server."""
+
+    def __init__(self, content=b""):
+        self.content = content
+        self.requests = []
+        # number of times each kind of request fails before succeeding
+        self.failures = {}
+        self.uploaded = bytearray()
+        self.upload_metadata = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/drive/files", self.list_files)
+        app.router.add_get("/drive/files/{id}", self.get_file)
+        app.router.add_patch("/drive/files/{id}", self.update_file)
+        app.router.add_post("/upload/files", self.start_upload)
+        app.router.add_put("/upload/session", self.upload_chunk)
+        app.router.add_get("/sheets/spreadsheets/{id}/values/{range}", self.get_values)
+        return app
+
+    def fail(self, kind):
+        if self.failures.get(kind):
+            self.failures[kind] -= 1
+            return True
+        return False
+
+    async def list_files(self, request):
+        self.requests.append(("list", dict(request.query)))
+        if self.fail("list"):
+            return web.Response(status=503)
+        token = int(request.query.get("pageToken", 0))
+        size = int(request.query["pageSize"])
+        files = [{"id": "id%d" % i} for i in range(token, min(token + size, 5))]
+        resp = {"files": files}
+        if token + size < 5:
+            resp["nextPageToken"] = str(token + size)
+        return web.json_response(resp)
+
+    async def get_file(self, request):
+        self.requests.append(("get", request.match_info["id"], dict(request.query)))
+        assert request.headers["Authorization"] == "Bearer token"
+        if self.fail("auth"):
+            return web.Response(status=401)
+        if request.match_info["id"] == "missing":
+            return web.json_response({"error": {"code": 404, "message": "not found"}}, status=404)
+        if request.query.get("alt") != "media":
+            return web.json_response({"id": request.match_info["id"], "name": "a name"})
+
+        start = 0
+        m = re.match(r"bytes=(\d+)-", request.headers.get("Range", ""))
+        if m:
+            start = int(m.group(1))
+        resp = web.StreamResponse(status=206 if m else 200)
+        resp.content_length = len(self.content) - start
+        await resp.prepare(request)
+        content = self.content[start:]
+        if self.fail("download"):
+            # send half of the content and drop the connection
+            await resp.write(content[:len(content) // 2])
+            request.transport.close()
+            return resp
+        await resp.write(content)
+        return resp
+
+    async def update_file(self, request):
+        body = await request.json()
+        self.requests.append(("update", request.match_info["id"], dict(request.query), body))
+        return web.json_response({"id": request.match_info["id"], "name": body.get("name")})
+
+    async def start_upload(self, request):
+        self.upload_metadata = await request.json()
+        self.requests.append(("upload", dict(request.query), request.headers["X-Upload-Content-Type"]))
+        return web.Response(status=200, headers={"Location": str(request.url.with_path("/upload/session"))})
+
+    async def upload_chunk(self, request):
+        data = await request.read()
+        content_range = request.headers["Content-Range"]
+        self.requests.append(("put", content_range, len(data)))
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range)
+        if m:
+            assert int(m.group(1)) == len(self.uploaded)
+            if int(m.group(1)) > 0 and self.fail("stall"):
+                # drop the data of a chunk after the first one, and don't tell how many bytes were received
+                return web.Response(status=308)
+            if self.fail("upload"):
+                # keep only a part of the chunk, then fail
+                self.uploaded += data[:len(data) // 2]
+                return web.Response(status=503)
+            self.uploaded += data
+            total = m.group(3)
+        else:
+            if self.fail("status"):
+                return web.Response(status=503)
+            total = content_range.split("/")[1]
+
+        if total != "*" and len(self.uploaded) == int(total):
+            return web.json_response({"id": "new", "name": self.upload_metadata["name"], "size": total})
+
+        headers = {"Range": "bytes=0-%d" % (len(self.uploaded) - 1)} if self.uploaded else {}
+        return web.Response(status=308, headers=headers)
+
+    async def get_values(self, request):
+        self.requests.append(("values", request.match_info["range"]))
+        m = re.match(r"Sheet!A(\d+):B(\d+)", request.match_info["range"])
+        start, end = int(m.group(1)), int(m.group(2))
+        values = [["name", "age"]] + [["n%d" % i, str(i)] for i in range(1, 6)]
+        return web.json_response({"values": values[start - 1:end]})
+
+
+@pytest.fixture(autouse=True)
+def fake_credentials(monkeypatch):
+    credentials = FakeCredentials()
+    monkeypatch.setattr(aio, "get_credentials", lambda _path: credentials)
+    return credentials
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    async def sleep(_):
+        pass
+
+    monkeypatch.setattr(aio.AsyncClient, "_backoff", lambda self, attempt, error=None: sleep(attempt))
+    monkeypatch.setattr(aio.AsyncSheetClient, "_backoff", lambda self, attempt, error=None: sleep(attempt))
+
+
+def run(fake, test, cls=aio.AsyncClient, **kwargs):
+    async def main():
+        server = TestServer(fake.app())
+        await server.start_server()
+        try:
+            async with cls(**kwargs) as client:
+                client.api_url = str(server.make_url("/sheets" if cls is aio.AsyncSheetClient else "/drive"))
+                client.upload_url = str(server.make_url("/upload"))
+                return await test(client)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_get_file():
+    fake = FakeDrive()
+
+    async def test(client):
+        return await asyncio.gather(client.get_file("abc", fields=["id", "name"]),
+                                    client.get_file("missing", raise_if_not_found=False))
+
+    file, missing = run(fake, test)
+    assert isinstance(file, File)
+    assert (file.id, file.name) == ("abc", "a name")
+    assert missing is None
+    assert ("get", "abc", {"fields": "id,name"}) in fake.requests
+
+
+def test_token_refreshed_on_401(fake_credentials):
+    fake = FakeDrive()
+    fake.failures["auth"] = 1
+
+    async def test(client):
+        return await client.get_file("abc")
+
+    assert run(fake, test).id == "abc"
+    assert fake_credentials.calls == 2
+
+
+def test_list_files_pagination():
+    fake = FakeDrive()
+    fake.failures["list"] = 1
+
+    async def test(client):
+        return await client.list_files(parents_in="folder", n=4, fields="id"), \
+            [f.id async for f in client.iter_files(page_size=2)]
+
+    files, ids = run(fake, test)
+    assert [f.id for f in files] == ["id0", "id1", "id2", "id3"]
+    assert ids == ["id0", "id1", "id2", "id3", "id4"]
+
+    first = [r for r in fake.requests if r[0] == "list"][0][1]
+    assert "'folder' in parents" in first["q"]
+    assert first["fields"] == "nextPageToken,files(id)"
+    assert first["pageSize"] == "4"
+
+
+def test_rename_file():
+    fake = FakeDrive()
+
+    async def test(client):
+        return await client.rename_file("abc", "new name"), await client.update_file("abc")
+
+    file, noop = run(fake, test)
+    assert file.name == "new name"
+    assert noop is None
+    assert len(fake.requests) == 1
+
+
+def test_download_resumes():
+    fake = FakeDrive(bytes(range(256)) * 100)
+    fake.failures["download"] = 2
+
+    async def test(client):
+        writer = io.BytesIO()
+        await client.download("abc", writer, chunksize=1000)
+        return writer.getvalue()
+
+    assert run(fake, test) == fake.content
+    ranges = [r for r in fake.requests if r[0] == "get"]
+    assert len(ranges) == 3
+
+
+def test_interleaved_downloads():
+    fake = FakeDrive(bytes(range(256)) * 100)
+
+    async def test(client):
+        async def read_in_turn():
+            streams = {file_id: client.iter_download(file_id, chunksize=1000) for file_id in ("a", "b")}
+            contents = {file_id: b"" for file_id in streams}
+            while streams:
+                for file_id, stream in list(streams.items()):
+                    try:
+                        contents[file_id] += await stream.__anext__()
+                    except StopAsyncIteration:
+                        del streams[file_id]
+            return contents
+
+        return await asyncio.wait_for(read_in_turn(), timeout=5)
+
+    # the first stream doesn't hold the only request slot while the second one waits for it
+    assert run(fake, test, max_concurrency=1) == {"a": fake.content, "b": fake.content}
+
+
+@pytest.mark.parametrize("source", [
+    lambda content: content,
+    lambda content: io.BytesIO(content),
+])
+def test_upload(source):
+    content = b"x" * (aio.UPLOAD_CHUNK_GRANULARITY * 2 + 10)
+    fake = FakeDrive()
+    fake.failures["upload"] = 1
+
+    async def test(client):
+        return await client.upload("parent", "file.txt", source(content), original_mime_type="text/plain",
+                                   chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    file = run(fake, test)
+    assert (file.id, file.name) == ("new", "file.txt")
+    assert bytes(fake.uploaded) == content
+    assert fake.upload_metadata == {"name": "file.txt", "parents": ["parent"]}
+    assert fake.requests[0] == ("upload", {"uploadType": "resumable", "fields": "id,name,kind,mimeType,parents,size"},
+                                "text/plain")
+    puts = [r[1] for r in fake.requests if r[0] == "put"]
+    half = aio.UPLOAD_CHUNK_GRANULARITY // 2
+    assert puts == [
+        "bytes 0-%d/*" % (aio.UPLOAD_CHUNK_GRANULARITY - 1),
+        "bytes */*",
+        "bytes %d-%d/*" % (half, aio.UPLOAD_CHUNK_GRANULARITY - 1),
+        "bytes %d-%d/*" % (aio.UPLOAD_CHUNK_GRANULARITY, aio.UPLOAD_CHUNK_GRANULARITY * 2 - 1),
+        "bytes %d-%d/%d" % (aio.UPLOAD_CHUNK_GRANULARITY * 2, len(content) - 1, len(content)),
+    ]
+
+
+def test_upload_status_query_retried(monkeypatch):
+    content = b"x" * (aio.UPLOAD_CHUNK_GRANULARITY + 10)
+    fake = FakeDrive()
+    fake.failures.update(upload=1, status=2)
+    attempts = []
+
+    async def backoff(self, attempt, error=None):
+        attempts.append(attempt)
+
+    monkeypatch.setattr(aio.AsyncClient, "_backoff", backoff)
+
+    async def test(client):
+        return await client.upload("parent", "file.txt", content, original_mime_type="text/plain",
+                                   chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    assert run(fake, test).id == "new"
+    assert bytes(fake.uploaded) == content
+    assert attempts == [1, 2, 3]
+    puts = [r[1] for r in fake.requests if r[0] == "put"]
+    assert puts[:5] == ["bytes 0-%d/*" % (aio.UPLOAD_CHUNK_GRANULARITY - 1)] + ["bytes */*"] * 3 \
+        + ["bytes %d-%d/*" % (aio.UPLOAD_CHUNK_GRANULARITY // 2, aio.UPLOAD_CHUNK_GRANULARITY - 1)]
+
+
+def test_upload_status_query_gives_up():
+    fake = FakeDrive()
+    fake.failures.update(upload=1, status=10)
+
+    async def test(client):
+        return await client.upload("parent", "file.txt", b"x" * aio.UPLOAD_CHUNK_GRANULARITY * 2,
+                                   original_mime_type="text/plain", chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    with pytest.raises(HttpError):
+        run(fake, test, retries_count=3)
+    assert [r[1] for r in fake.requests if r[0] == "put"].count("bytes */*") == 3
+
+
+def test_upload_no_progress(monkeypatch):
+    content = b"x" * (aio.UPLOAD_CHUNK_GRANULARITY * 2)
+    fake = FakeDrive()
+    fake.failures["stall"] = 2
+    attempts = []
+
+    async def backoff(self, attempt, error=None):
+        attempts.append(attempt)
+
+    monkeypatch.setattr(aio.AsyncClient, "_backoff", backoff)
+
+    async def test(client):
+        return await client.upload("parent", "file.txt", content, original_mime_type="text/plain",
+                                   chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    assert run(fake, test).id == "new"
+    assert bytes(fake.uploaded) == content
+    assert attempts == [1, 2]
+    second_chunk = "bytes %d-%d/%d" % (aio.UPLOAD_CHUNK_GRANULARITY, len(content) - 1, len(content))
+    assert [r[1] for r in fake.requests if r[0] == "put"][1:] == [second_chunk] * 3
+
+
+def test_upload_no_progress_gives_up():
+    fake = FakeDrive()
+    fake.failures["stall"] = 10
+
+    async def test(client):
+        return await client.upload("parent", "file.txt", b"x" * aio.UPLOAD_CHUNK_GRANULARITY * 2,
+                                   original_mime_type="text/plain", chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    with pytest.raises(DriveException):
+        run(fake, test, retries_count=3)
+    assert len([r for r in fake.requests if r[0] == "put"]) == 5
+
+
+def test_upload_async_iterable():
+    fake = FakeDrive()
+
+    async def source():
+        for _ in range(3):
+            yield b"y" * 200_000
+
+    async def test(client):
+        return await client.upload("parent", "file.bin", source(), chunksize=aio.UPLOAD_CHUNK_GRANULARITY)
+
+    run(fake, test)
+    assert bytes(fake.uploaded) == b"y" * 600_000
+    assert [r[2] for r in fake.requests if r[0] == "put"] == [aio.UPLOAD_CHUNK_GRANULARITY,
+                                                             aio.UPLOAD_CHUNK_GRANULARITY,
+                                                             600_000 - 2 * aio.UPLOAD_CHUNK_GRANULARITY]
+
+
+def test_upload_empty():
+    fake = FakeDrive()
+
+    async def test(client):
+        return await client.upload("parent", "empty", b"", original_mime_type="text/plain")
+
+    assert run(fake, test).id == "new"
+    assert [r[1] for r in fake.requests if r[0] == "put"] == ["bytes */0"]
+
+
+def test_upload_chunksize():
+    fake = FakeDrive()
+
+    async def test(client):
+        await client.upload("parent", "file", b"x", chunksize=1000)
+
+    with pytest.raises(ValueError):
+        run(fake, test)
+
+
+def test_sheet_lines_as_dicts():
+    fake = FakeDrive()
+
+    async def test(client):
+        return [d async for d in client.iter_sheet_lines_as_dicts("sheet", "Sheet", "A", "B",
+                                                                  batch_size=2, sleep_for=0)]
+
+    rows = run(fake, test, aio.AsyncSheetClient)
+    assert rows == [{"name": "n%d" % i, "age": str(i)} for i in range(1, 6)]
+    assert fake.requests == [("values", "Sheet!A1:B2"), ("values", "Sheet!A3:B4"), ("values", "Sheet!A5:B6"),
+                             ("values", "Sheet!A7:B8")]
+
+
+def test_missing_aiohttp(monkeypatch):
+    import builtins
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "aiohttp":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+    with pytest.raises(RuntimeError):
+        aio.AsyncClient()
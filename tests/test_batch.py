@@ -0,0 +1,241 @@
+# -*- coding: UTF-8 -*-
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive import batch as drive_batch
+from drive.cache import MetadataCache
+from drive.files import File
+
+
+pytestmark = pytest.mark.usefixtures("no_sleep")
+
+
+class FakeRequest:
+    resumable = None
+
+    def __init__(self, files, method, file_id, kwargs):
+        self.files = files
+        self.method = method
+        self.file_id = file_id
+        self.kwargs = kwargs
+
+    def execute(self):
+        self.files.calls.append((self.method, self.file_id, self.kwargs))
+        errors = self.files.errors.get(self.file_id)
+        if errors:
+            raise errors.pop(0)
+        if self.method == "delete":
+            return ""
+        if self.method == "get":
+            return {"id": self.file_id, "name": "name-" + self.file_id, "parents": ["old-parent"]}
+        if self.method == "update":
+            return {"id": self.file_id, "name": self.kwargs.get("body", {}).get("name")}
+        return {"id": "permission", "role": self.kwargs["body"]["role"]}
+
+
+class FakeFiles:
+    def __init__(self):
+        self.calls = []
+        self.errors = {}
+
+    def get(self, fileId, **kwargs):
+        return FakeRequest(self, "get", fileId, kwargs)
+
+    def delete(self, fileId):
+        return FakeRequest(self, "delete", fileId, {})
+
+    def update(self, fileId, **kwargs):
+        return FakeRequest(self, "update", fileId, kwargs)
+
+    def create(self, fileId, **kwargs):
+        return FakeRequest(self, "create", fileId, kwargs)
+
+
+class FakeBatchRequest:
+    def __init__(self, service):
+        self.service = service
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request, callback))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request, callback in self.requests:
+            try:
+                response = request.execute()
+            except HttpError as e:
+                callback(request_id, None, e)
+            else:
+                callback(request_id, response, None)
+
+
+class FakeService:
+    def __init__(self):
+        self._files = FakeFiles()
+        self.batches = []
+
+    def files(self):
+        return self._files
+
+    def permissions(self):
+        return self._files
+
+    def new_batch_http_request(self):
+        return FakeBatchRequest(self)
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(FakeService(), download_retries_count=3)
+
+
+def test_batch_groups_requests(client):
+    with client.batch(batch_size=40) as batch:
+        results = [batch.remove_file("id%d" % i) for i in range(100)]
+
+    assert client.service.batches == [40, 40, 20]
+    assert all(r.ok for r in results)
+    assert batch.results == results
+    assert len(batch) == 0
+
+
+def test_batch_not_executed_on_error(client):
+    with pytest.raises(ZeroDivisionError):
+        with client.batch() as batch:
+            result = batch.remove_file("xx")
+            1 / 0
+
+    assert client.service.batches == []
+    assert not result.done
+    with pytest.raises(RuntimeError):
+        result.get()
+
+
+def test_batch_results(client):
+    with client.batch() as batch:
+        renamed = batch.rename_file("a", "new name")
+        metadata = batch.get_file_metadata("b", fields=["id", "name"])
+        permission = batch.grant_file_permissions("c", "reader", "anyone")
+        noop = batch.update_file("d")
+
+    assert isinstance(renamed.get(), File)
+    assert renamed.get().name == "new name"
+    assert metadata.get() == {"id": "b", "name": "name-b", "parents": ["old-parent"]}
+    assert permission.get()["role"] == "reader"
+    assert noop.ok and noop.get() is None
+
+    calls = client.service.files().calls
+    assert ("get", "b", {"fields": "id,name"}) in calls
+    assert len(calls) == 3
+
+
+def test_batch_move(client):
+    with client.batch() as batch:
+        moved = [batch.move_file_to_folder("id%d" % i, "new-parent") for i in range(3)]
+
+    assert all(r.ok for r in moved)
+    assert client.service.batches == [3, 3]
+    updates = [c for c in client.service.files().calls if c[0] == "update"]
+    assert updates[0][2]["addParents"] == "new-parent"
+    assert updates[0][2]["removeParents"] == "old-parent"
+
+
+def test_batch_retries_only_failed_requests(client, http_error):
+    client.service.files().errors = {
+        "id1": [http_error(503)],
+        "id2": [http_error(403, "userRateLimitExceeded"), http_error(500)],
+        "id3": [http_error(404)],
+    }
+
+    with client.batch() as batch:
+        results = [batch.remove_file("id%d" % i) for i in range(5)]
+
+    assert client.service.batches == [5, 2, 1]
+    assert [r.ok for r in results] == [True, True, True, False, True]
+    assert results[3].error.status_code == 404
+    with pytest.raises(HttpError):
+        results[3].get()
+
+
+def test_batch_gives_up_after_retries(client, http_error):
+    client.service.files().errors = {"id0": [http_error(503)] * 10}
+
+    with client.batch(retries_count=2) as batch:
+        result = batch.remove_file("id0")
+
+    assert client.service.batches == [1, 1, 1]
+    assert result.done and not result.ok
+
+
+def test_batch_size():
+    with pytest.raises(ValueError):
+        drive_batch.Batch(None, batch_size=101, retries_count=0)
+
+
+def test_hydrate(client, http_error):
+    files = [File({"id": "a"}, client=client), File({"id": "b", "name": "B"}, client=client),
+             File({"id": "c"}, client=client), File({"id": "a"}, client=client)]
+    client.service.files().errors = {"c": [http_error(404)]}
+
+    assert client.hydrate(files) == files
+    assert client.service.batches == [2]
+    assert [f.name for f in files if f.id != "c"] == ["name-a", "B", "name-a"]
+    assert files[0].parents_ids == ["old-parent"]
+
+    # only the file that couldn't be fetched is fetched again
+    client.hydrate(files)
+    assert client.service.batches == [2, 1]
+    assert files[2].name == "name-c"
+
+    client.hydrate(files)
+    assert client.service.batches == [2, 1]
+
+
+def test_hydrate_failure(client, http_error):
+    file = File({"id": "a"}, client=client)
+    client.service.files().errors = {"a": [http_error(503)] * 10}
+
+    client.hydrate([file])
+    assert len(client.service.files().calls) == 4
+
+    # the failure isn't mistaken for a file without name: the name is fetched when it's needed
+    client.service.files().errors = {}
+    assert file.name == "name-a"
+
+
+def test_sorted_parents_single_batch(client):
+    file = File({"id": "xx", "parents": ["p3", "p1", "p2"]}, client=client)
+
+    parents = sorted(file.parents())
+    assert [p.name for p in parents] == ["name-p1", "name-p2", "name-p3"]
+    assert all(p.is_directory for p in parents)
+    assert client.service.batches == [3]
+    assert len(client.service.files().calls) == 3
+
+
+def test_batch_invalidates_cache(client):
+    client.cache = MetadataCache()
+    client.get_file_metadata("a")
+    client.get_file_metadata("b")
+
+    with client.batch() as batch:
+        batch.rename_file("a", "new")
+        batch.get_file_metadata("b")
+
+    client.get_file_metadata("a")
+    client.get_file_metadata("b")
+    gets = [file_id for method, file_id, _ in client.service.files().calls if method == "get"]
+    assert gets == ["a", "b", "b", "a"]
+
+
+def test_batch_takes_a_token_per_call(client):
+    acquired = []
+    client.rate_limiter = type("Limiter", (), {"acquire": lambda self, tokens=1: acquired.append(tokens)})()
+
+    with client.batch() as batch:
+        for file_id in ("a", "b", "c"):
+            batch.remove_file(file_id)
+
+    # the batch request itself takes the last token when it's sent
+    assert acquired == [2]
@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive import cache as drive_cache
+from drive.cache import MemoryBackend, MetadataCache, SqliteBackend
+from drive.exceptions import FileNotFoundException
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+        self.resumable = None
+
+    def execute(self):
+        return self.response
+
+
+class FakeFiles:
+    def __init__(self):
+        self.files = {"f1": {"id": "f1", "name": "a.txt", "parents": ["root"], "mimeType": "text/plain"}}
+        self.calls = []
+
+    def get(self, fileId, **kwargs):
+        self.calls.append(("get", fileId))
+        if fileId not in self.files:
+            raise HttpError(httplib2.Response({"status": 404}), b"not found")
+        return FakeRequest(dict(self.files[fileId]))
+
+    def list(self, q="", **kwargs):
+        self.calls.append(("list", q))
+        return FakeRequest({"files": [dict(f) for f in self.files.values() if "'%s'" % f["name"] in q]})
+
+    def update(self, fileId, body=None, **kwargs):
+        self.calls.append(("update", fileId))
+        self.files[fileId].update(body or {})
+        return FakeRequest(dict(self.files[fileId]))
+
+    def create(self, body, **kwargs):
+        self.calls.append(("create", body["name"]))
+        file_id = "f%d" % (len(self.files) + 1)
+        self.files[file_id] = dict(body, id=file_id)
+        return FakeRequest(dict(self.files[file_id]))
+
+    def delete(self, fileId):
+        self.calls.append(("delete", fileId))
+        del self.files[fileId]
+        return FakeRequest("")
+
+
+class FakeService:
+    def __init__(self):
+        self._files = FakeFiles()
+
+    def files(self):
+        return self._files
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(FakeService(), cache=MetadataCache())
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend(max_size=2, ttl=60)
+    return SqliteBackend(str(tmp_path / "cache.db"), max_size=2, ttl=60)
+
+
+def test_backend_lru(backend, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(drive_cache.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(drive_cache.time, "time", lambda: clock[0])
+
+    backend.set("a", {"id": "a"}, "a")
+    clock[0] += 1
+    backend.set("b", {"id": "b"}, "b")
+    clock[0] += 1
+    assert backend.get("a") == (True, {"id": "a"})
+    clock[0] += 1
+    backend.set("c", None, "")
+
+    assert backend.get("b") == (False, None)
+    assert backend.get("a") == (True, {"id": "a"})
+    assert backend.get("c") == (True, None)
+    assert len(backend) == 2
+
+    backend.delete_tag("a")
+    assert backend.get("a") == (False, None)
+    assert len(backend) == 1
+
+
+def test_backend_ttl(backend, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(drive_cache.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(drive_cache.time, "time", lambda: clock[0])
+
+    backend.set("a", {"id": "a"}, "a")
+    clock[0] += 59
+    assert backend.get("a") == (True, {"id": "a"})
+    clock[0] += 2
+    assert backend.get("a") == (False, None)
+
+
+def test_sqlite_backend_persists(tmp_path):
+    path = str(tmp_path / "cache.db")
+    MetadataCache(path=path).set(("id", "f1", "name"), {"id": "f1", "name": "a"}, "f1")
+
+    cache = MetadataCache(path=path)
+    assert cache.get(("id", "f1", "name")) == (True, {"id": "f1", "name": "a"})
+    assert cache.hits == 1
+
+
+def test_cache_returns_copies():
+    cache = MetadataCache()
+    metadata = {"id": "f1", "parents": ["root"]}
+    cache.set(("id", "f1"), metadata, "f1")
+    metadata["parents"].append("other")
+
+    _, cached = cache.get(("id", "f1"))
+    assert cached == {"id": "f1", "parents": ["root"]}
+    cached["parents"].clear()
+    assert cache.get(("id", "f1"))[1] == {"id": "f1", "parents": ["root"]}
+
+
+def test_get_file_metadata_cached(client):
+    assert client.get_file_metadata("f1")["name"] == "a.txt"
+    assert client.get_file("f1").name == "a.txt"
+    assert client.get_file_metadata("f1", fields=["id"])["id"] == "f1"
+
+    assert client.service.files().calls == [("get", "f1"), ("get", "f1")]
+    assert (client.cache.hits, client.cache.misses) == (1, 2)
+    assert client.cache.hit_rate == pytest.approx(1 / 3)
+
+
+def test_update_invalidates(client):
+    client.get_file("f1")
+    client.rename_file("f1", "b.txt")
+
+    assert client.get_file("f1").name == "b.txt"
+    assert client.service.files().calls.count(("get", "f1")) == 2
+
+
+def test_remove_invalidates(client):
+    client.get_file("f1")
+    client.remove_file("f1")
+
+    assert client.get_file("f1", raise_if_not_found=False) is None
+
+
+def test_name_lookups_cached(client):
+    assert client.get_file_by_name("a.txt").id == "f1"
+    assert client.file_exists(name="a.txt").id == "f1"
+    assert client.file_exists(name="new.txt") is None
+    assert client.file_exists(name="new.txt") is None
+
+    calls = client.service.files().calls
+    assert [c[0] for c in calls] == ["list", "list"]
+
+    # creating a file invalidates the lookups that found nothing
+    client.create_folder("new.txt", "root")
+    assert client.file_exists(name="new.txt").id == "f2"
+    with pytest.raises(FileNotFoundException):
+        client.get_file_by_name("other.txt")
+
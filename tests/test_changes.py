@@ -0,0 +1,162 @@
+# -*- coding: UTF-8 -*-
+import json
+import threading
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive.instrumentation import MemoryCollector
+
+
+pytestmark = pytest.mark.usefixtures("no_sleep")
+
+
+class FakeRequest:
+    """
+    Fake request. ``response`` is either a response or an error, or a list of them that are consumed by successive
+    executions.
+    """
+
+    def __init__(self, method_id, response):
+        self.methodId = method_id
+        self.response = response
+
+    def execute(self):
+        response = self.response
+        if isinstance(response, list):
+            response = response.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakeChanges:
+    """
+    Fake changes resource. ``pages`` maps a page token to its response.
+    """
+
+    def __init__(self, pages, start_token="1"):
+        self.pages = pages
+        self.start_token = start_token
+        self.calls = []
+
+    def getStartPageToken(self):
+        self.calls.append(("getStartPageToken",))
+        return FakeRequest("drive.changes.getStartPageToken", {"startPageToken": self.start_token})
+
+    def list(self, pageToken, pageSize, fields):
+        self.calls.append(("list", pageToken))
+        return FakeRequest("drive.changes.list", self.pages[pageToken])
+
+
+class FakeService:
+    def __init__(self, changes):
+        self._changes = changes
+
+    def changes(self):
+        return self._changes
+
+
+@pytest.fixture
+def make_feed_client(make_client):
+    def make(pages):
+        return make_client(FakeService(FakeChanges(pages)), download_retries_count=2)
+
+    return make
+
+
+def change(file_id, time="2030-01-01T00:00:00.000Z", **file_attrs):
+    if file_attrs.get("removed"):
+        return {"changeType": "file", "fileId": file_id, "removed": True, "time": time}
+    return {"changeType": "file", "fileId": file_id, "time": time,
+            "file": dict({"id": file_id, "name": file_id, "createdTime": "2000-01-01T00:00:00Z"}, **file_attrs)}
+
+
+PAGES = {
+    "1": {"changes": [change("a", createdTime="2030-01-01T00:00:00Z"), change("b")], "nextPageToken": "2"},
+    "2": {"changes": [change("c", trashed=True), change("d", removed=True),
+                      {"changeType": "drive", "driveId": "x", "time": "2030-01-01T00:00:00Z"}],
+          "newStartPageToken": "3"},
+    "3": {"changes": [], "newStartPageToken": "3"},
+}
+
+
+def test_poll(make_feed_client):
+    client = make_feed_client(PAGES)
+    feed = client.changes()
+
+    changes = list(feed.poll())
+    assert [(c.kind, c.file_id) for c in changes] == [("created", "a"), ("modified", "b"), ("trashed", "c"),
+                                                      ("removed", "d")]
+    assert changes[0].file.name == "a"
+    assert changes[3].file is None
+    assert feed.page_token == "3"
+
+    assert list(feed.poll()) == []
+    assert client.service.changes().calls == [("getStartPageToken",), ("list", "1"), ("list", "2"), ("list", "3")]
+
+
+def test_state_persisted(tmp_path, make_feed_client):
+    state_path = str(tmp_path / "changes.json")
+    client = make_feed_client(PAGES)
+
+    feed = client.changes(state_path=state_path)
+    poll = feed.poll()
+    assert next(poll).file_id == "a"
+    assert next(poll).file_id == "b"
+    assert json.loads(open(state_path).read())["page_token"] == "1"
+    # the first page is over once the first change of the second page is consumed
+    assert next(poll).file_id == "c"
+    assert json.loads(open(state_path).read())["page_token"] == "2"
+
+    # a new feed resumes at the saved page, without asking for a start token
+    client = make_feed_client(PAGES)
+    feed = client.changes(state_path=state_path)
+    assert [c.file_id for c in feed.poll()] == ["c", "d"]
+    assert client.service.changes().calls == [("list", "2")]
+    assert json.loads(open(state_path).read())["page_token"] == "3"
+
+
+def test_page_token(make_feed_client):
+    client = make_feed_client(PAGES)
+    assert [c.file_id for c in client.changes(page_token="2").poll()] == ["c", "d"]
+    assert ("getStartPageToken",) not in client.service.changes().calls
+
+
+def test_instrumentation(make_feed_client):
+    error = HttpError(httplib2.Response({"status": 503}), b"{}")
+    client = make_feed_client(dict(PAGES, **{"1": [error, PAGES["1"]]}))
+    client.instrumentation = metrics = MemoryCollector()
+
+    assert len(list(client.changes().poll())) == 4
+    summary = metrics.summary()
+    assert summary["drive.changes.getStartPageToken"]["count"] == 1
+    assert summary["drive.changes.list"]["count"] == 2
+    assert summary["drive.changes.list"]["retries"] == 1
+
+
+def test_watch_backoff(make_feed_client):
+    error = HttpError(httplib2.Response({"status": 503}), b"{}")
+    pages = {
+        "1": [{"changes": [], "newStartPageToken": "1"}] * 3
+        + [error] * 3
+        + [{"changes": [change("a")], "newStartPageToken": "1"}, {"changes": [], "newStartPageToken": "1"}],
+    }
+    client = make_feed_client(pages)
+    stop = threading.Event()
+    delays = []
+
+    class FakeEvent:
+        def is_set(self):
+            return stop.is_set()
+
+        def wait(self, delay):
+            delays.append(delay)
+            if len(delays) == 6:
+                stop.set()
+
+    feed = client.changes()
+    assert [c.file_id for c in feed.watch(interval=10, max_interval=30, stop=FakeEvent())] == ["a"]
+    # 3 empty polls, 1 failed poll (after 2 retries), 1 poll with a change, 1 empty poll
+    assert delays == [10, 20, 30, 30, 10, 10]
@@ -0,0 +1,391 @@
+# -*- coding: UTF-8 -*-
+import io
+import os
+import re
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from drive import client as drive_client
+from drive.files import EXTRA_FILE_FIELDS, FILE_FIELDS
+from drive.instrumentation import MemoryCollector
+from drive.pool import HttpPool
+
+
+pytestmark = pytest.mark.usefixtures("no_sleep")
+
+
+class FakeMediaHttp:
+    """
+    Fake ``httplib2.Http`` serving a binary content and honoring HTTP Range headers.
+    """
+
+    def __init__(self, content, *, failures=()):
+        self.content = content
+        self.ranges = []
+        self.calls = 0
+        # calls (0-based) that fail with a transport error
+        self.failures = set(failures)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        call = self.calls
+        self.calls += 1
+        if call in self.failures:
+            raise httplib2.HttpLib2Error("connection reset")
+
+        m = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if not m:
+            return httplib2.Response({"status": 200, "content-length": str(len(self.content))}), self.content
+
+        start, end = int(m.group(1)), int(m.group(2))
+        self.ranges.append((start, end))
+        content = self.content[start:end + 1]
+        if not content:
+            return httplib2.Response({"status": 416, "content-range": "bytes */%d" % len(self.content)}), b""
+
+        end = start + len(content) - 1
+        return httplib2.Response({
+            "status": 206,
+            "content-range": "bytes %d-%d/%d" % (start, end, len(self.content)),
+        }), content
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+        self.resumable = None
+
+    def execute(self):
+        return self.response
+
+
+class FakeFiles:
+    def __init__(self, http, listing=()):
+        self.http = http
+        self.listing = list(listing)
+        self.list_calls = []
+
+    def list(self, pageSize=100, pageToken=None, **kwargs):
+        self.list_calls.append(dict(kwargs, pageSize=pageSize, pageToken=pageToken))
+        start = int(pageToken or 0)
+        resp = {"files": self.listing[start:start + pageSize]}
+        if start + pageSize < len(self.listing):
+            resp["nextPageToken"] = str(start + pageSize)
+        return FakeRequest(resp)
+
+    def get(self, fileId, **kwargs):
+        return FakeRequest({"id": fileId, "size": str(len(self.http.content))})
+
+    def get_media(self, fileId):
+        return HttpRequest(self.http, None, "https://example.com/files/%s?alt=media" % fileId)
+
+    def export_media(self, fileId, mimeType):
+        return HttpRequest(self.http, None, "https://example.com/files/%s/export" % fileId)
+
+
+class FakeService:
+    def __init__(self, http, listing=()):
+        self._files = FakeFiles(http, listing)
+
+    def files(self):
+        return self._files
+
+
+def test_download_in_chunks(make_client):
+    content = bytes(range(256)) * 40
+    http = FakeMediaHttp(content)
+    client = make_client(FakeService(http))
+
+    buff = io.BytesIO()
+    client.download("xx", buff, chunksize=1000)
+
+    assert buff.getvalue() == content
+    assert len(http.ranges) == 11
+    assert http.ranges[0] == (0, 999)
+    assert http.ranges[-1] == (10000, 10999)
+
+
+def test_iter_download(make_client):
+    content = bytes(range(256)) * 40
+    http = FakeMediaHttp(content, failures={3})
+    client = make_client(FakeService(http))
+
+    chunks = client.iter_download("xx", chunksize=1000)
+    assert next(chunks) == content[:1000]
+    assert len(http.ranges) == 1
+    assert b"".join(chunks) == content[1000:]
+
+
+def test_download_progress(make_client):
+    content = bytes(range(256)) * 40
+    client = make_client(FakeService(FakeMediaHttp(content, failures={1})))
+    events = []
+
+    client.download("xx", io.BytesIO(), chunksize=4000, progress=events.append)
+
+    assert [(e.bytes_transferred, e.total_bytes, e.retries, e.done) for e in events] == [
+        (4000, 10240, 0, False),
+        (4000, 10240, 1, False),
+        (8000, 10240, 1, False),
+        (10240, 10240, 1, False),
+        (10240, 10240, 1, True),
+    ]
+
+
+def test_client_download_instrumentation(make_client):
+    content = bytes(range(256)) * 40
+    client = make_client(FakeService(FakeMediaHttp(content, failures={1})))
+    client.instrumentation = MemoryCollector()
+    client.download("xx", io.BytesIO(), chunksize=4000)
+
+    stats = client.instrumentation.summary()["unknown"]
+    assert stats["count"] == 3
+    assert stats["retries"] == 1
+    assert stats["bytes"] == len(content)
+
+
+def test_download_empty_file(make_client):
+    client = make_client(FakeService(FakeMediaHttp(b"")))
+
+    buff = io.BytesIO()
+    client.download("xx", buff, chunksize=1000)
+    assert buff.getvalue() == b""
+
+
+def test_download_export_without_range_support(make_client):
+    content = b"a,b,c\n1,2,3\n"
+    client = make_client(FakeService(FakeMediaHttp(content)))
+
+    buff = io.BytesIO()
+    client.download("xx", buff, mime_type="text/csv", chunksize=4)
+    assert buff.getvalue() == content
+
+
+def test_download_retries_failed_chunk(make_client):
+    content = b"x" * 2500
+    http = FakeMediaHttp(content, failures={1, 2})
+    client = make_client(FakeService(http))
+
+    buff = io.BytesIO()
+    client.download("xx", buff, chunksize=1000)
+
+    assert buff.getvalue() == content
+    # the second chunk was requested three times; the first one only once
+    assert http.ranges == [(0, 999), (1000, 1999), (2000, 2999)]
+    assert http.calls == 5
+
+
+def test_download_gives_up_after_too_many_retries(make_client):
+    http = FakeMediaHttp(b"x" * 2500, failures=range(1, 100))
+    client = make_client(FakeService(http), download_retries_count=2)
+
+    with pytest.raises(httplib2.HttpLib2Error):
+        client.download("xx", io.BytesIO(), chunksize=1000)
+
+    assert http.calls == 4
+
+
+def test_download_does_not_retry_client_errors(make_client):
+    class ForbiddenHttp(FakeMediaHttp):
+        def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+            self.calls += 1
+            return httplib2.Response({"status": 404}), b"Not Found"
+
+    http = ForbiddenHttp(b"")
+    client = make_client(FakeService(http))
+
+    with pytest.raises(HttpError):
+        client.download("xx", io.BytesIO())
+    assert http.calls == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "pwrite"), reason="os.pwrite is not available")
+@pytest.mark.parametrize("size", [2500, 3000, 3001])
+def test_download_file_parallel(tmp_path, size, make_client):
+    content = os.urandom(size)
+    http = FakeMediaHttp(content, failures={2})
+    client = make_client(FakeService(http))
+    client._http_pool = HttpPool(lambda: http, max_size=3)
+
+    path = tmp_path / "file.bin"
+    client.download_file("xx", str(path), chunksize=1000, parallelism=3)
+
+    assert path.read_bytes() == content
+    assert sorted(http.ranges) == [(start, min(start + 1000, size) - 1) for start in range(0, size, 1000)]
+    assert 1 <= client._http_pool.size <= 3
+
+
+def test_download_file_parallel_small_file(tmp_path, make_client):
+    content = b"hello"
+    http = FakeMediaHttp(content)
+    client = make_client(FakeService(http))
+
+    path = tmp_path / "file.bin"
+    client.download_file("xx", str(path), parallelism=4)
+    assert path.read_bytes() == content
+    assert http.ranges == [(0, drive_client.CHUNKSIZE - 1)]
+
+
+def make_listing(n):
+    return [{"id": "id%d" % i, "name": "file%d" % i} for i in range(n)]
+
+
+def test_iter_files_follows_pages(make_client):
+    client = make_client(FakeService(None, make_listing(25)))
+
+    files = client.iter_files(parents_in="dir", page_size=10)
+    assert client.service.files().list_calls == []  # lazy
+
+    assert [f.id for f in files] == ["id%d" % i for i in range(25)]
+    calls = client.service.files().list_calls
+    assert [c["pageToken"] for c in calls] == [None, "10", "20"]
+    assert calls[0]["q"] == "trashed = false and 'dir' in parents"
+
+
+def test_iter_files_limit(make_client):
+    client = make_client(FakeService(None, make_listing(25)))
+
+    assert len(list(client.iter_files(limit=12, page_size=10))) == 12
+    assert [c["pageSize"] for c in client.service.files().list_calls] == [10, 2]
+
+
+def test_list_files(make_client):
+    client = make_client(FakeService(None, make_listing(2500)))
+
+    assert len(client.list_files()) == 100
+    assert len(client.list_files(n=1)) == 1
+    assert len(client.list_files(n=None)) == 2500
+    assert client.service.files().list_calls[-1]["pageSize"] == drive_client.MAX_PAGE_SIZE
+
+
+def test_make_fields_mask():
+    assert drive_client._make_fields_mask("id,name") == "id,name"
+    assert drive_client._make_fields_mask(("id", "name")) == "id,name"
+    assert drive_client._make_fields_mask(FILE_FIELDS) == "id,name,kind,mimeType,parents,size"
+
+
+def test_iter_files_fields(make_client):
+    client = make_client(FakeService(None, make_listing(1)))
+
+    list(client.iter_files())
+    list(client.iter_files(fields=FILE_FIELDS + EXTRA_FILE_FIELDS))
+    list(client.iter_files(fields="id"))
+
+    assert [c["fields"] for c in client.service.files().list_calls] == [
+        "nextPageToken,files(id,name,kind,mimeType,parents,size)",
+        "nextPageToken,files(id,name,kind,mimeType,parents,size,modifiedTime,md5Checksum)",
+        "nextPageToken,files(id)",
+    ]
+
+
+class FakeTreeFiles:
+    """
+    Fake files resource serving a tree of files. ``tree`` maps a folder ID to the IDs of its children; folder IDs start
+    with "d".
+    """
+
+    def __init__(self, tree, max_page_size=100):
+        self.max_page_size = max_page_size
+        self.parents = {}
+        for parent_id, children in tree.items():
+            for child_id in children:
+                self.parents.setdefault(child_id, []).append(parent_id)
+        self.queries = []
+
+    def list(self, q, pageSize=100, pageToken=None, **kwargs):
+        self.queries.append((q, pageToken))
+        folder_ids = re.findall(r"'(\w+)' in parents", q)
+        files = [{"id": file_id, "parents": parents,
+                  "mimeType": "application/vnd.google-apps.folder" if file_id.startswith("d") else "text/plain"}
+                 for file_id, parents in sorted(self.parents.items())
+                 if any(parent_id in folder_ids for parent_id in parents)]
+        pageSize = min(pageSize, self.max_page_size)
+        start = int(pageToken or 0)
+        resp = {"files": files[start:start + pageSize]}
+        if start + pageSize < len(files):
+            resp["nextPageToken"] = str(start + pageSize)
+        return FakeRequest(resp)
+
+
+def make_tree_service(tree, **kwargs):
+    service = FakeService(None)
+    service._files = FakeTreeFiles(tree, **kwargs)
+    return service
+
+
+TREE = {
+    "droot": ["d1", "d2", "f1"],
+    "d1": ["d11", "f11", "f12"],
+    "d2": ["f21", "d11"],
+    "d11": ["f111", "d111"],
+    "d111": ["f1111"],
+}
+
+
+def walk_ids(walk):
+    return {folder.id: (sorted(f.id for f in folders), sorted(f.id for f in files)) for folder, folders, files in walk}
+
+
+def test_walk(make_client):
+    client = make_client(make_tree_service(TREE))
+
+    walked = walk_ids(client.walk("droot", parallelism=2, folders_per_query=2))
+    assert walked == {
+        "droot": (["d1", "d2"], ["f1"]),
+        "d1": (["d11"], ["f11", "f12"]),
+        "d2": (["d11"], ["f21"]),
+        "d11": (["d111"], ["f111"]),
+        "d111": ([], ["f1111"]),
+    }
+
+    queries = client.service.files().queries
+    assert queries[0] == ("('droot' in parents) and trashed = false", None)
+    assert ("('d1' in parents or 'd2' in parents) and trashed = false", None) in queries
+    assert len(queries) == 4
+
+
+def test_walk_parents_before_children(make_client):
+    client = make_client(make_tree_service(TREE))
+
+    order = [folder.id for folder, _, _ in client.walk("droot", parallelism=3, folders_per_query=1)]
+    assert order[0] == "droot"
+    assert order.index("d1") < order.index("d11") < order.index("d111")
+
+
+def test_walk_max_depth(make_client):
+    client = make_client(make_tree_service(TREE))
+
+    assert walk_ids(client.walk("droot", max_depth=0)) == {"droot": (["d1", "d2"], ["f1"])}
+    assert set(walk_ids(client.walk("droot", max_depth=1))) == {"droot", "d1", "d2"}
+
+
+def test_walk_pruning(make_client):
+    client = make_client(make_tree_service(TREE))
+
+    walked = []
+    for folder, folders, _ in client.walk("droot"):
+        walked.append(folder.id)
+        folders[:] = [f for f in folders if f.id != "d1"]
+
+    assert sorted(walked) == ["d11", "d111", "d2", "droot"]
+
+
+def test_walk_follows_pages(make_client):
+    tree = {"droot": ["f%03d" % i for i in range(25)]}
+    client = make_client(make_tree_service(tree, max_page_size=10))
+
+    ((_, folders, files),) = client.walk("droot")
+    assert folders == []
+    assert len(files) == 25
+    assert len(client.service.files().queries) == 3
+
+
+def test_walk_stops_early(make_client):
+    client = make_client(make_tree_service(TREE))
+
+    walk = client.walk("droot", parallelism=1, folders_per_query=1)
+    assert next(walk)[0].id == "droot"
+    walk.close()
+    assert len(client.service.files().queries) == 1
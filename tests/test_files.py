@@ -1,5 +1,6 @@
 # -*- coding: UTF-8 -*-
 import io
+from datetime import datetime, timezone
 
 import pytest
 
@@ -13,6 +14,26 @@ def test_name():
     assert file.name == name
 
 
+def test_extra_fields():
+    file = File({"id": "xx", "name": "foo", "size": "42", "modifiedTime": "2025-03-27T10:11:12.345Z",
+                 "md5Checksum": "acbd18db4cc2f85cedef654fccc4a4d8"})
+    assert file.size == 42
+    assert file.modified_time == datetime(2025, 3, 27, 10, 11, 12, 345000, tzinfo=timezone.utc)
+    assert file.md5_checksum == "acbd18db4cc2f85cedef654fccc4a4d8"
+
+    assert File({"id": "xx"}).modified_time is None
+
+
+def test_copy():
+    file = File({"id": "xx", "name": "foo", "kind": "drive#file", "mimeType": mimetypes.JSON, "parents": ["p"],
+                 "size": "42", "modifiedTime": "2025-03-27T10:11:12.345Z", "md5Checksum": "abc"})
+    copy = File(file)
+    assert copy.to_dict() == file.to_dict()
+    assert copy.parents_ids == ["p"]
+    assert copy.mimetype == mimetypes.JSON
+    assert copy.modified_time == file.modified_time
+
+
 def test_is_directory():
     assert File({"id": "xx"}).is_directory is None
     assert not File({"id": "xx", "mimeType": "something"}).is_directory
@@ -0,0 +1,103 @@
+# -*- coding: UTF-8 -*-
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive.instrumentation import MemoryCollector, OpenTelemetryInstrumentation, PrometheusInstrumentation, \
+    RequestEvent, observe
+from drive.retry import RetryPolicy
+
+
+pytestmark = pytest.mark.usefixtures("no_sleep")
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+    def __call__(self):
+        if self.errors:
+            raise self.errors.pop(0)
+        return b"abc"
+
+
+def test_request_event_outcome(http_error):
+    assert RequestEvent("m", 1).outcome == "ok"
+    assert RequestEvent("m", 1, error=http_error(404)).outcome == "404"
+    assert RequestEvent("m", 1, error=httplib2.HttpLib2Error()).outcome == "HttpLib2Error"
+
+
+def test_observe(http_error):
+    collector = MemoryCollector()
+    policy = RetryPolicy(max_retries=2)
+
+    assert observe(collector, "m", policy, Flaky(http_error(503)), bytes_of=len) == b"abc"
+    with pytest.raises(HttpError):
+        observe(collector, "m", policy, Flaky(http_error(500), http_error(404)))
+    assert observe(None, "m", policy, Flaky()) == b"abc"
+
+    stats = collector.summary()["m"]
+    assert stats["count"] == 2
+    assert stats["errors"] == 1
+    assert stats["retries"] == 2
+    assert stats["bytes"] == 3
+    assert stats["outcomes"] == {"ok": 1, "404": 1}
+
+
+def test_memory_collector_percentiles():
+    collector = MemoryCollector(max_samples=100)
+    for i in range(1, 201):
+        collector.on_request(RequestEvent("m", i / 100))
+
+    stats = collector.summary()["m"]
+    assert stats["count"] == 200
+    assert stats["max"] == 2
+    # only the last 100 durations are kept
+    assert stats["p50"] == 1.5
+    assert stats["p99"] == 1.99
+
+    collector.reset()
+    assert collector.summary() == {}
+
+
+class FakeInstrument:
+    def __init__(self):
+        self.values = []
+
+    def record(self, value, attributes):
+        self.values.append((value, attributes))
+
+    add = record
+
+
+class FakeMeter:
+    def __init__(self):
+        self.instruments = {}
+
+    def create_histogram(self, name, **kwargs):
+        return self.instruments.setdefault(name, FakeInstrument())
+
+    create_counter = create_histogram
+
+
+def test_opentelemetry_instrumentation():
+    meter = FakeMeter()
+    instrumentation = OpenTelemetryInstrumentation(meter)
+    instrumentation.on_request(RequestEvent("drive.files.get", 0.5, retries=2, bytes_transferred=10))
+
+    assert meter.instruments["drive.request.duration"].values == [
+        (0.5, {"method": "drive.files.get", "outcome": "ok"}),
+    ]
+    assert meter.instruments["drive.request.retries"].values == [(2, {"method": "drive.files.get"})]
+    assert meter.instruments["drive.transferred_bytes"].values == [(10, {"method": "drive.files.get"})]
+
+
+def test_prometheus_instrumentation():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    instrumentation = PrometheusInstrumentation(registry=registry)
+    instrumentation.on_request(RequestEvent("drive.files.get", 0.5, retries=2))
+
+    labels = {"method": "drive.files.get", "outcome": "ok"}
+    assert registry.get_sample_value("drive_request_duration_seconds_count", labels) == 1
+    assert registry.get_sample_value("drive_request_retries_total", {"method": "drive.files.get"}) == 2
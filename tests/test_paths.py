@@ -0,0 +1,122 @@
+# -*- coding: UTF-8 -*-
+import re
+
+import pytest
+
+from drive import mimetypes
+from drive.exceptions import FileNotFoundException
+from drive.files import File
+from drive.paths import split_path
+
+FOLDER = mimetypes.GOOGLE_DRIVE_FOLDER
+
+
+class FakeRequest:
+    resumable = None
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeFiles:
+    def __init__(self, files):
+        self.files = files
+        self.listed = []
+
+    def list(self, q, **kwargs):
+        folder_id = re.search(r"'([^']+)' in parents", q).group(1)
+        self.listed.append(folder_id)
+        return FakeRequest({"files": [dict(f) for f in self.files if folder_id in f["parents"]]})
+
+    def create(self, body, **kwargs):
+        attrs = dict(body, id="new%d" % len(self.files))
+        self.files.append(attrs)
+        return FakeRequest(attrs)
+
+    def update(self, fileId, body=None, **kwargs):
+        attrs = [f for f in self.files if f["id"] == fileId][0]
+        attrs.update(body or {})
+        return FakeRequest(dict(attrs))
+
+
+class FakeService:
+    def __init__(self, files):
+        self._files = FakeFiles(files)
+
+    def files(self):
+        return self._files
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(FakeService([
+        {"id": "reports", "name": "Reports", "mimeType": FOLDER, "parents": ["root"]},
+        {"id": "2026", "name": "2026", "mimeType": FOLDER, "parents": ["reports"]},
+        {"id": "q3", "name": "Q3", "mimeType": FOLDER, "parents": ["2026"]},
+        {"id": "q4", "name": "Q4", "mimeType": FOLDER, "parents": ["2026"]},
+        {"id": "summary3", "name": "summary.xlsx", "mimeType": "text/plain", "parents": ["q3"]},
+        {"id": "summary4", "name": "summary.xlsx", "mimeType": "text/plain", "parents": ["q4"]},
+        {"id": "readme", "name": "README", "mimeType": "text/plain", "parents": ["root"]},
+    ]))
+
+
+def test_split_path():
+    assert split_path("/a//b/") == ["a", "b"]
+    assert split_path("") == []
+
+
+def test_get_by_path(client):
+    assert client.get_by_path("Reports/2026/Q3/summary.xlsx").id == "summary3"
+    assert client.get_by_path("Reports/2026/Q4/summary.xlsx").id == "summary4"
+
+    # the listings of Reports and 2026 are shared by both paths
+    assert client.service.files().listed == ["root", "reports", "2026", "q3", "q4"]
+
+
+def test_get_by_path_not_found(client):
+    assert client.get_by_path("Reports/nope", raise_if_not_found=False) is None
+    # a file is not a folder
+    assert client.get_by_path("README/x", raise_if_not_found=False) is None
+    with pytest.raises(FileNotFoundException):
+        client.get_by_path("Reports/2026/Q1")
+
+
+def test_get_by_path_root(client):
+    assert client.get_by_path("/").id == "root"
+    assert client.get_by_path("Q3/summary.xlsx", root="2026").id == "summary3"
+
+
+def test_get_by_paths(client):
+    paths = ["Reports/2026/Q3/summary.xlsx", "Reports/2026/Q4/summary.xlsx", "Reports/2026/Q1/x", "README"]
+    files = client.get_by_paths(paths)
+
+    assert {path: f.id if f else None for path, f in files.items()} == {
+        "Reports/2026/Q3/summary.xlsx": "summary3",
+        "Reports/2026/Q4/summary.xlsx": "summary4",
+        "Reports/2026/Q1/x": None,
+        "README": "readme",
+    }
+    listed = client.service.files().listed
+    assert sorted(listed) == ["2026", "q3", "q4", "reports", "root"]
+
+
+def test_truediv(client):
+    reports = File({"id": "reports", "name": "Reports", "mimeType": FOLDER}, client=client)
+    assert (reports / "2026" / "Q3/summary.xlsx").id == "summary3"
+    with pytest.raises(FileNotFoundException):
+        reports / "nope"
+
+
+def test_mutations_invalidate(client):
+    assert client.get_by_path("Reports/new", raise_if_not_found=False) is None
+    client.create_folder("new", "reports")
+    assert client.get_by_path("Reports/new").mimetype == FOLDER
+
+    client.rename_file("readme", "README.md")
+    assert client.get_by_path("README", raise_if_not_found=False) is None
+    assert client.get_by_path("README.md").id == "readme"
+
+    assert client.service.files().listed == ["root", "reports", "reports", "root"]
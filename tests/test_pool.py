@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from googleapiclient.discovery import build
+
+from drive.pool import HttpPool
+
+
+class FakeHttp:
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.in_use = False
+        self.requests = 0
+
+    def request(self, uri, method="GET", **kwargs):
+        assert not self.in_use, "Http object used by two threads at once"
+        self.in_use = True
+        with FakeHttp.lock:
+            FakeHttp.active += 1
+            FakeHttp.max_active = max(FakeHttp.max_active, FakeHttp.active)
+        time.sleep(0.001)
+        with FakeHttp.lock:
+            FakeHttp.active -= 1
+        self.requests += 1
+        self.in_use = False
+        return {"status": 200}, uri.encode("utf-8")
+
+
+def test_pool_reuses_connections():
+    created = []
+    pool = HttpPool(lambda: created.append(FakeHttp()) or created[-1], max_size=3)
+
+    for i in range(5):
+        assert pool.request("/%d" % i) == ({"status": 200}, b"/%d" % i)
+
+    assert pool.size == 1
+    assert created[0].requests == 5
+
+
+def test_pool_concurrent_requests():
+    created = []
+    pool = HttpPool(lambda: created.append(FakeHttp()) or created[-1], max_size=4)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(lambda i: pool.request("/%d" % i), range(200)))
+
+    assert [content for _, content in responses] == [b"/%d" % i for i in range(200)]
+    assert 1 <= pool.size <= 4
+    assert len(created) == pool.size
+    assert FakeHttp.max_active <= 4
+    assert sum(http.requests for http in created) == 200
+
+
+def test_pool_factory_error():
+    def factory():
+        raise RuntimeError("no credentials")
+
+    pool = HttpPool(factory, max_size=1)
+    with pytest.raises(RuntimeError):
+        pool.request("/")
+    assert pool.size == 0
+    # the slot was released
+    with pytest.raises(RuntimeError):
+        pool.request("/")
+
+
+def test_pool_max_size():
+    with pytest.raises(ValueError):
+        HttpPool(FakeHttp, max_size=0)
+
+
+class ClosableHttp(FakeHttp):
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_close():
+    created = []
+    pool = HttpPool(lambda: created.append(ClosableHttp()) or created[-1], max_size=3)
+    service = build("drive", "v3", http=pool)
+
+    with pool.connection():
+        pool.request("/")
+    assert pool.size == 2
+
+    service.close()
+    assert [http.closed for http in created] == [True, True]
+    assert pool.size == 0
+
+    # the pool can still be used after being closed
+    with service:
+        assert pool.request("/") == ({"status": 200}, b"/")
+    assert [http.closed for http in created] == [True, True, True]
+    assert pool.size == 0
@@ -0,0 +1,57 @@
+# -*- coding: UTF-8 -*-
+import logging
+
+from drive.progress import ProgressTracker, TransferProgress, log_progress
+
+
+def test_transfer_progress():
+    progress = TransferProgress("download", "x", bytes_transferred=250, total_bytes=1000, elapsed=2)
+    assert progress.rate == 125
+    assert progress.fraction == 0.25
+    assert progress.eta == 6
+
+    progress = TransferProgress("upload", "x", bytes_transferred=250)
+    assert progress.rate == 0
+    assert progress.fraction is None
+    assert progress.eta is None
+
+    progress = TransferProgress("upload", "x", bytes_transferred=250, total_bytes=250, elapsed=1, done=True)
+    assert progress.fraction == 1
+    assert progress.eta == 0
+
+
+def test_progress_tracker():
+    events = []
+    tracker = ProgressTracker(events.append, "download", "x", total_bytes=100)
+    tracker.add(40)
+    tracker.retry(1, IOError())
+    tracker.update(90)
+    tracker.finish()
+
+    assert [(e.bytes_transferred, e.retries, e.done) for e in events] == [
+        (40, 0, False),
+        (40, 1, False),
+        (90, 1, False),
+        (90, 1, True),
+    ]
+    assert all(e.total_bytes == 100 and e.direction == "download" for e in events)
+
+
+def test_progress_tracker_unknown_size():
+    events = []
+    tracker = ProgressTracker(events.append, "upload")
+    tracker.update(10)
+    tracker.finish()
+    assert events[0].total_bytes is None
+    assert events[1].total_bytes == 10
+
+
+def test_log_progress(caplog):
+    with caplog.at_level(logging.INFO, logger="drive.progress"):
+        log_progress(TransferProgress("download", "x", bytes_transferred=500, total_bytes=1000, elapsed=1))
+        log_progress(TransferProgress("upload", "y", bytes_transferred=10, elapsed=1, done=True))
+
+    assert caplog.messages == [
+        "Download x: 50%, 500 bytes (0.5 kB/s, ETA 1s)",
+        "Upload y: done, 10 bytes (0.0 kB/s)",
+    ]
@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+import json
+
+import pytest
+
+from drive import ratelimit
+from drive.pool import HttpPool
+from drive.ratelimit import FileTokenBucket, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [100.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(ratelimit.time, "time", lambda: clock[0])
+    monkeypatch.setattr(ratelimit.time, "sleep", sleep)
+    return clock, sleeps
+
+
+def test_token_bucket(clock):
+    clock, sleeps = clock
+
+    bucket = TokenBucket(2, capacity=3)
+    # burst
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    # then 2 per second
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock[0] += 10
+    # the bucket doesn't fill past its capacity
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0, pytest.approx(0.5)]
+    assert sum(sleeps) == pytest.approx(1.5)
+
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_from_quota():
+    bucket = TokenBucket.from_quota(1000)
+    assert (bucket.rate, bucket.capacity) == (10, 10)
+
+    bucket = TokenBucket.from_quota(50, burst=5)
+    assert (bucket.rate, bucket.capacity) == (0.5, 5)
+
+
+def test_file_token_bucket(clock, tmp_path):
+    clock, sleeps = clock
+    path = str(tmp_path / "quota.json")
+
+    # e.g. two processes
+    a = FileTokenBucket.from_quota(100, burst=2, path=path)
+    b = FileTokenBucket.from_quota(100, burst=2, path=path)
+    assert isinstance(a, FileTokenBucket)
+
+    assert a.acquire() == 0
+    assert b.acquire() == 0
+    assert a.acquire() == pytest.approx(1)
+    # one token was added while a was waiting
+    assert b.acquire(2) == pytest.approx(2)
+    assert sleeps == [pytest.approx(1), pytest.approx(2)]
+
+    with open(path) as f:
+        assert json.load(f)["tokens"] == pytest.approx(-2)
+
+
+def test_file_token_bucket_corrupt_state(clock, tmp_path):
+    path = tmp_path / "quota.json"
+    path.write_text("{")
+
+    assert FileTokenBucket(1, capacity=1, path=str(path)).acquire() == 0
+
+
+def test_pool_rate_limiter():
+    class Limiter:
+        acquired = 0
+
+        def acquire(self, tokens=1):
+            self.acquired += tokens
+
+    class FakeHttp:
+        def request(self, uri, **kwargs):
+            return {"status": 200}, b""
+
+    limiter = Limiter()
+    pool = HttpPool(FakeHttp, rate_limiter=limiter)
+    for _ in range(3):
+        pool.request("/")
+
+    assert limiter.acquired == 3
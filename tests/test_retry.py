@@ -0,0 +1,186 @@
+# -*- coding: UTF-8 -*-
+import json
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from drive import retry as drive_retry
+from drive.retry import RetryPolicy, backoff_delay, is_retryable, retry_after
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(drive_retry.time, "sleep", sleeps.append)
+    return sleeps
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.mark.parametrize("status, reason, expected", [
+    (500, None, True),
+    (503, None, True),
+    (429, None, True),
+    (403, "rateLimitExceeded", True),
+    (403, "userRateLimitExceeded", True),
+    (403, "forbidden", False),
+    (404, None, False),
+])
+def test_is_retryable_http_errors(http_error, status, reason, expected):
+    assert is_retryable(http_error(status, reason)) is expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    (httplib2.HttpLib2Error("connection reset"), True),
+    (ConnectionResetError(), True),
+    (ValueError(), False),
+])
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_is_retryable_errors_and_details():
+    # when the body has both lists, HttpError.error_details only returns "details"
+    content = {"error": {"code": 403, "message": "Rate limit exceeded",
+                         "errors": [{"reason": "userRateLimitExceeded", "domain": "usageLimits"}],
+                         "details": [{"@type": "type.googleapis.com/google.rpc.ErrorInfo", "reason": "RATE_LIMIT"}]}}
+    error = HttpError(httplib2.Response({"status": 403}), json.dumps(content).encode("utf-8"))
+    assert is_retryable(error)
+
+    content["error"]["errors"] = [{"reason": "forbidden"}]
+    content["error"]["details"][0]["reason"] = "rateLimitExceeded"
+    assert is_retryable(HttpError(httplib2.Response({"status": 403}), json.dumps(content).encode("utf-8")))
+
+    content["error"]["details"][0]["reason"] = "ACCESS_DENIED"
+    assert not is_retryable(HttpError(httplib2.Response({"status": 403}), json.dumps(content).encode("utf-8")))
+    assert not is_retryable(HttpError(httplib2.Response({"status": 403}), b"not json"))
+
+
+def test_retry_after(http_error):
+    assert retry_after(http_error(429, headers={"Retry-After": "12"})) == 12
+    assert retry_after(http_error(429)) is None
+    assert retry_after(ValueError()) is None
+
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after(http_error(503, headers={"Retry-After": date})) <= 30
+
+
+def test_backoff_delay(http_error):
+    for attempt in range(1, 10):
+        assert 0 <= backoff_delay(attempt, base_delay=1, max_delay=8) <= min(8, 2 ** (attempt - 1))
+
+    assert backoff_delay(1, http_error(429, headers={"Retry-After": "20"})) >= 20
+
+
+def test_call_retries(sleeps, http_error):
+    policy = RetryPolicy(max_retries=3)
+    fn = Flaky(http_error(503), http_error(429, headers={"Retry-After": "5"}))
+
+    assert policy.call(fn) == "ok"
+    assert fn.calls == 3
+    assert len(sleeps) == 2 and sleeps[1] >= 5
+    assert policy.metrics.as_dict() == {
+        "calls": 1,
+        "retries": 2,
+        "failures": 0,
+        "budget_exhausted": 0,
+        "wait_time": sum(sleeps),
+        "errors": {"503": 1, "429": 1},
+    }
+
+
+def test_call_gives_up(sleeps, http_error):
+    policy = RetryPolicy(max_retries=2)
+
+    fn = Flaky(*[http_error(500)] * 5)
+    with pytest.raises(HttpError):
+        policy.call(fn)
+    assert fn.calls == 3
+
+    fn = Flaky(http_error(500), http_error(500))
+    with pytest.raises(HttpError):
+        policy.call(fn, max_retries=1)
+    assert fn.calls == 2
+
+    fn = Flaky(http_error(404))
+    with pytest.raises(HttpError):
+        policy.call(fn)
+    assert fn.calls == 1
+    assert policy.metrics.failures == 3
+
+
+def test_retry_budget(sleeps, http_error):
+    policy = RetryPolicy(max_retries=5, budget=3, budget_ratio=0.5)
+
+    fn = Flaky(*[http_error(503)] * 10)
+    with pytest.raises(HttpError):
+        policy.call(fn)
+    # the budget started with 3 retries, and the call added half a retry
+    assert fn.calls == 4
+    assert policy.metrics.budget_exhausted == 1
+
+    # each call adds half a retry to the budget
+    assert policy.call(Flaky()) == "ok"
+    fn = Flaky(http_error(503))
+    assert policy.call(fn) == "ok"
+    assert fn.calls == 2
+
+    fn = Flaky(http_error(503))
+    with pytest.raises(HttpError):
+        policy.call(fn)
+    assert fn.calls == 1
+
+
+def test_retry_budget_without_call(http_error):
+    policy = RetryPolicy(budget=1, budget_ratio=0.5)
+
+    assert policy.allow_retry(http_error(503))
+    assert not policy.allow_retry(http_error(503))
+    assert not policy.allow_retry(http_error(404))
+
+    policy.start_call()
+    policy.start_call()
+    assert policy.allow_retry(http_error(503))
+    assert policy.metrics.calls == 2
+    assert policy.metrics.retries == 2
+    assert policy.metrics.budget_exhausted == 1
+
+
+def test_nested_calls_are_not_retried(sleeps, http_error):
+    policy = RetryPolicy(max_retries=2)
+    inner = Flaky(*[http_error(503)] * 10)
+
+    with pytest.raises(HttpError):
+        policy.call(lambda: policy.call(inner))
+    assert inner.calls == 3
+
+
+def test_nested_calls_retried_on_demand(sleeps, http_error):
+    policy = RetryPolicy(max_retries=2)
+    inner = Flaky(http_error(503))
+    outer_calls = []
+
+    def outer():
+        outer_calls.append(1)
+        result = policy.call(inner, retry_nested=True)
+        # the outer call is still the one that retries the other nested calls
+        policy.call(Flaky(http_error(503)))
+        return result
+
+    with pytest.raises(HttpError):
+        policy.call(outer, max_retries=0)
+    assert inner.calls == 2
+    assert len(outer_calls) == 1
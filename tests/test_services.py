@@ -0,0 +1,19 @@
+# -*- coding: UTF-8 -*-
+import httplib2
+
+from drive import services
+
+
+def test_build_service_caches_document():
+    services._documents.pop(("drive", "v3"), None)
+
+    service1 = services.build_service("drive", "v3", httplib2.Http())
+    assert ("drive", "v3") in services._documents
+    document = services._documents[("drive", "v3")]
+
+    service2 = services.build_service("drive", "v3", httplib2.Http())
+    assert services._documents[("drive", "v3")] is document
+    assert service1 is not service2
+
+    req = service2.files().get(fileId="xx", fields="id,name")
+    assert req.uri.startswith("https://www.googleapis.com/drive/v3/files/xx?")
@@ -1,6 +1,10 @@
+import re
+import threading
+
 import pytest
 
 from drive import sheets
+from drive.retry import RetryPolicy
 
 
 @pytest.mark.parametrize("expected, lines", [
@@ -54,3 +58,215 @@ def test_sheet_lines_as_dicts_custom_restkey_restval(expected, lines):
     if lines:
         assert list(sheets.sheet_lines_as_dicts(lines[1:], fieldnames=lines[0],
                                                 restkey="k", restval="no")) == expected
+
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakeValues:
+    def __init__(self, rows):
+        self.rows = rows
+        self.columns = {}
+        self.requests = []
+        self.threads = set()
+        self.second_request = threading.Event()
+
+    def batchGet(self, spreadsheetId, ranges, majorDimension="ROWS", valueRenderOption="FORMATTED_VALUE"):
+        self.requests.append(ranges)
+        self.threads.add(threading.current_thread().name)
+        if len(self.requests) == 2:
+            self.second_request.set()
+        value_ranges = []
+        for cell_range in ranges:
+            if majorDimension == "COLUMNS":
+                column, first = re.fullmatch(r"Tab!([A-Z]+)(\d+):[A-Z]+", cell_range).groups()
+                values = self.columns.get(column, [])[int(first) - 1:]
+                value_ranges.append({"range": cell_range, "values": [values]} if values else {"range": cell_range})
+                continue
+            first, last = map(int, re.fullmatch(r"Tab!A(\d+):C(\d+)", cell_range).groups())
+            values = self.rows[first - 1:last]
+            value_ranges.append({"range": cell_range, "values": values} if values else {"range": cell_range})
+        return FakeRequest({"valueRanges": value_ranges})
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.requests.append(("batchUpdate", body))
+        return FakeRequest({})
+
+    def update(self, spreadsheetId, range, valueInputOption, body):
+        self.requests.append(("update", range, body))
+        return FakeRequest({})
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        self.requests.append(("append", range, body))
+        return FakeRequest({})
+
+
+class FakeSpreadsheets:
+    def __init__(self, rows):
+        self._values = FakeValues(rows)
+
+    def values(self):
+        return self._values
+
+
+def make_sheet_client(rows):
+    client = sheets.SheetClient.__new__(sheets.SheetClient)
+    client.service = FakeSpreadsheets(rows)
+    client.retry_policy = RetryPolicy()
+    client.instrumentation = None
+    return client
+
+
+@pytest.mark.parametrize("n_rows", [0, 3, 8, 23, 24])
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_sheet_lines(n_rows, prefetch):
+    rows = [[str(i), "b", "c"] for i in range(1, n_rows + 1)]
+    client = make_sheet_client(rows)
+
+    lines = list(client.iter_sheet_lines("id", "Tab", "A", "C", batch_size=4, ranges_per_request=3,
+                                         prefetch=prefetch))
+    assert lines == rows
+
+    requests = client.service.values().requests
+    assert requests[0] == ["Tab!A1:C4", "Tab!A5:C8", "Tab!A9:C12"]
+    assert len(requests) == n_rows // 12 + 1
+
+
+def test_iter_sheet_lines_offset():
+    rows = [[str(i)] for i in range(1, 11)]
+    client = make_sheet_client(rows)
+
+    assert list(client.iter_sheet_lines("id", "Tab", "A", "C", offset=5, batch_size=2)) == rows[5:]
+
+
+def test_iter_sheet_lines_prefetches_in_background():
+    client = make_sheet_client([[str(i)] for i in range(1, 31)])
+    lines = client.iter_sheet_lines("id", "Tab", "A", "C", batch_size=5, ranges_per_request=2)
+
+    next(lines)
+    values = client.service.values()
+    # the second request is sent before the first lines are consumed
+    assert values.second_request.wait(5)
+    assert threading.current_thread().name not in values.threads
+    assert len(list(lines)) == 29
+
+
+
+def test_write_rows():
+    client = make_sheet_client([])
+
+    def rows():
+        for i in range(11):
+            yield (i, "x")
+
+    assert client.write_rows("id", "Tab", rows(), start_cell="b2", batch_size=2, ranges_per_request=3) == 11
+
+    requests = client.service.values().requests
+    assert [[d["range"] for d in body["data"]] for _, body in requests] == [
+        ["Tab!B2", "Tab!B4", "Tab!B6"],
+        ["Tab!B8", "Tab!B10", "Tab!B12"],
+    ]
+    assert requests[0][1]["data"][0]["values"] == [[0, "x"], [1, "x"]]
+    assert requests[1][1]["data"][2]["values"] == [[10, "x"]]
+
+
+def test_write_rows_is_lazy():
+    client = make_sheet_client([])
+    consumed = []
+
+    def rows():
+        for i in range(10):
+            consumed.append(i)
+            yield [i]
+            # the first request is sent before the rest of the rows are generated
+            if i == 3:
+                assert len(client.service.values().requests) == 1
+
+    client.write_rows("id", "Tab", rows(), batch_size=2, ranges_per_request=2)
+    assert len(consumed) == 10
+
+
+def test_write_rows_invalid_cell():
+    with pytest.raises(ValueError):
+        make_sheet_client([]).write_rows("id", "Tab", [[1]], start_cell="A0")
+
+
+def test_append_rows():
+    client = make_sheet_client([])
+    assert client.append_rows("id", "Tab", ([i] for i in range(5)), batch_size=2) == 5
+    assert client.append_rows("id", "Tab", [], cell_range="A:C") == 0
+
+    assert client.service.values().requests == [
+        ("append", "Tab", {"values": [[0], [1]]}),
+        ("append", "Tab", {"values": [[2], [3]]}),
+        ("append", "Tab", {"values": [[4]]}),
+    ]
+
+
+def test_update_sheet_range():
+    client = make_sheet_client([])
+    client.update_sheet_range("id", "Tab", "A1:B2", [("a", "b"), (1, 2)])
+    assert client.service.values().requests == [("update", "Tab!A1:B2", {"values": [["a", "b"], [1, 2]]})]
+
+
+@pytest.mark.parametrize("column, index", [("A", 1), ("z", 26), ("AA", 27), ("AZ", 52), ("BA", 53), ("XFD", 16384)])
+def test_column_index(column, index):
+    assert sheets._column_index(column) == index
+    assert sheets._column_letters(index) == column.upper()
+
+
+def make_table_client():
+    client = make_sheet_client([])
+    client.service.values().columns = {
+        "A": ["id", 1, 2, 3],
+        "B": ["name", "a", "", "c"],
+        "C": ["score", 1.5],
+        "D": ["empty"],
+    }
+    return client
+
+
+def test_iter_sheet_columns():
+    client = make_table_client()
+    columns = list(client.iter_sheet_columns("id", "Tab", "A", "E", first_line=2, columns_per_request=2))
+
+    assert columns == [[1, 2, 3], ["a", "", "c"], [1.5], [], []]
+    assert client.service.values().requests == [["Tab!A2:A", "Tab!B2:B"], ["Tab!C2:C", "Tab!D2:D"], ["Tab!E2:E"]]
+
+
+def test_read_sheet_table():
+    client = make_table_client()
+    assert client.read_sheet_table("id", "Tab", "A", "D") == {
+        "id": [1, 2, 3],
+        "name": ["a", None, "c"],
+        "score": [1.5, None, None],
+        "empty": [None, None, None],
+    }
+    assert client.read_sheet_table("id", "Tab", "A", "B", first_line=3, fieldnames=["x", "y"], restval="?") == {
+        "x": [2, 3],
+        "y": ["?", "c"],
+    }
+    with pytest.raises(ValueError):
+        client.read_sheet_table("id", "Tab", "A", "D", output="nope")
+
+
+def test_read_sheet_table_numpy():
+    numpy = pytest.importorskip("numpy")
+    table = make_table_client().read_sheet_table("id", "Tab", "A", "D", output="numpy")
+
+    assert table["id"].dtype == float and table["id"].tolist() == [1, 2, 3]
+    assert table["name"].dtype == object
+    assert numpy.isnan(table["score"][1])
+
+
+def test_read_sheet_table_pandas():
+    pytest.importorskip("pandas")
+    df = make_table_client().read_sheet_table("id", "Tab", "A", "D", output="pandas")
+
+    assert list(df.columns) == ["id", "name", "score", "empty"]
+    assert df["id"].tolist() == [1, 2, 3]
@@ -0,0 +1,148 @@
+# -*- coding: UTF-8 -*-
+import gzip
+import io
+import json
+
+import openpyxl
+
+import pytest
+
+from drive import mimetypes, streams
+from drive.client import Client
+from drive.files import File
+from drive.streams import ChunksReader, iter_csv_rows, iter_json_array, iter_json_lines, open_stream
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class FakeClient(Client):
+    # noinspection PyMissingConstructor
+    def __init__(self, content):
+        self.content = content
+        self.chunks_read = 0
+
+    def iter_download(self, file_id, mime_type=None, *, chunksize=None):
+        for chunk in split(self.content, 4):
+            self.chunks_read += 1
+            yield chunk
+
+    def download(self, file_id, writer, mime_type=None, *, chunksize=None):
+        writer.write(self.content)
+
+
+@pytest.fixture(autouse=True)
+def small_reads(monkeypatch):
+    monkeypatch.setattr(streams, "READ_SIZE", 3)
+
+
+def test_chunks_reader():
+    reader = ChunksReader([b"ab", b"", b"cde", b"f"])
+    assert reader.read(4) == b"ab"
+    assert reader.read() == b"cdef"
+    assert reader.read() == b""
+
+
+@pytest.mark.parametrize("decompress, compress", [(None, False), (None, True), (True, True), (False, False)])
+def test_open_stream(decompress, compress):
+    content = b"hello\nworld\n" * 10
+    data = gzip.compress(content) if compress else content
+    assert open_stream(split(data, 5), decompress=decompress).read() == content
+
+
+def test_iter_json_lines():
+    stream = open_stream([b'{"a": 1}\n\n{"b"', b': [2]}\n"\xc3', b'\xa9"'])
+    assert list(iter_json_lines(stream)) == [{"a": 1}, {"b": [2]}, "é"]
+
+
+@pytest.mark.parametrize("items", [
+    [],
+    [1],
+    [12345, -6.5e10, True, None, "a string", "é", {"a": [1, {"b": "c"}]}, [], {}],
+    [123456789, 987654321],
+])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_array(items, indent):
+    data = json.dumps(items, indent=indent, ensure_ascii=False).encode("utf-8")
+    assert list(iter_json_array(open_stream(split(data, 2)))) == items
+
+
+@pytest.mark.parametrize("data", [b"", b"{}", b"[1 2]", b"[1,", b"[1] 2", b'["a'])
+def test_iter_json_array_invalid(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array(open_stream([data])))
+
+
+def test_file_jsons_is_lazy():
+    lines = [{"i": i} for i in range(100)]
+    client = FakeClient(b"".join(json.dumps(line).encode("utf-8") + b"\n" for line in lines))
+    records = File({"id": "x"}, client=client).jsons()
+
+    assert next(records) == {"i": 0}
+    assert client.chunks_read < 10
+    assert list(records) == lines[1:]
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_file_jsons_gzip(use_orjson):
+    pytest.importorskip("orjson")
+    content = gzip.compress(b'{"a": 1}\n{"b": 2}\n')
+    file = File({"id": "x"}, client=FakeClient(content))
+    assert list(file.jsons(use_orjson=use_orjson)) == [{"a": 1}, {"b": 2}]
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_file_json(use_orjson):
+    pytest.importorskip("orjson")
+    file = File({"id": "x"}, client=FakeClient(b'{"a": [1, 2, 3]}'))
+    assert file.json(use_orjson=use_orjson) == {"a": [1, 2, 3]}
+
+
+def test_file_iter_json_array():
+    items = [{"i": i, "s": "x" * i} for i in range(50)]
+    client = FakeClient(gzip.compress(json.dumps(items).encode("utf-8")))
+    array = File({"id": "x"}, client=client).iter_json_array()
+
+    assert next(array) == items[0]
+    assert list(array) == items[1:]
+
+
+def test_iter_csv_rows():
+    stream = open_stream([b'a,b\r\n1,"x', b'\ny"\r\n\xc3', b'\xa9,\r\n'])
+    assert list(iter_csv_rows(stream)) == [("a", "b"), ("1", "x\ny"), ("é", "")]
+
+
+def test_file_iter_rows_csv():
+    client = FakeClient(b"".join(b"%d,row %d\r\n" % (i, i) for i in range(100)))
+    rows = File({"id": "x"}, client=client).iter_rows()
+
+    assert next(rows) == ("0", "row 0")
+    assert client.chunks_read < 10
+    assert len(list(rows)) == 99
+
+    client = FakeClient(b"id,name\r\n1,a\r\n2,b,c\r\n")
+    assert list(File({"id": "x"}, client=client).iter_rows(as_dicts=True, restkey="rest")) == [
+        {"id": "1", "name": "a"},
+        {"id": "2", "name": "b", "rest": ["c"]},
+    ]
+
+
+def test_file_iter_rows_xlsx():
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["first"])
+    tab = workbook.create_sheet("Data")
+    tab.append(["id", "name"])
+    tab.append([1, "a"])
+    buff = io.BytesIO()
+    workbook.save(buff)
+    file = File({"id": "x"}, client=FakeClient(buff.getvalue()))
+
+    assert list(file.iter_rows("Data")) == [("id", "name"), (1, "a")]
+    assert list(file.iter_rows("Data", as_dicts=True)) == [{"id": 1, "name": "a"}]
+    assert list(file.iter_rows(mime_type=mimetypes.XLSX)) == [("first",)]
+
+    with pytest.raises(KeyError):
+        list(file.iter_rows("Nope"))
+    with pytest.raises(ValueError):
+        file.iter_rows("Data", mime_type=mimetypes.CSV)
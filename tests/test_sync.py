@@ -0,0 +1,225 @@
+# -*- coding: UTF-8 -*-
+import hashlib
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from drive import mimetypes
+from drive.files import File
+from drive.sync import Sync
+
+
+def md5(content):
+    return hashlib.md5(content).hexdigest()
+
+
+class FakeClient:
+    """
+    In-memory client implementing the methods used by ``Sync``.
+    """
+
+    def __init__(self):
+        self.files = {"root": {"id": "root", "name": "root", "mimeType": mimetypes.GOOGLE_DRIVE_FOLDER}}
+        self.contents = {}
+        self.calls = []
+
+    def add(self, name, parent_id, content=None, modified="2020-01-01T00:00:00Z"):
+        file_id = "id%d" % len(self.files)
+        attrs = {"id": file_id, "name": name, "parents": [parent_id], "modifiedTime": modified}
+        if content is None:
+            attrs["mimeType"] = mimetypes.GOOGLE_DRIVE_FOLDER
+        else:
+            attrs.update(mimeType="text/plain", size=str(len(content)), md5Checksum=md5(content))
+            self.contents[file_id] = content
+        self.files[file_id] = attrs
+        return File(attrs)
+
+    def walk(self, top, fields=None):
+        pending = [top]
+        while pending:
+            folder_id = pending.pop(0)
+            children = [File(f) for f in self.files.values() if f.get("parents") == [folder_id]]
+            folders = [f for f in children if f.is_directory]
+            yield File(self.files[folder_id]), folders, [f for f in children if not f.is_directory]
+            pending.extend(f.id for f in folders)
+
+    def create_folder(self, name, parent_id):
+        self.calls.append(("create_folder", name))
+        return self.add(name, parent_id)
+
+    def upload_file(self, parent_id, path):
+        self.calls.append(("upload", os.path.basename(path)))
+        with open(path, "rb") as f:
+            return self.add(os.path.basename(path), parent_id, f.read())
+
+    def _make_media(self, reader):
+        return reader.read()
+
+    def update_file(self, file_id, media):
+        self.calls.append(("update", self.files[file_id]["name"]))
+        self.contents[file_id] = media
+        self.files[file_id].update(size=str(len(media)), md5Checksum=md5(media))
+        return File({"id": file_id, "name": self.files[file_id]["name"]})
+
+    def download_file(self, file_id, path):
+        self.calls.append(("download", self.files[file_id]["name"]))
+        with open(path, "wb") as f:
+            f.write(self.contents[file_id])
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    root = tmp_path / "local"
+    (root / "sub").mkdir(parents=True)
+    (root / "same.txt").write_bytes(b"same")
+    (root / "changed.txt").write_bytes(b"local version")
+    (root / "sub" / "new.txt").write_bytes(b"new")
+    return root
+
+
+@pytest.fixture
+def remote(client):
+    client.add("same.txt", "root", b"same")
+    client.add("changed.txt", "root", b"remote version")
+    docs = client.add("docs", "root")
+    client.add("remote.txt", docs.id, b"remote only")
+    # Google Docs have no checksum
+    client.files["gdoc"] = {"id": "gdoc", "name": "doc", "mimeType": mimetypes.GOOGLE_SHEETS, "parents": ["root"]}
+
+
+def plan_summary(plan):
+    return [(a.action, a.path) for a in plan]
+
+
+def test_plan_upload(client, local_dir, remote):
+    plan = Sync(client, str(local_dir), "root").run("upload", dry_run=True)
+
+    assert plan_summary(plan) == [("upload", "changed.txt"), ("upload", "sub/new.txt")]
+    assert [path for path, _ in plan.unchanged] == ["same.txt"]
+    assert client.calls == []
+
+
+def test_plan_download(client, local_dir, remote):
+    plan = Sync(client, str(local_dir), "root").plan("download")
+    assert plan_summary(plan) == [("download", "changed.txt"), ("download", "docs/remote.txt")]
+
+
+def test_plan_direction(client, local_dir):
+    with pytest.raises(ValueError):
+        Sync(client, str(local_dir), "root").plan("sideways")
+
+
+def test_upload(client, local_dir, remote):
+    sync = Sync(client, str(local_dir), "root")
+    assert sync.execute(sync.plan("upload")) == []
+
+    assert sorted(client.calls) == [("create_folder", "sub"), ("update", "changed.txt"), ("upload", "new.txt")]
+    assert sync.plan("upload").actions == []
+
+
+def test_download(client, local_dir, remote):
+    sync = Sync(client, str(local_dir), "root")
+    sync.run("download")
+
+    assert (local_dir / "changed.txt").read_bytes() == b"remote version"
+    assert (local_dir / "docs" / "remote.txt").read_bytes() == b"remote only"
+    mtime = datetime.fromtimestamp(os.stat(local_dir / "docs" / "remote.txt").st_mtime, timezone.utc)
+    assert mtime == datetime(2020, 1, 1, tzinfo=timezone.utc)
+    assert not os.path.exists(local_dir / "docs" / "remote.txt.part")
+    assert sync.plan("download").actions == []
+
+
+def test_both_without_state(client, local_dir, remote):
+    plan = Sync(client, str(local_dir), "root").plan("both")
+
+    # the local file is more recent than the remote one
+    assert plan_summary(plan) == [("upload", "changed.txt"), ("download", "docs/remote.txt"),
+                                  ("upload", "sub/new.txt")]
+
+
+def test_both_with_state(client, local_dir, remote, tmp_path):
+    state_path = str(tmp_path / "state.db")
+    with Sync(client, str(local_dir), "root", state_path=state_path) as sync:
+        sync.run("upload")
+
+    changed = [f for f in client.files.values() if f["name"] == "changed.txt"][0]
+    assert client.contents[changed["id"]] == b"local version"
+
+    # remote change only: download it
+    client.update_file(changed["id"], b"remote change")
+    with Sync(client, str(local_dir), "root", state_path=state_path) as sync:
+        plan = sync.plan("both")
+        assert plan_summary(plan) == [("download", "changed.txt"), ("download", "docs/remote.txt")]
+        sync.execute(plan)
+    assert (local_dir / "changed.txt").read_bytes() == b"remote change"
+
+    # changes on both sides: conflict
+    client.update_file(changed["id"], b"remote change 2")
+    (local_dir / "changed.txt").write_bytes(b"local change 2")
+    with Sync(client, str(local_dir), "root", state_path=state_path) as sync:
+        plan = sync.plan("both")
+        assert plan_summary(plan) == [("conflict", "changed.txt")]
+        assert plan.transfers == []
+        sync.execute(plan)
+    assert (local_dir / "changed.txt").read_bytes() == b"local change 2"
+
+
+def test_state_skips_hashing(client, local_dir, remote, tmp_path, monkeypatch):
+    from drive import sync as drive_sync
+
+    state_path = str(tmp_path / "state.db")
+    Sync(client, str(local_dir), "root", state_path=state_path).run("upload")
+
+    hashed = []
+    original_md5 = drive_sync._md5
+
+    def fake_md5(path):
+        hashed.append(os.path.basename(path))
+        return original_md5(path)
+
+    monkeypatch.setattr(drive_sync, "_md5", fake_md5)
+    (local_dir / "same.txt").write_bytes(b"SAME")
+
+    plan = Sync(client, str(local_dir), "root", state_path=state_path).plan("upload")
+    assert plan_summary(plan) == [("upload", "same.txt")]
+    assert hashed == ["same.txt"]
+
+
+def test_failed_transfer(client, local_dir, remote):
+    def fail(*args):
+        raise IOError("nope")
+
+    client.upload_file = fail
+    sync = Sync(client, str(local_dir), "root")
+    plan = sync.plan("upload")
+    failed = sync.execute(plan)
+
+    assert [a.path for a in failed] == ["sub/new.txt"]
+    assert isinstance(failed[0].error, IOError)
+    assert [a.done for a in plan] == [True, False]
+
+
+def test_failed_download_removes_temporary_file(client, local_dir, remote):
+    def fail(file_id, path):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+        raise IOError("connection lost")
+
+    client.download_file = fail
+    sync = Sync(client, str(local_dir), "root")
+    failed = sync.execute(sync.plan("download"))
+
+    assert [a.path for a in failed] == ["changed.txt", "docs/remote.txt"]
+    assert os.listdir(local_dir / "docs") == []
+    assert not os.path.exists(local_dir / "changed.txt.part")
+
+    # a leftover temporary file, e.g. from a killed process, is not uploaded
+    (local_dir / "docs" / "remote.txt.part").write_bytes(b"partial")
+    assert plan_summary(sync.plan("upload")) == [("upload", "changed.txt"), ("upload", "sub/new.txt")]
+    assert ("upload", "docs/remote.txt.part") not in plan_summary(sync.plan("both"))
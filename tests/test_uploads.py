@@ -0,0 +1,347 @@
+# -*- coding: UTF-8 -*-
+import io
+import json
+import os
+import re
+import threading
+
+import httplib2
+import pytest
+
+from drive import client as drive_client
+from drive.exceptions import UploadTreeError
+from drive.instrumentation import MemoryCollector
+from drive.services import build_service
+from drive.uploads import UploadStateStore, upload_state_key
+
+CHUNKSIZE = 256 * 1024
+SESSION_URI = "https://upload.example.com/session"
+
+
+pytestmark = pytest.mark.usefixtures("no_sleep")
+
+
+class Crash(BaseException):
+    pass
+
+
+class FakeUploadHttp:
+    """
+    Fake ``httplib2.Http`` implementing the resumable upload protocol.
+    """
+
+    def __init__(self, *, failures=(), crash_at=None):
+        self.received = bytearray()
+        self.requests = []
+        self.sessions = 0
+        self.expired = False
+        # chunk PUTs (0-based) that fail with a transport error, and the one that makes the process crash
+        self.failures = set(failures)
+        self.crash_at = crash_at
+        self.chunks = 0
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if method == "GET":
+            # listing of the existing files
+            return httplib2.Response({"status": 200, "content-type": "application/json"}), b'{"files": []}'
+        if method == "POST":
+            self.requests.append(("POST", re.search(r"uploadType=(\w+)", uri).group(1)))
+            if "uploadType=multipart" in uri:
+                return self.done()
+            self.sessions += 1
+            self.expired = False
+            self.received = bytearray()
+            return httplib2.Response({"status": 200, "location": SESSION_URI}), b""
+
+        content_range = headers["content-range"]
+        self.requests.append(("PUT", content_range))
+        if self.expired:
+            return httplib2.Response({"status": 404}), b"{}"
+
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+)", content_range)
+        if m:
+            chunk = self.chunks
+            self.chunks += 1
+            if chunk == self.crash_at:
+                raise Crash()
+            if chunk in self.failures:
+                raise httplib2.HttpLib2Error("connection reset")
+            assert int(m.group(1)) == len(self.received)
+            data = body.read() if hasattr(body, "read") else body
+            self.received += data
+            total = int(m.group(3))
+        else:
+            total = int(content_range.split("/")[1])
+
+        if len(self.received) == total:
+            return self.done()
+        return httplib2.Response({"status": 308, "range": "bytes=0-%d" % (len(self.received) - 1)}), b""
+
+    def done(self):
+        content = json.dumps({"id": "new", "name": "file.bin", "size": str(len(self.received))}).encode("utf-8")
+        return httplib2.Response({"status": 200, "content-type": "application/json"}), content
+
+
+@pytest.fixture
+def make_upload_client(make_client):
+    def make(http, *, upload_state_dir=None):
+        return make_client(build_service("drive", "v3", http=http), chunksize=CHUNKSIZE, resumable_threshold=CHUNKSIZE,
+                           upload_states=UploadStateStore(upload_state_dir) if upload_state_dir else None)
+
+    return make
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(bytes(range(256)) * (CHUNKSIZE * 3 // 256 + 10))
+    return path
+
+
+def test_small_file_not_resumable(tmp_path, make_upload_client):
+    http = FakeUploadHttp()
+    path = tmp_path / "small.txt"
+    path.write_bytes(b"hello")
+
+    file = make_upload_client(http).upload_file("parent", str(path), original_mime_type="text/plain")
+    assert file.id == "new"
+    assert http.requests == [("POST", "multipart")]
+
+
+def test_large_file_resumable(local_file, make_upload_client):
+    http = FakeUploadHttp(failures={1})
+
+    file = make_upload_client(http).upload_file("parent", str(local_file), original_mime_type="text/plain")
+    assert file.id == "new"
+    assert bytes(http.received) == local_file.read_bytes()
+    assert http.sessions == 1
+    # the failed chunk is retried after asking the server where the upload stopped
+    assert [r[1] for r in http.requests[2:5]] == ["bytes %d-%d/%d" % (CHUNKSIZE, 2 * CHUNKSIZE - 1, len(http.received)),
+                                                  "bytes */%d" % len(http.received),
+                                                  "bytes %d-%d/%d" % (CHUNKSIZE, 2 * CHUNKSIZE - 1,
+                                                                      len(http.received))]
+
+
+def test_upload_progress(local_file, make_upload_client):
+    http = FakeUploadHttp()
+    client = make_upload_client(http)
+    events = []
+    client.progress_callback = events.append
+
+    client.upload_file("parent", str(local_file), original_mime_type="text/plain")
+
+    size = len(http.received)
+    assert [(e.bytes_transferred, e.done) for e in events] == [
+        (CHUNKSIZE, False),
+        (2 * CHUNKSIZE, False),
+        (3 * CHUNKSIZE, False),
+        (size, False),
+        (size, True),
+    ]
+    assert all(e.direction == "upload" and e.name == "file.bin" and e.total_bytes == size for e in events)
+
+
+def test_client_upload_instrumentation(tmp_path, make_upload_client):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"x" * (CHUNKSIZE * 2 + 10))
+    client = make_upload_client(FakeUploadHttp(failures={1}))
+    client.instrumentation = MemoryCollector()
+    client.upload_file("parent", str(path), original_mime_type="text/plain")
+
+    stats = client.instrumentation.summary()["drive.files.create"]
+    assert stats["count"] == 3
+    assert stats["retries"] == 1
+    assert stats["bytes"] == CHUNKSIZE * 2 + 10
+
+
+def test_upload_tree_retries_chunks(local_file, monkeypatch, make_upload_client):
+    monkeypatch.setattr(drive_client, "guess_original_mime_type", lambda _reader: "text/plain")
+    http = FakeUploadHttp(failures={1})
+
+    manifest = make_upload_client(http).upload_tree(str(local_file.parent), "parent")
+
+    assert manifest[str(local_file)].id == "new"
+    assert bytes(http.received) == local_file.read_bytes()
+    # the failed chunk is retried within the upload instead of restarting it
+    assert http.sessions == 1
+    assert len([r for r in http.requests if r[0] == "PUT"]) == 6
+
+
+def test_resume_after_crash(local_file, tmp_path, make_upload_client):
+    state_dir = tmp_path / "state"
+    http = FakeUploadHttp(crash_at=2)
+
+    with pytest.raises(Crash):
+        make_upload_client(http, upload_state_dir=str(state_dir)).upload_file("parent", str(local_file),
+                                                                       original_mime_type="text/plain")
+
+    (state_file,) = state_dir.iterdir()
+    assert json.loads(state_file.read_text()) == {"uri": SESSION_URI, "offset": 2 * CHUNKSIZE}
+
+    http.requests = []
+    file = make_upload_client(http, upload_state_dir=str(state_dir)).upload_file("parent", str(local_file),
+                                                                          original_mime_type="text/plain")
+    assert file.id == "new"
+    assert bytes(http.received) == local_file.read_bytes()
+    assert http.sessions == 1
+    assert http.requests[0] == ("PUT", "bytes */%d" % len(http.received))
+    assert list(state_dir.iterdir()) == []
+
+
+def test_resume_expired_session(local_file, tmp_path, make_upload_client):
+    http = FakeUploadHttp()
+    client = make_upload_client(http, upload_state_dir=str(tmp_path / "state"))
+    with open(local_file, "rb") as f:
+        key = upload_state_key(f, "parent", "file.bin", None)
+    client.upload_states.save(key, {"uri": SESSION_URI, "offset": CHUNKSIZE})
+    http.expired = True
+
+    file = client.upload_file("parent", str(local_file), original_mime_type="text/plain")
+    assert file.id == "new"
+    assert http.sessions == 1
+    assert bytes(http.received) == local_file.read_bytes()
+
+
+def test_upload_state_key(local_file):
+    with open(local_file, "rb") as f:
+        key = upload_state_key(f, "parent", "name", None)
+        assert key == upload_state_key(f, "parent", "name", None)
+        assert key != upload_state_key(f, "parent", "other name", None)
+
+    local_file.write_bytes(b"changed")
+    with open(local_file, "rb") as f:
+        assert key != upload_state_key(f, "parent", "name", None)
+
+    assert upload_state_key(io.BytesIO(b"x"), "parent", "name", None) is None
+
+
+def test_upload_state_store(tmp_path):
+    store = UploadStateStore(str(tmp_path / "a" / "b"))
+    assert store.load("key") is None
+    store.save("key", {"uri": "u", "offset": 3})
+    assert store.load("key") == {"uri": "u", "offset": 3}
+    store.remove("key")
+    store.remove("key")
+    assert store.load("key") is None
+
+
+class FakeTreeRequest:
+    resumable = None
+
+    def __init__(self, execute):
+        self.execute = execute
+
+
+class FakeTreeFiles:
+    """
+    Fake files resource storing files in memory.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.calls = []
+        # name -> errors to raise when creating a file with this name
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, parent_id, mime_type="text/plain"):
+        with self.lock:
+            file_id = "id%d" % len(self.files)
+            self.files[file_id] = {"id": file_id, "name": name, "mimeType": mime_type, "parents": [parent_id]}
+            return dict(self.files[file_id])
+
+    def create(self, body, media_body=None, fields=None):
+        def execute():
+            self.calls.append(("create", body["name"]))
+            errors = self.errors.get(body["name"])
+            if errors:
+                raise errors.pop(0)
+            mime_type = body.get("mimeType", media_body and media_body.mimetype())
+            return self.add(body["name"], body["parents"][0], mime_type)
+
+        return FakeTreeRequest(execute)
+
+    def update(self, fileId, media_body=None, fields=None):
+        def execute():
+            self.calls.append(("update", self.files[fileId]["name"]))
+            return dict(self.files[fileId])
+
+        return FakeTreeRequest(execute)
+
+    def list(self, q, pageSize=100, pageToken=None, fields=None):
+        def execute():
+            self.calls.append(("list", tuple(folder_ids)))
+            return {"files": [dict(f) for f in self.files.values() if f["parents"][0] in folder_ids]}
+
+        folder_ids = re.findall(r"'(\w+)' in parents", q)
+        return FakeTreeRequest(execute)
+
+
+class FakeTreeService:
+    def __init__(self):
+        self._files = FakeTreeFiles()
+
+    def files(self):
+        return self._files
+
+
+@pytest.fixture
+def client(make_client):
+    return make_client(FakeTreeService(), chunksize=CHUNKSIZE, resumable_threshold=CHUNKSIZE)
+
+
+@pytest.fixture
+def local_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(drive_client, "guess_original_mime_type", lambda _reader: "text/plain")
+    root = tmp_path / "tree"
+    for path in ["a.txt", "b/b1.txt", "b/b2.txt", "b/c/c1.txt", "d/e/e1.txt"]:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(path)
+    return root
+
+
+def test_upload_tree(local_tree, client, http_error):
+    files = client.service.files()
+    files.errors = {"b2.txt": [http_error(503)], "b": [http_error(500)]}
+
+    manifest = client.upload_tree(str(local_tree), "parent", parallelism=3)
+
+    assert sorted(os.path.relpath(p, local_tree) for p in manifest) == \
+        ["a.txt", "b", "b/b1.txt", "b/b2.txt", "b/c", "b/c/c1.txt", "d", "d/e", "d/e/e1.txt"]
+    c1 = manifest[str(local_tree / "b" / "c" / "c1.txt")]
+    assert c1.name == "c1.txt"
+    assert c1.parents_ids == [manifest[str(local_tree / "b" / "c")].id]
+    assert manifest[str(local_tree / "d" / "e")].is_directory
+
+    # only the folders that existed before are listed
+    assert [c for c in files.calls if c[0] == "list"] == [("list", ("parent",))]
+    assert len(files.files) == 9
+
+
+def test_upload_tree_reuses_existing(local_tree, client):
+    files = client.service.files()
+    b = files.add("b", "parent", "application/vnd.google-apps.folder")
+    b1 = files.add("b1.txt", b["id"])
+
+    manifest = client.upload_tree(str(local_tree), "parent", update_existing=True)
+
+    assert manifest[str(local_tree / "b")].id == b["id"]
+    assert manifest[str(local_tree / "b" / "b1.txt")].id == b1["id"]
+    assert ("update", "b1.txt") in files.calls
+    assert ("create", "b") not in files.calls
+    assert [c for c in files.calls if c[0] == "list"] == [("list", ("parent",)), ("list", (b["id"],))]
+
+
+def test_upload_tree_errors(local_tree, client, http_error):
+    files = client.service.files()
+    files.errors = {"a.txt": [http_error(400)], "d": [http_error(503)] * 10}
+
+    with pytest.raises(UploadTreeError) as excinfo:
+        client.upload_tree(str(local_tree), "parent", retries_count=2)
+
+    errors = excinfo.value.errors
+    assert sorted(os.path.relpath(p, local_tree) for p in errors) == ["a.txt", "d"]
+    assert files.calls.count(("create", "a.txt")) == 1
+    assert files.calls.count(("create", "d")) == 3
+    assert str(local_tree / "b" / "c" / "c1.txt") in excinfo.value.manifest